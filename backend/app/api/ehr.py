@@ -2,6 +2,8 @@
 from __future__ import annotations
 
 import logging
+import os
+from datetime import date
 from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, BackgroundTasks, HTTPException
@@ -12,7 +14,6 @@ from app.database import (
     delete_patient,
     get_all_patients,
     get_patient_by_id,
-    init_db,
     save_patient,
     update_patient,
     update_patient_billing,
@@ -22,8 +23,31 @@ from app.database import (
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize DB on module load
-init_db()
+# Typeahead only escalates to the full hybrid (TF-IDF + semantic) search once the
+# query is this long, or when the client marks it settled (debounce elapsed).
+_TYPEAHEAD_SEMANTIC_MIN_CHARS = int(os.getenv("TYPEAHEAD_SEMANTIC_MIN_CHARS", "8"))
+
+# Latency budgets (ms) for the coding tiers: interactive calls get a bounded answer,
+# background billing can afford the slower tiers. 0 disables the deadline.
+_SUGGEST_DEADLINE_MS = float(os.getenv("SUGGEST_DEADLINE_MS", "300"))
+_SEARCH_DEADLINE_MS = float(os.getenv("SEARCH_DEADLINE_MS", "150"))
+_BILLING_DEADLINE_MS = float(os.getenv("BILLING_DEADLINE_MS", "5000"))
+
+
+def _deadline(requested: Optional[float], default: float) -> Optional[float]:
+    """Per-request deadline, falling back to the configured default; <= 0 means none."""
+    value = default if requested is None else requested
+    return value if value > 0 else None
+
+
+def _coding_service(code_type: str, version: Optional[str], encounter_date: Optional[date]):
+    """ICD-10-CM or ICD-10-PCS service for the requested / date-selected code-set version."""
+    from app.services.code_sets import CM, PCS, select_version
+    if code_type == "procedure":
+        from app.services.procedure_coding_service import ProcedureCodingService
+        return ProcedureCodingService(select_version(PCS, version, encounter_date))
+    from app.services.icd_coding_service import ICDCodingService
+    return ICDCodingService(select_version(CM, version, encounter_date))
 
 
 # ---------------------------------------------------------------------------
@@ -35,12 +59,18 @@ class ICDSuggestRequest(BaseModel):
     symptoms: Optional[List[str]] = None
     diagnosis_text: Optional[str] = None
     top_k: int = 5
+    deadline_ms: Optional[float] = None  # default SUGGEST_DEADLINE_MS
+    code_set_version: Optional[str] = None  # fiscal year, e.g. "2026"
+    encounter_date: Optional[date] = None   # selects the version in force (default today)
 
 
 class ProcedureSuggestRequest(BaseModel):
     procedures: Optional[List[str]] = None
     medications: Optional[List[str]] = None
     top_k: int = 5
+    deadline_ms: Optional[float] = None  # default SUGGEST_DEADLINE_MS
+    code_set_version: Optional[str] = None
+    encounter_date: Optional[date] = None
 
 
 class CodeSearchRequest(BaseModel):
@@ -48,6 +78,24 @@ class CodeSearchRequest(BaseModel):
     code_type: str = "diagnosis"  # "diagnosis" | "procedure"
     top_k: int = 10
     min_confidence: float = 0.35   # reject results below 35% — avoids nonsensical matches
+    deadline_ms: Optional[float] = None  # default SEARCH_DEADLINE_MS
+    code_set_version: Optional[str] = None
+    encounter_date: Optional[date] = None
+
+
+class TypeaheadRequest(BaseModel):
+    query: str
+    code_type: str = "diagnosis"  # "diagnosis" | "procedure"
+    top_k: int = 10
+    settled: bool = False          # client sets this once the user pauses typing
+    min_confidence: float = 0.35   # applied to hybrid fallback results only
+    code_set_version: Optional[str] = None
+    encounter_date: Optional[date] = None
+
+
+class CodeRollupRequest(BaseModel):
+    codes: List[str]
+    level: str = "block"  # "chapter" | "block" | "category"
 
 
 class BillingCodesPatch(BaseModel):
@@ -80,39 +128,22 @@ async def _run_billing_automation(patient_id: int, data: PatientData) -> None:
     Mirrors _generate_and_save_summary — fires after every new EHR commit.
     """
     try:
-        from app.services.icd_coding_service import ICDCodingService
-        from app.services.procedure_coding_service import ProcedureCodingService
-        from app.services.billing_service import BillingService
+        from app.services.billing_service import auto_code
 
         dx_text = " ".join(
             filter(None, [data.tentative_doctor_diagnosis, data.initial_llm_diagnosis])
         )
 
-        dx_service = ICDCodingService()
-        px_service = ProcedureCodingService()
-
-        dx_codes = dx_service.suggest(
+        dx_codes, px_codes, claim = auto_code(
+            patient_id=patient_id,
+            patient_name=data.name,
             chief_complaint=data.chief_complaint,
             symptoms=data.symptoms or [],
             diagnosis_text=dx_text or None,
-            top_k=5,
-        )
-
-        px_codes = px_service.suggest(
             procedures=data.procedures or [],
             medications=data.medications or [],
             top_k=5,
-        )
-
-        claim = BillingService().assemble(
-            patient_id=patient_id,
-            patient_name=data.name,
-            diagnosis_codes=dx_codes,
-            procedure_codes=px_codes,
-            chief_complaint=data.chief_complaint,
-            symptoms=data.symptoms or [],
-            medications=data.medications or [],
-            procedures_performed=data.procedures or [],
+            deadline_ms=_deadline(None, _BILLING_DEADLINE_MS),
         )
 
         update_patient_billing(
@@ -223,15 +254,23 @@ async def suggest_icd_codes(req: ICDSuggestRequest):
     On-demand ICD-10-CM diagnosis code suggestion.
     Fully offline — no internet required after initial model download.
     """
+    from app.services.code_sets import CodeSetError
     try:
-        from app.services.icd_coding_service import ICDCodingService
-        suggestions = ICDCodingService().suggest(
+        service = _coding_service("diagnosis", req.code_set_version, req.encounter_date)
+        suggestions, report = service.suggest_with_report(
             chief_complaint=req.chief_complaint,
             symptoms=req.symptoms or [],
             diagnosis_text=req.diagnosis_text,
             top_k=req.top_k,
+            deadline_ms=_deadline(req.deadline_ms, _SUGGEST_DEADLINE_MS),
         )
-        return {"suggestions": [s.model_dump() for s in suggestions]}
+        return {
+            "suggestions": [s.model_dump() for s in suggestions],
+            "code_set_version": service.version,
+            "tiers": report.model_dump(),
+        }
+    except CodeSetError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         logger.error("icd-suggest error: %s", exc)
         raise HTTPException(status_code=500, detail=str(exc))
@@ -243,14 +282,22 @@ async def suggest_procedure_codes(req: ProcedureSuggestRequest):
     On-demand ICD-10-PCS procedure code suggestion.
     Fully offline — no internet required after initial model download.
     """
+    from app.services.code_sets import CodeSetError
     try:
-        from app.services.procedure_coding_service import ProcedureCodingService
-        suggestions = ProcedureCodingService().suggest(
+        service = _coding_service("procedure", req.code_set_version, req.encounter_date)
+        suggestions, report = service.suggest_with_report(
             procedures=req.procedures or [],
             medications=req.medications or [],
             top_k=req.top_k,
+            deadline_ms=_deadline(req.deadline_ms, _SUGGEST_DEADLINE_MS),
         )
-        return {"suggestions": [s.model_dump() for s in suggestions]}
+        return {
+            "suggestions": [s.model_dump() for s in suggestions],
+            "code_set_version": service.version,
+            "tiers": report.model_dump(),
+        }
+    except CodeSetError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         logger.error("procedure-suggest error: %s", exc)
         raise HTTPException(status_code=500, detail=str(exc))
@@ -262,21 +309,127 @@ async def search_codes(req: CodeSearchRequest):
     Offline code browser search — used by the Diagnostics & Billing page.
     Searches both ICD-10-CM (diagnosis) and ICD-10-PCS (procedure) collections.
     """
+    from app.services.code_sets import CodeSetError
     try:
-        if req.code_type == "procedure":
-            from app.services.procedure_coding_service import ProcedureCodingService
-            results = ProcedureCodingService().search(query=req.query, top_k=req.top_k)
-        else:
-            from app.services.icd_coding_service import ICDCodingService
-            results = ICDCodingService().search(query=req.query, top_k=req.top_k)
+        service = _coding_service(req.code_type, req.code_set_version, req.encounter_date)
+        results, report = service.search_with_report(
+            query=req.query,
+            top_k=req.top_k,
+            deadline_ms=_deadline(req.deadline_ms, _SEARCH_DEADLINE_MS),
+        )
         # Filter out low-confidence results (e.g. "fever" in procedure search)
         filtered = [r for r in results if r.confidence >= req.min_confidence]
-        return {"results": [r.model_dump() for r in filtered], "code_type": req.code_type}
+        return {
+            "results": [r.model_dump() for r in filtered],
+            "code_type": req.code_type,
+            "code_set_version": service.version,
+            "tiers": report.model_dump(),
+        }
+    except CodeSetError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         logger.error("code-search error: %s", exc)
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@router.post("/code-search/typeahead")
+async def typeahead_codes(req: TypeaheadRequest):
+    """
+    Low-latency as-you-type code lookup for the Diagnostics & Billing page.
+    Answers from the precomputed prefix index; falls back to the full hybrid
+    search only when prefix hits run short and the query is settled or long.
+    """
+    from app.services.code_sets import CodeSetError
+    try:
+        service = _coding_service(req.code_type, req.code_set_version, req.encounter_date)
+
+        results = service.typeahead(query=req.query, top_k=req.top_k)
+        tier = "prefix"
+        wants_semantic = req.settled or len(req.query.strip()) >= _TYPEAHEAD_SEMANTIC_MIN_CHARS
+        if len(results) < req.top_k and wants_semantic:
+            tier = "hybrid"
+            seen = {r.code for r in results}
+            for r in service.search(
+                query=req.query,
+                top_k=req.top_k,
+                deadline_ms=_deadline(None, _SEARCH_DEADLINE_MS),
+            ):
+                if r.code not in seen and r.confidence >= req.min_confidence:
+                    results.append(r)
+            results = results[:req.top_k]
+        return {
+            "results": [r.model_dump() for r in results],
+            "code_type": req.code_type,
+            "code_set_version": service.version,
+            "tier": tier,
+        }
+    except CodeSetError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        logger.error("code-search/typeahead error: %s", exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+# ---------------------------------------------------------------------------
+# ICD-10-CM hierarchy endpoints
+# ---------------------------------------------------------------------------
+
+@router.get("/codes/chapters")
+async def get_code_chapters():
+    """ICD-10-CM chapters — the entry point for browsing the hierarchy."""
+    try:
+        from app.services.icd_coding_service import ICDCodingService
+        return {"chapters": ICDCodingService().chapters()}
+    except Exception as exc:
+        logger.error("codes/chapters error: %s", exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/codes/{code}/children")
+async def get_code_children(code: str):
+    """Direct children of an ICD-10-CM chapter ("10"), block ("J00-J06") or code ("J06")."""
+    try:
+        from app.services.icd_coding_service import ICDCodingService
+        children = ICDCodingService().children(code)
+        if children is None:
+            raise HTTPException(status_code=404, detail=f"Unknown ICD-10-CM code {code}")
+        return {"code": code, "children": children}
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.error("codes/children error: %s", exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/codes/{code}/ancestors")
+async def get_code_ancestors(code: str):
+    """Ancestors of an ICD-10-CM code, nearest first (category → block → chapter)."""
+    try:
+        from app.services.icd_coding_service import ICDCodingService
+        ancestors = ICDCodingService().ancestors(code)
+        if ancestors is None:
+            raise HTTPException(status_code=404, detail=f"Unknown ICD-10-CM code {code}")
+        return {"code": code, "ancestors": ancestors}
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.error("codes/ancestors error: %s", exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.post("/codes/rollup")
+async def rollup_codes(req: CodeRollupRequest):
+    """Roll a list of ICD-10-CM codes up to chapter, block or category with counts."""
+    try:
+        from app.services.icd_coding_service import ICDCodingService
+        return {"level": req.level, "groups": ICDCodingService().rollup(req.codes, req.level)}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        logger.error("codes/rollup error: %s", exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
 @router.get("/patients/{patient_id}/billing")
 async def get_patient_billing(patient_id: int):
     """Return the full billing claim for a patient."""
@@ -331,10 +484,11 @@ async def patch_patient_billing(patient_id: int, payload: BillingCodesPatch):
 
 
 @router.get("/analytics/trends")
-async def get_clinical_trends():
+async def get_clinical_trends(dx_level: Optional[str] = None):
     """
     Aggregate diagnosis and procedure code trends across all patients.
     Used by the Diagnostics & Billing Center page.
+    Pass dx_level=chapter|block|category to also roll diagnoses up the ICD-10-CM hierarchy.
     """
     try:
         from collections import Counter
@@ -361,7 +515,19 @@ async def get_clinical_trends():
                 if symptom:
                     symptom_counter[symptom.lower()] += 1
 
+        dx_groups = None
+        if dx_level:
+            from app.services.icd_coding_service import ICDCodingService
+            dx_codes = [
+                entry["code"]
+                for p in patients
+                for entry in (p.get("icd10_codes") or [])
+                if isinstance(entry, dict) and entry.get("code")
+            ]
+            dx_groups = ICDCodingService().rollup(dx_codes, dx_level)[:10]
+
         return {
+            "diagnosis_groups": dx_groups,
             "top_diagnoses": [
                 {"label": k, "count": v} for k, v in dx_counter.most_common(10)
             ],
@@ -373,6 +539,8 @@ async def get_clinical_trends():
             ],
             "total_patients": len(patients),
         }
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
         logger.error("analytics/trends error: %s", exc)
         raise HTTPException(status_code=500, detail=str(exc))
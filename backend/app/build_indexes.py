@@ -0,0 +1,39 @@
+"""
+One-shot index loader: builds every on-disk coding artifact, then exits.
+
+    SHARED_CODE_INDEX=true python -m app.build_indexes
+
+Writes, for every configured code-set version, the ICD-10-CM leaf table, the
+ICD-10-PCS table, the lexical indexes, the embedding matrices and (unless
+SHARED_CODE_INDEX) the ChromaDB collections under data/, plus the ICD-10-CM
+hierarchy. Versions are built oldest first, so each new one only encodes the
+descriptions that changed. Run it once per data volume before
+starting workers, so no worker ever encodes the code sets or imports
+simple_icd_10_cm; afterwards every worker only memory-maps the files.
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("app.build_indexes")
+
+    from app.services.icd_coding_service import ICDCodingService
+    from app.services.procedure_coding_service import ProcedureCodingService
+    from app.services.shared_index import SHARED_CODE_INDEX
+
+    t0 = time.perf_counter()
+    ICDCodingService.load_versions()
+    ProcedureCodingService.load_versions()
+    logger.info(
+        "Coding indexes ready in %.1fs (semantic index: %s)",
+        time.perf_counter() - t0,
+        "shared embedding matrix" if SHARED_CODE_INDEX else "ChromaDB",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -53,9 +53,24 @@ def get_db_connection():
     conn.autocommit = False
     return conn
 
+# Schema lock id for pg_advisory_xact_lock ("RMDB"): concurrent CREATE TABLE IF NOT
+# EXISTS from several workers on a fresh database can race on pg_type and fail
+_INIT_DB_LOCK_ID = 0x524D4442
+_db_initialized = False
+
+
 def init_db():
+    """
+    Create / migrate the schema. Runs once per process, and not at all in
+    app.serve workers, which inherit the parent's run from before the fork;
+    separate processes (uvicorn --workers) take turns under an advisory lock.
+    """
+    global _db_initialized
+    if _db_initialized:
+        return
     conn = get_db_connection()
     cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (_INIT_DB_LOCK_ID,))
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS patients (
             id SERIAL PRIMARY KEY,
@@ -108,8 +123,23 @@ def init_db():
     for column in migration_columns:
         cursor.execute(f"ALTER TABLE patients ADD COLUMN IF NOT EXISTS {column} TEXT")
 
+    # Progress checkpoints of bulk re-coding runs (python -m app.recode)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recode_jobs (
+            job_id TEXT PRIMARY KEY,
+            last_patient_id INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+
     conn.commit()
     conn.close()
+    _db_initialized = True
 
 def save_patient(data: PatientData):
     conn = get_db_connection()
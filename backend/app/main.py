@@ -1,12 +1,18 @@
 # backend/app/main.py
+import time
+_IMPORT_T0 = time.perf_counter()
+
+from app.services.resource_monitor import record_phase, track
+
+from dotenv import load_dotenv
+load_dotenv()  # before any app module reads its env config at import time
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
-# We will import the service later, for now we just structure the endpoint
+# Session services (google.genai / websockets) are imported per connection, not at startup
 import os
-from app.services.gemini_service import GeminiService 
-from app.services.local_ml_service import LocalMLService
 
 from contextlib import asynccontextmanager
 import asyncio
@@ -20,20 +26,32 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     from app.services.icd_coding_service import ICDCodingService
     from app.services.procedure_coding_service import ProcedureCodingService
+    from app.services.shared_embedder import flush_embedding_store, get_embedding_store
+    from app.services.resource_monitor import log_summary as log_resource_summary
 
     def _warmup():
         """Blocking warmup — runs in a worker thread, not the event loop."""
+        from app.database import init_db
+        # No-op in app.serve workers: the parent created the schema before forking
+        with track("db.init"):
+            init_db()
+
         logger.info("Warming up ICDCodingService …")
-        ICDCodingService()
+        ICDCodingService.load_versions()
         logger.info("ICDCodingService ready.")
         logger.info("Warming up ProcedureCodingService …")
-        ProcedureCodingService()
+        ProcedureCodingService.load_versions()
         logger.info("All clinical coding services ready.")
+        # Preload the hottest stored phrase embeddings so a restart is fast on common inputs
+        get_embedding_store()
+        log_resource_summary()
 
     # Run blocking CPU/IO work off the event loop
     await asyncio.to_thread(_warmup)
     yield
 
+    flush_embedding_store()
+
 app = FastAPI(title="RuralMedAI Backend", lifespan=lifespan)
 
 # Include API Routes
@@ -53,10 +71,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+record_phase("app.import", _IMPORT_T0)
+
 @app.get("/")
 async def health_check():
     return {"status": "ok", "message": "RuralMedAI Backend is running"}
 
+@app.get("/internal/resources")
+async def internal_resources():
+    """Load time and approximate resident memory of each model/index component."""
+    from app.services.resource_monitor import snapshot
+    return snapshot()
+
 @app.websocket("/ws/live-consultation")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -65,17 +91,21 @@ async def websocket_endpoint(websocket: WebSocket):
     2. Instantiates the active AI Service (Gemini or Local ML Node).
     3. Loops to receive audio and sends back JSON tool calls.
     """
-    await websocket.accept()
-    logger.info("New WebSocket connection accepted")
+    from app.services.audio_transport import accept_audio_socket
+
+    binary_audio = await accept_audio_socket(websocket)
+    logger.info("New WebSocket connection accepted (audio: %s)", "binary" if binary_audio else "json")
 
     use_local_ml = os.getenv("USE_LOCAL_ML", "false").lower() == "true"
 
     try:
         if use_local_ml:
             logger.info("Routing traffic to LOCAL ML Stack (Groq + Qwen) via bridge")
+            from app.services.local_ml_service import LocalMLService
             service = LocalMLService()
         else:
             logger.info("Routing traffic to Google GEMINI Live API")
+            from app.services.gemini_service import GeminiService
             service = GeminiService()
             
         await service.handle_session(websocket)
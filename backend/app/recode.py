@@ -0,0 +1,288 @@
+"""
+Bulk re-coding of stored encounters after a code-set or embedding-model change.
+
+    python -m app.recode --job fy2026 [--icd-version 2026 --pcs-version 2026]
+                         [--chunk-size 500] [--restart]
+
+Streams patients in id order through a server-side cursor, one chunk at a
+time. Each chunk's diagnosis and procedure texts are embedded in one batched
+model call (shared_embedder.prefetched_embeddings), then every encounter is
+coded exactly like the post-commit billing task (billing_service.auto_code)
+and the chunk is written with a single batched UPDATE. Encounters are coded
+against the code-set versions given, else the ones in force on the date the
+encounter was recorded.
+
+Encounters whose claim is `confirmed` by a clinician are never touched; an
+encounter confirmed or edited while its chunk was being coded is left alone
+too (the UPDATE only applies if billing_summary is still what was read).
+
+Progress is checkpointed in the recode_jobs table in the same transaction as
+each chunk's UPDATE, so an interrupted run resumes after the last committed
+chunk when started again with the same --job. --restart starts the job over.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger("app.recode")
+
+_SELECT_PATIENTS = '''
+    SELECT id, name, chief_complaint, symptoms, tentative_doctor_diagnosis,
+           initial_llm_diagnosis, procedures, medications, billing_summary, created_at
+    FROM patients
+    WHERE id > %s
+    ORDER BY id
+'''
+
+# Optimistic write: skip rows whose billing_summary changed since they were read
+_UPDATE_PATIENTS = '''
+    UPDATE patients AS p
+    SET icd10_codes = v.icd10_codes,
+        procedure_codes = v.procedure_codes,
+        billing_summary = v.billing_summary
+    FROM (VALUES %s) AS v(id, icd10_codes, procedure_codes, billing_summary, previous)
+    WHERE p.id = v.id AND p.billing_summary IS NOT DISTINCT FROM v.previous
+'''
+
+
+def _decrypt(value: Optional[str]) -> Optional[str]:
+    from app.database import decrypt_text
+
+    if not value:
+        return None
+    try:
+        return decrypt_text(value)
+    except Exception:
+        return None
+
+
+def _json_list(value: Optional[str]) -> list:
+    try:
+        parsed = json.loads(value) if value else []
+    except ValueError:
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def _json_dict(value: Optional[str]) -> dict:
+    try:
+        parsed = json.loads(value) if value else {}
+    except ValueError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _load_checkpoint(conn, job_id: str, restart: bool) -> dict[str, Any]:
+    import psycopg2.extras
+
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    if restart:
+        cursor.execute("DELETE FROM recode_jobs WHERE job_id = %s", (job_id,))
+    cursor.execute("INSERT INTO recode_jobs (job_id) VALUES (%s) ON CONFLICT DO NOTHING", (job_id,))
+    cursor.execute("SELECT * FROM recode_jobs WHERE job_id = %s", (job_id,))
+    checkpoint = dict(cursor.fetchone())
+    conn.commit()
+    return checkpoint
+
+
+def _code_chunk(
+    rows: list[dict],
+    top_k: int,
+    deadline_ms: Optional[float],
+    icd_version: Optional[str],
+    pcs_version: Optional[str],
+) -> tuple[list[tuple], int, int]:
+    """Code one chunk; returns (UPDATE rows, confirmed records skipped, failures)."""
+    from app.services.billing_service import auto_code
+    from app.services.code_sets import CM, PCS, select_version
+    from app.services.icd_coding_service import ICDCodingService
+    from app.services.procedure_coding_service import ProcedureCodingService
+    from app.services.shared_embedder import prefetched_embeddings
+
+    encounters = []
+    skipped = 0
+    for row in rows:
+        previous = _json_dict(row["billing_summary"])
+        if previous.get("coding_status") == "confirmed":
+            skipped += 1
+            continue
+        diagnosis_text = " ".join(filter(None, [
+            _decrypt(row["tentative_doctor_diagnosis"]), _decrypt(row["initial_llm_diagnosis"]),
+        ]))
+        encounters.append({
+            "patient_id": row["id"],
+            "patient_name": _decrypt(row["name"]),
+            "chief_complaint": _decrypt(row["chief_complaint"]),
+            "symptoms": _json_list(row["symptoms"]),
+            "diagnosis_text": diagnosis_text or None,
+            "procedures": _json_list(row["procedures"]),
+            "medications": _json_list(row["medications"]),
+            "encounter_date": row["created_at"].date() if row["created_at"] else None,
+            "previous": previous,
+            "previous_raw": row["billing_summary"],
+        })
+
+    texts = []
+    for enc in encounters:
+        icd = ICDCodingService(select_version(CM, icd_version, enc["encounter_date"]))
+        pcs = ProcedureCodingService(select_version(PCS, pcs_version, enc["encounter_date"]))
+        texts.append(icd.suggest_text(enc["chief_complaint"], enc["symptoms"], enc["diagnosis_text"]))
+        texts.append(pcs.suggest_text(enc["procedures"], enc["medications"]))
+
+    updates = []
+    failed = 0
+    with prefetched_embeddings(texts):
+        for enc in encounters:
+            try:
+                dx_codes, px_codes, claim = auto_code(
+                    patient_id=enc["patient_id"],
+                    patient_name=enc["patient_name"],
+                    chief_complaint=enc["chief_complaint"],
+                    symptoms=enc["symptoms"],
+                    diagnosis_text=enc["diagnosis_text"],
+                    procedures=enc["procedures"],
+                    medications=enc["medications"],
+                    top_k=top_k,
+                    deadline_ms=deadline_ms,
+                    encounter_date=enc["encounter_date"],
+                    icd_version=icd_version,
+                    pcs_version=pcs_version,
+                )
+            except Exception as exc:
+                logger.error("Re-coding failed for patient %d: %s", enc["patient_id"], exc)
+                failed += 1
+                continue
+            # Keep the original encounter date (the earlier claim's, else the day the
+            # encounter was recorded), not the day of the re-coding run
+            claim.encounter_date = enc["previous"].get("encounter_date") or (
+                enc["encounter_date"].isoformat() if enc["encounter_date"] else claim.encounter_date
+            )
+            updates.append((
+                enc["patient_id"],
+                json.dumps([s.model_dump() for s in dx_codes]),
+                json.dumps([s.model_dump() for s in px_codes]),
+                json.dumps(claim.model_dump()),
+                enc["previous_raw"],
+            ))
+    return updates, skipped, failed
+
+
+def run(
+    job_id: str,
+    chunk_size: int = 500,
+    restart: bool = False,
+    top_k: int = 5,
+    deadline_ms: Optional[float] = None,
+    icd_version: Optional[str] = None,
+    pcs_version: Optional[str] = None,
+) -> dict[str, Any]:
+    """Run (or resume) re-coding job `job_id`; returns its final checkpoint row."""
+    import psycopg2.extras
+    from app.database import get_db_connection, init_db
+    from app.services.code_sets import CM, PCS, select_version
+
+    # Fail on an unknown version before touching the database
+    for system, version in ((CM, icd_version), (PCS, pcs_version)):
+        if version:
+            select_version(system, version)
+
+    init_db()
+    write_conn = get_db_connection()
+    checkpoint = _load_checkpoint(write_conn, job_id, restart)
+    if checkpoint["finished_at"] is not None:
+        logger.info("Re-coding job %s already finished at %s (use --restart to run it again)",
+                    job_id, checkpoint["finished_at"])
+        write_conn.close()
+        return checkpoint
+    if checkpoint["last_patient_id"]:
+        logger.info("Resuming re-coding job %s after patient %d (%d done)",
+                    job_id, checkpoint["last_patient_id"], checkpoint["processed"])
+
+    # Named cursor = server-side: rows arrive chunk by chunk, never all at once.
+    # It lives on its own connection because committing would close it.
+    read_conn = get_db_connection()
+    reader = read_conn.cursor(name=f"recode_{job_id}", cursor_factory=psycopg2.extras.RealDictCursor)
+    reader.itersize = chunk_size
+    reader.execute(_SELECT_PATIENTS, (checkpoint["last_patient_id"],))
+
+    writer = write_conn.cursor()
+    t0 = time.perf_counter()
+    processed = 0
+    try:
+        while True:
+            rows = reader.fetchmany(chunk_size)
+            if not rows:
+                break
+            updates, skipped, failed = _code_chunk(rows, top_k, deadline_ms, icd_version, pcs_version)
+            written = 0
+            if updates:
+                psycopg2.extras.execute_values(writer, _UPDATE_PATIENTS, updates, page_size=len(updates))
+                written = writer.rowcount
+            # Rows confirmed/edited while this chunk was coded count as skipped
+            skipped += len(updates) - written
+            writer.execute(
+                '''
+                UPDATE recode_jobs
+                SET last_patient_id = %s, processed = processed + %s, skipped = skipped + %s,
+                    failed = failed + %s, updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = %s
+                ''',
+                (rows[-1]["id"], written, skipped, failed, job_id),
+            )
+            write_conn.commit()
+
+            processed += written
+            elapsed = time.perf_counter() - t0
+            logger.info(
+                "Re-coding %s: through patient %d — %d written this run (%.0f/min), chunk skipped %d, failed %d",
+                job_id, rows[-1]["id"], processed, processed / elapsed * 60.0 if elapsed else 0.0,
+                skipped, failed,
+            )
+
+        writer.execute(
+            "UPDATE recode_jobs SET finished_at = CURRENT_TIMESTAMP WHERE job_id = %s", (job_id,)
+        )
+        write_conn.commit()
+        writer.execute("SELECT * FROM recode_jobs WHERE job_id = %s", (job_id,))
+        columns = [c.name for c in writer.description]
+        final = dict(zip(columns, writer.fetchone()))
+    finally:
+        read_conn.close()
+        write_conn.close()
+
+    logger.info(
+        "Re-coding job %s finished: %d processed, %d skipped, %d failed",
+        job_id, final["processed"], final["skipped"], final["failed"],
+    )
+    return final
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-derive stored ICD-10-CM/PCS codes and billing claims")
+    parser.add_argument("--job", required=True, help="job id; re-running the same id resumes it")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--deadline-ms", type=float, default=None,
+                        help="per-encounter tier budget (default: no deadline, every tier runs)")
+    parser.add_argument("--icd-version", default=None,
+                        help="ICD-10-CM code-set version (default: the one in force on each encounter's date)")
+    parser.add_argument("--pcs-version", default=None,
+                        help="ICD-10-PCS code-set version (default: the one in force on each encounter's date)")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and start over")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    run(
+        args.job, args.chunk_size, args.restart, args.top_k, args.deadline_ms,
+        args.icd_version, args.pcs_version,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Multi-worker launcher with copy-on-write model sharing (Linux / macOS).
+
+    python -m app.serve --workers 4 --host 0.0.0.0 --port 8003
+
+`uvicorn --workers N` starts N independent interpreters, each loading the
+embedder, spaCy, both Chroma collections and the lexical indexes, so memory
+grows linearly with N. This launcher loads all of that once in a parent
+process and then forks the workers, which share those pages copy-on-write:
+  - lexical indexes, code tables and the ICD hierarchy are read-only mmaps of
+    files under data/, so they stay shared even when touched
+  - model weights and other NumPy buffers are never written after load
+  - gc.freeze() moves everything loaded so far out of the collector's reach,
+    so collections in the workers do not dirty those objects' pages
+The launcher requires SHARED_CODE_INDEX=true: the semantic tier then reads a
+memory-mapped embedding matrix instead of ChromaDB, whose SQLite/HNSW client
+state cannot be carried across fork() with any public API. (Without it, use
+`uvicorn app.main:app --workers N`.) The embedding store re-opens its SQLite
+handle in each worker (os.register_at_fork hook).
+
+The parent only supervises: it forwards SIGINT/SIGTERM and restarts workers
+that exit unexpectedly. Run `python -m app.build_indexes` once on a fresh
+data/ directory so first-run indexing (the only inference at load time) does
+not happen in the parent.
+
+`python benchmarks/bench_workers.py` reports per-worker unique memory.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("app.serve")
+
+_RESTART_DELAY_S = 1.0
+_MIN_UPTIME_S = 10.0      # a worker dying sooner than this counts as a startup failure
+_MAX_FAST_FAILURES = 5    # consecutive startup failures before the launcher gives up
+
+
+def _preload():
+    """Import the app, create the schema and load every coding model/index in the parent."""
+    from app.database import init_db
+    from app.main import app
+    from app.services.icd_coding_service import ICDCodingService
+    from app.services.procedure_coding_service import ProcedureCodingService
+    from app.services.shared_embedder import get_embedding_store
+
+    # Once, before forking; the workers' lifespan then finds it done
+    init_db()
+    ICDCodingService.load_versions()
+    ProcedureCodingService.load_versions()
+    get_embedding_store()
+    return app
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, args: argparse.Namespace) -> None:
+    import uvicorn
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # Split CPU threads between workers instead of oversubscribing every core
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.workers))
+
+    config = uvicorn.Config(app, log_level=args.log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(app, sock, args)
+        except BaseException:
+            logger.exception("worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info("Started worker %d", pid)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RuralMedAI backend multi-worker launcher")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8003")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not hasattr(os, "fork"):
+        raise SystemExit("app.serve needs fork(); on this platform use `uvicorn app.main:app --workers N`")
+    from dotenv import load_dotenv
+    load_dotenv()  # as app.main does, before shared_index reads SHARED_CODE_INDEX
+    from app.services.shared_index import SHARED_CODE_INDEX
+    if not SHARED_CODE_INDEX:
+        raise SystemExit(
+            "app.serve needs SHARED_CODE_INDEX=true (ChromaDB clients are not fork-safe); "
+            "build the index with `SHARED_CODE_INDEX=true python -m app.build_indexes`, "
+            "or use `uvicorn app.main:app --workers N`"
+        )
+
+    t0 = time.perf_counter()
+    app = _preload()
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded coding models in %.1fs; forking %d workers", time.perf_counter() - t0, args.workers)
+
+    sock = _bind(args.host, args.port)
+    workers = {_spawn(app, sock, args): time.monotonic() for _ in range(args.workers)}
+    stopping = False
+    crash_loop = False
+    fast_failures = 0
+
+    def _stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        fast_failures = fast_failures + 1 if time.monotonic() - started < _MIN_UPTIME_S else 0
+        if fast_failures >= _MAX_FAST_FAILURES:
+            logger.error("Workers keep failing at startup — shutting down")
+            crash_loop = True
+            _stop(signal.SIGTERM, None)
+            continue
+        logger.warning("Worker %d exited (status %d) — restarting", pid, status)
+        time.sleep(_RESTART_DELAY_S)
+        workers[_spawn(app, sock, args)] = time.monotonic()
+
+    from app.services.shared_embedder import flush_embedding_store
+    flush_embedding_store()
+    logger.info("All workers stopped")
+    if crash_loop:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# backend/app/services/audio_transport.py
+"""
+Wire format of microphone audio on the live-consultation sockets.
+
+Audio travels as raw little-endian PCM16 in binary WebSocket frames when both
+ends agree on it: the client offers the AUDIO_SUBPROTOCOL subprotocol and the
+server selects it during the handshake. A client that does not offer it uses
+the original JSON messages,
+
+    {"realtimeInput": {"mediaChunks": [{"mimeType": "audio/pcm", "data": <base64>}]}}
+
+so old clients and ML nodes keep working. Against a server that does not
+select it, browsers fail the handshake outright (RFC 6455), so the frontend
+reconnects once without offering it and then sends JSON; the backend's
+Python client to the ML node accepts the missing selection and sends JSON. Binary frames skip the base64
+encode/decode and JSON parse on every hop and are about 25% smaller.
+
+The same negotiation is used browser -> backend and backend -> ML node; the
+backend forwards binary frames to the ML node unparsed.
+"""
+import json
+from typing import Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+AUDIO_SUBPROTOCOL = "ruralmed.pcm16.v1"
+
+
+async def accept_audio_socket(websocket: WebSocket) -> bool:
+    """Accept `websocket`, selecting binary audio if the client offered it."""
+    binary = AUDIO_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=AUDIO_SUBPROTOCOL if binary else None)
+    return binary
+
+
+async def receive_audio(websocket: WebSocket) -> Optional[Union[bytes, str]]:
+    """
+    Next audio chunk from the client: raw PCM bytes for a binary frame, the
+    base64 string for a JSON realtimeInput message, None for any other message.
+    Raises WebSocketDisconnect when the client goes away.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    text = message.get("text")
+    if not text:
+        return None
+    data = json.loads(text)
+    if "realtimeInput" not in data:
+        return None
+    return data["realtimeInput"]["mediaChunks"][0]["data"]
@@ -30,6 +30,7 @@ class BillingClaim(BaseModel):
     procedure_codes: list[dict[str, Any]]       # Full ProcedureSuggestion list as dicts
     billing_notes: str                          # Human-readable summary for insurer forms
     coding_status: str                          # "auto_coded" | "confirmed" | "partial"
+    code_set_versions: Optional[dict[str, str]] = None  # {"icd10_cm": "2025", "icd10_pcs": "2025"}
 
 
 class BillingService:
@@ -129,3 +130,55 @@ class BillingService:
         )
 
         return "\n".join(lines)
+
+
+def auto_code(
+    patient_id: int,
+    patient_name: Optional[str],
+    chief_complaint: Optional[str],
+    symptoms: list[str],
+    diagnosis_text: Optional[str],
+    procedures: list[str],
+    medications: list[str],
+    top_k: int = 5,
+    deadline_ms: Optional[float] = None,
+    encounter_date: Optional[date] = None,
+    icd_version: Optional[str] = None,
+    pcs_version: Optional[str] = None,
+) -> tuple[list[ICDSuggestion], list[ProcedureSuggestion], BillingClaim]:
+    """
+    Code one encounter with ICD-10-CM + ICD-10-PCS and assemble its claim.
+    Shared by the post-commit billing task and the bulk re-coding job. The
+    code-set versions are the ones given, else those in force on encounter_date.
+    """
+    from app.services.code_sets import CM, PCS, select_version
+    from app.services.icd_coding_service import ICDCodingService
+    from app.services.procedure_coding_service import ProcedureCodingService
+
+    dx_service = ICDCodingService(select_version(CM, icd_version, encounter_date))
+    px_service = ProcedureCodingService(select_version(PCS, pcs_version, encounter_date))
+    dx_codes = dx_service.suggest(
+        chief_complaint=chief_complaint,
+        symptoms=symptoms,
+        diagnosis_text=diagnosis_text,
+        top_k=top_k,
+        deadline_ms=deadline_ms,
+    )
+    px_codes = px_service.suggest(
+        procedures=procedures,
+        medications=medications,
+        top_k=top_k,
+        deadline_ms=deadline_ms,
+    )
+    claim = BillingService().assemble(
+        patient_id=patient_id,
+        patient_name=patient_name,
+        diagnosis_codes=dx_codes,
+        procedure_codes=px_codes,
+        chief_complaint=chief_complaint,
+        symptoms=symptoms,
+        medications=medications,
+        procedures_performed=procedures,
+    )
+    claim.code_set_versions = {CM: dx_service.version, PCS: px_service.version}
+    return dx_codes, px_codes, claim
@@ -0,0 +1,91 @@
+"""
+Code-set versions (ICD-10-CM / ICD-10-PCS fiscal years) served side by side.
+
+Each coding service keeps one instance per version. The bundled release
+(simple_icd_10_cm for ICD-10-CM, the FY2025 CMS order file for ICD-10-PCS) is
+always available; further fiscal years are added from CMS files:
+
+    ICD10_CM_VERSION_FILES=2026:/data/icd10cm-codes-2026.txt
+    ICD10_PCS_VERSION_FILES=2026:/data/icd10pcs_order_2026.zip
+
+Versions are fiscal years. A request either names its version, or gives the
+encounter date, which selects the newest version whose fiscal year had
+started by then (FY N runs 1 Oct N-1 to 30 Sep N); with neither, today.
+
+A new version's embeddings are built as a delta against the closest version
+already built (see EmbeddingMatrix.build): descriptions the base version
+already has reuse its vectors, so only added or reworded entries are encoded.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import date
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CM = "icd10_cm"
+PCS = "icd10_pcs"
+BUNDLED_VERSION = "2025"
+
+
+class CodeSetError(ValueError):
+    pass
+
+
+def _parse_version_files(raw: str, env_name: str) -> dict[str, Path]:
+    """"2026:/path/a.txt,2027:/path/b.zip" -> {"2026": Path(...), ...}"""
+    files: dict[str, Path] = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        version, sep, path = item.partition(":")
+        version = version.strip()
+        if not sep or not version.isdigit() or not path.strip():
+            logger.error("%s: ignoring %r (expected <fiscal year>:<path>)", env_name, item)
+            continue
+        files[version] = Path(path.strip())
+    return files
+
+
+_VERSION_FILES = {
+    CM: _parse_version_files(os.getenv("ICD10_CM_VERSION_FILES", ""), "ICD10_CM_VERSION_FILES"),
+    PCS: _parse_version_files(os.getenv("ICD10_PCS_VERSION_FILES", ""), "ICD10_PCS_VERSION_FILES"),
+}
+
+
+def versions(system: str) -> list[str]:
+    """Every configured version of `system`, oldest first."""
+    return sorted({BUNDLED_VERSION, *_VERSION_FILES[system]}, key=int)
+
+
+def version_file(system: str, version: str) -> Optional[Path]:
+    """CMS source file of a non-bundled version (None for the bundled release)."""
+    return _VERSION_FILES[system].get(version)
+
+
+def fiscal_year(day: date) -> int:
+    return day.year + 1 if day.month >= 10 else day.year
+
+
+def select_version(
+    system: str, version: Optional[str] = None, encounter_date: Optional[date] = None
+) -> str:
+    """Requested version if configured, else the one in force on encounter_date (default today)."""
+    available = versions(system)
+    if version:
+        if version not in available:
+            raise CodeSetError(f"{system} version {version!r} is not configured (available: {available})")
+        return version
+    fy = fiscal_year(encounter_date or date.today())
+    in_force = [v for v in available if int(v) <= fy]
+    return in_force[-1] if in_force else available[0]
+
+
+def base_version(system: str, version: str, is_built: Callable[[str], bool]) -> Optional[str]:
+    """Closest other version with embeddings already built — older first, then newer."""
+    others = [v for v in versions(system) if v != version and is_built(v)]
+    older = [v for v in others if int(v) < int(version)]
+    if older:
+        return older[-1]
+    return others[0] if others else None
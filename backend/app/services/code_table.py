@@ -0,0 +1,80 @@
+"""
+Compact, memory-mappable code tables for the clinical coding pipeline.
+
+A code table is three flat NumPy arrays stored as .npy files in one directory:
+  codes.npy        : fixed-width bytes array (dtype S<n>), one entry per code
+  desc_offsets.npy : int64 offsets into the description blob (length n + 1)
+  desc_blob.npy    : uint8 UTF-8 bytes of every description, concatenated
+
+Tables are loaded with mmap_mode="r" so the raw arrays stay in the page cache
+instead of the Python heap until they are actually read.
+"""
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FILES = ("codes.npy", "desc_offsets.npy", "desc_blob.npy")
+
+
+class CodeTable:
+    """Immutable (code, description) table backed by three NumPy arrays."""
+
+    def __init__(self, codes: np.ndarray, desc_offsets: np.ndarray, desc_blob: np.ndarray) -> None:
+        self.codes = codes
+        self.desc_offsets = desc_offsets
+        self.desc_blob = desc_blob
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    @classmethod
+    def from_lists(cls, codes: Sequence[str], descs: Sequence[str]) -> "CodeTable":
+        encoded = [d.encode("utf-8") for d in descs]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(d) for d in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        code_arr = np.array([c.encode("ascii") for c in codes], dtype=np.bytes_)
+        return cls(code_arr, offsets, blob)
+
+    @staticmethod
+    def exists(table_dir: Path) -> bool:
+        return all((table_dir / name).exists() for name in _FILES)
+
+    @classmethod
+    def load(cls, table_dir: Path, mmap: bool = True) -> "CodeTable":
+        mode = "r" if mmap else None
+        codes, offsets, blob = (
+            np.load(table_dir / name, mmap_mode=mode, allow_pickle=False) for name in _FILES
+        )
+        return cls(codes, offsets, blob)
+
+    def save(self, table_dir: Path) -> None:
+        """Write the table atomically (each array lands via a temp file + rename)."""
+        table_dir.mkdir(parents=True, exist_ok=True)
+        for name, arr in zip(_FILES, (self.codes, self.desc_offsets, self.desc_blob)):
+            tmp = table_dir / f".{name}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr), allow_pickle=False)
+            tmp.replace(table_dir / name)
+        logger.info("CodeTable: wrote %d codes to %s", len(self), table_dir)
+
+    def code(self, idx: int) -> str:
+        return self.codes[idx].decode("ascii")
+
+    def description(self, idx: int) -> str:
+        start, end = int(self.desc_offsets[idx]), int(self.desc_offsets[idx + 1])
+        return self.desc_blob[start:end].tobytes().decode("utf-8")
+
+    def codes_list(self) -> List[str]:
+        return [c.decode("ascii") for c in self.codes.tolist()]
+
+    def descs_list(self) -> List[str]:
+        blob = self.desc_blob.tobytes()
+        offsets = self.desc_offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
@@ -0,0 +1,215 @@
+"""
+Persistent embedding store for short, recurring clinical phrases.
+
+Symptom, medication and diagnosis phrases from transcripts repeat across
+patients, days and restarts. Query embeddings are kept in a SQLite table keyed
+by (model key, normalized text), with an in-process LRU in front of it:
+  - get_many()  : memory first, then one SELECT for the rest
+  - put_many()  : INSERT OR REPLACE; once the table exceeds max_entries the
+                  least-hit / least-recently-used rows are evicted
+  - warm()      : preloads the hottest rows into memory at startup
+Hit counts from memory hits are buffered and written with the next flush, so
+a warm lookup never touches SQLite.
+
+The model key includes the inference backend, so switching EMBEDDING_BACKEND
+never serves vectors from a different runtime. SQLite (WAL) handles concurrent
+worker processes; each one reconnects after fork.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model     TEXT    NOT NULL,
+    text      TEXT    NOT NULL,
+    dim       INTEGER NOT NULL,
+    vec       BLOB    NOT NULL,
+    hits      INTEGER NOT NULL DEFAULT 1,
+    last_used REAL    NOT NULL,
+    PRIMARY KEY (model, text)
+);
+CREATE INDEX IF NOT EXISTS embeddings_rank ON embeddings (model, hits, last_used);
+"""
+_EVICT_TO = 0.9       # evict down to this fraction of max_entries
+_HIT_FLUSH = 256      # flush buffered hit counts after this many memory hits
+_SELECT_CHUNK = 500   # stay below SQLite's bound-parameter limit
+
+
+def normalize_text(text: str) -> str:
+    """Store key for a phrase: lower-cased, whitespace-collapsed."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingStore:
+    """SQLite-backed (model, text) -> float32 vector store with an LRU in front."""
+
+    def __init__(
+        self,
+        path: Path,
+        model_key: str,
+        max_entries: int = 50_000,
+        memory_entries: int = 4096,
+    ) -> None:
+        self.model_key = model_key
+        self._max_entries = max_entries
+        self._memory_entries = memory_entries
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._pending_hits: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._conn = self._connect()
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        # A forked worker keeps the warmed memory tier but opens its own connection
+        os.register_at_fork(after_in_child=self._reopen)
+        # Approximate row count (all models, all processes); recounted before evicting
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Lookup / insert
+    # ------------------------------------------------------------------
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, np.ndarray]:
+        """Vectors for the normalized keys that are stored; missing keys are absent."""
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in dict.fromkeys(keys):
+                vec = self._memory.get(key)
+                if vec is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+                found[key] = vec
+
+            if missing:
+                for start in range(0, len(missing), _SELECT_CHUNK):
+                    chunk = missing[start:start + _SELECT_CHUNK]
+                    rows = self._conn.execute(
+                        f"SELECT text, vec FROM embeddings WHERE model = ? AND text IN "
+                        f"({','.join('?' * len(chunk))})",
+                        [self.model_key, *chunk],
+                    ).fetchall()
+                    for text, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32)
+                        found[text] = vec
+                        self._remember(text, vec)
+                        self._pending_hits[text] = self._pending_hits.get(text, 0) + 1
+            if sum(self._pending_hits.values()) >= _HIT_FLUSH:
+                self._flush_hits(time.time())
+        return found
+
+    def put_many(self, items: Iterable[tuple[str, np.ndarray]]) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, vec in items:
+                vec = np.ascontiguousarray(vec, dtype=np.float32)
+                self._remember(key, vec)
+                rows.append((self.model_key, key, vec.size, vec.tobytes(), now))
+            if not rows:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text, dim, vec, hits, last_used) "
+                "VALUES (?, ?, ?, ?, 1, ?)",
+                rows,
+            )
+            self._count += len(rows)
+            self._flush_hits(now, commit=False)
+            if self._count > self._max_entries:
+                self._evict()
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Startup / maintenance
+    # ------------------------------------------------------------------
+
+    def warm(self, n: Optional[int] = None) -> int:
+        """Load the n most-hit entries for this model into memory; returns the count."""
+        n = self._memory_entries if n is None else min(n, self._memory_entries)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text, vec FROM embeddings WHERE model = ? "
+                "ORDER BY hits DESC, last_used DESC LIMIT ?",
+                (self.model_key, n),
+            ).fetchall()
+            # Insert coldest first so the hottest entries end up most recently used
+            for text, blob in reversed(rows):
+                self._remember(text, np.frombuffer(blob, dtype=np.float32))
+        return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_key,)
+            ).fetchone()[0]
+        return {
+            "model": self.model_key,
+            "stored": count,
+            "in_memory": len(self._memory),
+            "max_entries": self._max_entries,
+        }
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_hits(time.time())
+
+    # ------------------------------------------------------------------
+    # Internal helpers (caller holds the lock)
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self._path), check_same_thread=False, timeout=10.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reopen(self) -> None:
+        self._lock = threading.Lock()
+        self._pending_hits.clear()  # the parent flushes its own
+        self._conn = self._connect()
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_hits(self, now: float, commit: bool = True) -> None:
+        if not self._pending_hits:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET hits = hits + ?, last_used = ? WHERE model = ? AND text = ?",
+            [(n, now, self.model_key, key) for key, n in self._pending_hits.items()],
+        )
+        self._pending_hits.clear()
+        if commit:
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if self._count <= self._max_entries:
+            return
+        excess = self._count - int(self._max_entries * _EVICT_TO)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            "SELECT rowid FROM embeddings ORDER BY hits ASC, last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._count -= excess
+        logger.info("EmbeddingStore: evicted %d cold entries (limit %d)", excess, self._max_entries)
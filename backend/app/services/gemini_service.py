@@ -7,8 +7,10 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from fastapi import WebSocket
+from app.services.audio_transport import receive_audio
 from app.services.prompt_eng import SYSTEM_INSTRUCTION
 from app.services.scheme_service import SchemeEligibilityEngine
+from app.services.term_normalizer import get_normalizer
 
 load_dotenv()
 
@@ -55,6 +57,8 @@ update_patient_data = {
 
 tools = [{"function_declarations": [update_patient_data]}]
 
+NORMALIZED_FIELDS = ("housing_type", "caste_category", "gender")
+
 class GeminiService:
     SCHEME_REQUIRED_FIELDS = ['ration_card_type', 'income', 'occupation', 'age', 'caste_category', 'housing_type']
 
@@ -67,39 +71,14 @@ class GeminiService:
         """Normalize values to match scheme eligibility criteria across languages"""
         if not isinstance(value, str):
             return value
-        
-        value_lower = value.lower().strip()
-        
-        # Housing type normalization (cross-language) - CRITICAL for D1 criteria
-        if field == "housing_type":
-            if any(term in value_lower for term in ['kaccha', 'kucha', 'kacha', 'kutcha', 'mud', 'thatch', 'hut', 'temporary', 'कच्चा घर', 'मिट्टी का घर', 'குடிசை', 'கச்சா', 'மண் வீடு']):
-                return 'kucha'
-            elif any(term in value_lower for term in ['pucca', 'pukka', 'pakka', 'पक्का', 'concrete', 'brick']):
-                return 'pucca'
-            elif 'semi' in value_lower:
-                return 'semi-pucca'
-        
-        # Caste category normalization - CRITICAL for D4 criteria
-        elif field == "caste_category":
-            if 'sc' in value_lower or 'scheduled caste' in value_lower:
-                return 'sc'
-            elif 'st' in value_lower or 'scheduled tribe' in value_lower:
-                return 'st'
-            elif 'obc' in value_lower or 'backward' in value_lower:
-                return 'obc'
-            elif 'general' in value_lower:
-                return 'general'
-        
-        # Gender normalization
-        elif field == "gender":
-            if any(term in value_lower for term in ['male', 'पुरुष', 'purush', 'm']):
-                return 'male'
-            elif any(term in value_lower for term in ['female', 'महिला', 'mahila', 'f']):
-                return 'female'
-            elif 'other' in value_lower:
-                return 'other'
-        
-        # No normalization needed for ration_card_type and income - keep as spoken
+
+        # housing_type (D1), caste_category (D4) and gender map to fixed labels via the
+        # compiled term lexicon; ration_card_type and income are kept as spoken
+        if field in NORMALIZED_FIELDS:
+            return get_normalizer().field_value(field, value) or value
+
+        # Free-text clinical fields are stored as spoken; colloquial phrases are
+        # mapped to clinical terms only in the coding services' query text (suggest_text)
         return value
 
     def _scheme_inputs_ready(self):
@@ -151,26 +130,17 @@ class GeminiService:
         """Receives audio from browser and pushes to Gemini"""
         try:
             while True:
-                message = await websocket.receive_text()
-                data = json.loads(message)
+                audio = await receive_audio(websocket)
+                if audio is None:
+                    continue
+                # Binary frames are raw PCM; JSON messages carry it base64-encoded
+                pcm_bytes = audio if isinstance(audio, bytes) else base64.b64decode(audio)
+
+                # print(f"Sending {len(pcm_bytes)} bytes of audio to Gemini...") # Verbose
+                await self.session.send_realtime_input(
+                    audio={"data": pcm_bytes, "mime_type": "audio/pcm;rate=16000"}
+                )
 
-                if "realtimeInput" in data:
-                    media_chunk = data["realtimeInput"]["mediaChunks"][0]
-                    pcm_b64 = media_chunk["data"]
-                    mime_type = media_chunk["mimeType"] # "audio/pcm"
-                    
-                    # Decode base64 to bytes
-                    pcm_bytes = base64.b64decode(pcm_b64)
-                    
-                    # Use specific mime type with rate if generic
-                    if mime_type == "audio/pcm":
-                        mime_type = "audio/pcm;rate=16000"
-                        
-                    # print(f"Sending {len(pcm_bytes)} bytes of audio to Gemini...") # Verbose
-                    await self.session.send_realtime_input(
-                        audio={"data": pcm_bytes, "mime_type": mime_type}
-                    )
-                    
         except Exception as e:
             print(f"Error sending to Gemini: {e}")
 
@@ -213,6 +183,8 @@ class GeminiService:
                                     else:
                                         # Normalize standardized field values
                                         value = self._normalize_value(field, value)
+                                if isinstance(value, list):
+                                    value = [self._normalize_value(field, item) for item in value]
 
                                 print(f"Tool Call: update_patient_data({field}, {value})")
 
@@ -0,0 +1,75 @@
+"""
+Vectorized score fusion for the code-browser hybrid search.
+
+Both coding services hand each tier's result over as (code indices, scores)
+NumPy arrays. Fusion happens on a dense vector over the union of candidate
+indices, followed by a single argpartition for top-k, so the caller only builds
+pydantic objects for the rows it returns.
+"""
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+# Hybrid weights: 40% word TF-IDF + 30% char n-gram + 30% semantic, plus a boost
+# when the raw query appears verbatim in the description.
+WORD_WEIGHT = 0.4
+CHAR_WEIGHT = 0.3
+SEMANTIC_WEIGHT = 0.3
+SUBSTRING_BOOST = 0.15
+
+_EMPTY_IDX = np.empty(0, dtype=np.int64)
+_EMPTY_SCORES = np.empty(0, dtype=np.float64)
+
+Tier = tuple[np.ndarray, np.ndarray, float]  # (code indices, scores in [0, 1], weight)
+
+
+def top_normalised(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Indices of the k highest positive scores, each divided by the best one."""
+    k = min(k, scores.size)
+    if k <= 0:
+        return _EMPTY_IDX, _EMPTY_SCORES
+    idx = np.argpartition(scores, -k)[-k:]
+    vals = scores[idx]
+    keep = vals > 0
+    idx, vals = idx[keep], vals[keep]
+    if idx.size == 0:
+        return _EMPTY_IDX, _EMPTY_SCORES
+    return idx, vals / vals.max()
+
+
+def fuse_scores(
+    tiers: Sequence[Tier],
+    descs_lower: Sequence[str],
+    query: str,
+    top_k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted-sum fusion over the union of tier candidates.
+
+    Returns (code indices, confidences) of the top_k positive hybrid scores,
+    best first. Indices within a tier must be unique.
+    """
+    tiers = [t for t in tiers if t[0].size]
+    if not tiers or top_k <= 0:
+        return _EMPTY_IDX, _EMPTY_SCORES
+
+    cand, inverse = np.unique(np.concatenate([t[0] for t in tiers]), return_inverse=True)
+    fused = np.zeros(cand.size, dtype=np.float64)
+    offset = 0
+    for idx, scores, weight in tiers:
+        fused[inverse[offset:offset + idx.size]] += weight * scores
+        offset += idx.size
+
+    ql = query.lower()
+    fused += SUBSTRING_BOOST * np.fromiter(
+        (ql in descs_lower[i] for i in cand.tolist()), dtype=bool, count=cand.size
+    )
+    fused = np.round(np.minimum(fused, 1.0), 4)
+
+    positive = np.flatnonzero(fused > 0)
+    if positive.size > top_k:
+        positive = positive[np.argpartition(-fused[positive], top_k - 1)[:top_k]]
+    order = positive[np.argsort(-fused[positive], kind="stable")]
+    return cand[order], fused[order]
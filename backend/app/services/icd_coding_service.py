@@ -4,144 +4,288 @@ ICD-10-CM (diagnosis) auto-coding service.
 3-tier offline NLP pipeline:
   Tier 1: sentence-transformers semantic search via ChromaDB (persistent HNSW index)
   Tier 2: scispacy clinical NER -> entity-level semantic matching
-  Tier 3: TF-IDF cosine similarity fallback
+  Tier 3: lexical fallback (TF-IDF or BM25 over an inverted index)
 
 ChromaDB collection is auto-populated on first startup (~2-3 min) and then
 persists to disk — subsequent starts are instant.
+
+One instance per code-set version (see code_sets.py): ICDCodingService() is
+the version in force today, ICDCodingService("2026") a specific fiscal year.
+Versions other than the bundled simple_icd_10_cm release are imported from a
+CMS ICD-10-CM codes file and embedded as a delta against a built version.
 """
 
 from __future__ import annotations
 
 import logging
-import os
+import zipfile
 from pathlib import Path
 from typing import Optional
 
 from pydantic import BaseModel
 
+from app.services.code_sets import BUNDLED_VERSION, CM, base_version, select_version, version_file, versions
+from app.services.code_table import CodeTable
+from app.services.shared_embedder import encode_cached
+from app.services.shared_index import SHARED_CODE_INDEX
+from app.services.tier_budget import Deadline, TierReport, TierRunner
+
 logger = logging.getLogger(__name__)
 
 _DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
 _CHROMA_CM_DIR = str(_DATA_DIR / "chroma" / "icd_cm")
+_CM_TABLE_DIR = _DATA_DIR / "code_tables" / "icd_cm_leaf"  # bundled release
+_HIERARCHY_DIR = _DATA_DIR / "code_tables" / "icd_cm_hierarchy"
 _EMBEDDING_MODEL = "all-MiniLM-L6-v2"
-_COLLECTION_NAME = "icd10_cm_v2"
+_COLLECTION_NAME = "icd10_cm_v2"  # bundled release; other versions get icd10_cm_<version>
+
+# Starting per-tier cost estimates (ms); refined from observed latencies
+_SUGGEST_TIER_COST_MS = {"semantic": 25.0, "tfidf": 3.0, "entity": 150.0}
+_SEARCH_TIER_COST_MS = {"word": 2.0, "char": 4.0, "semantic": 25.0}
+
+
+def _cm_table_dir(version: str) -> Path:
+    if version == BUNDLED_VERSION:
+        return _CM_TABLE_DIR
+    return _DATA_DIR / "code_tables" / f"icd_cm_{version}"
+
+
+def import_cm_codes_file(source: Path, table_dir: Path) -> CodeTable:
+    """
+    Import a CMS ICD-10-CM codes file (icd10cm-codes-<year>.txt: undotted code,
+    whitespace, then the description; billable codes only) into a code table.
+    `source` may also be the CMS .zip that contains it.
+    """
+    logger.info("ICDCodingService: importing ICD-10-CM codes file from %s …", source)
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            names = [n for n in zf.namelist() if n.lower().endswith(".txt") and "codes" in n.lower()]
+            if not names:
+                raise RuntimeError("No ICD-10-CM codes .txt file found inside the CMS zip archive")
+            raw = zf.read(max(names, key=lambda n: zf.getinfo(n).file_size))
+    else:
+        raw = Path(source).read_bytes()
+
+    codes, descs = [], []
+    for line in raw.decode("utf-8", errors="replace").splitlines():
+        fields = line.split(None, 1)
+        if len(fields) != 2:
+            continue
+        code, desc = fields[0], fields[1].strip()
+        codes.append(f"{code[:3]}.{code[3:]}" if len(code) > 3 else code)
+        descs.append(desc)
+    table = CodeTable.from_lists(codes, descs)
+    table.save(table_dir)
+    logger.info("ICDCodingService: parsed %d ICD-10-CM codes", len(table))
+    return table
 
 
 class ICDSuggestion(BaseModel):
     code: str
     description: str
     confidence: float
-    source: str  # "semantic" | "entity" | "tfidf" | "exact"
+    source: str  # "semantic" | "entity" | "tfidf" | "exact" | "prefix" | "hybrid"
 
 
 class ICDCodingService:
-    """Singleton. Call ICDCodingService() anywhere — same instance reused."""
+    """One instance per code-set version. ICDCodingService() anywhere reuses it."""
 
-    _instance: Optional["ICDCodingService"] = None
+    _instances: dict[str, "ICDCodingService"] = {}
     _ready: bool = False
 
-    def __new__(cls) -> "ICDCodingService":
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    def __new__(cls, version: Optional[str] = None) -> "ICDCodingService":
+        version = select_version(CM, version)
+        if version not in cls._instances:
+            instance = super().__new__(cls)
+            instance._version = version
+            cls._instances[version] = instance
+        return cls._instances[version]
 
-    def __init__(self) -> None:
+    def __init__(self, version: Optional[str] = None) -> None:
         if self._ready:
             return
         self._ready = True
         self._initialize()
 
+    @classmethod
+    def load_versions(cls) -> list["ICDCodingService"]:
+        """Load every configured version, oldest first so each can delta off the last."""
+        return [cls(v) for v in versions(CM)]
+
+    @property
+    def version(self) -> str:
+        return self._version
+
     # ------------------------------------------------------------------
     # Initialization
     # ------------------------------------------------------------------
 
     def _initialize(self) -> None:
+        from app.services.resource_monitor import track
+
         _DATA_DIR.mkdir(parents=True, exist_ok=True)
-        Path(_CHROMA_CM_DIR).mkdir(parents=True, exist_ok=True)
+        bundled = self._version == BUNDLED_VERSION
+        self._table_dir = _cm_table_dir(self._version)
+        self._collection_name = _COLLECTION_NAME if bundled else f"icd10_cm_{self._version}"
+        tag = "icd" if bundled else f"icd{self._version}"  # resource_monitor component prefix
+        self._suggest_tiers = TierRunner(_SUGGEST_TIER_COST_MS)
+        self._search_tiers = TierRunner(_SEARCH_TIER_COST_MS)
 
         logger.info("ICDCodingService: attaching shared embedding model …")
         from app.services.shared_embedder import get_embedder
         self._embedder = get_embedder()
 
-        import chromadb
-        self._chroma = chromadb.PersistentClient(path=_CHROMA_CM_DIR)
-        self._col = self._chroma.get_or_create_collection(
-            name=_COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"},
-        )
-
-        import simple_icd_10_cm as cm
-        self._cm = cm
-
-        if self._col.count() == 0:
-            self._populate(cm)
-        else:
+        # Leaf codes from the compact code table (built from simple_icd_10_cm on first run)
+        with track(f"{tag}.code_table") as details:
+            self._codes, self._descs = self._load_code_table()
+            self._descs_lower = [d.lower() for d in self._descs]
+            self._code_index = {code: i for i, code in enumerate(self._codes)}
+            details["rows"] = len(self._codes)
+
+        self._col = None
+        self._matrix = None
+        if SHARED_CODE_INDEX:
+            # Memory-mapped embedding matrix shared by every worker; Chroma is not opened
+            from app.services.shared_embedder import embedding_model_key
+            from app.services.shared_index import EmbeddingMatrix
+            with track(f"{tag}.embedding_matrix") as details:
+                self._matrix = EmbeddingMatrix.load_or_build(
+                    self._table_dir, self._descs, embedding_model_key(), "ICD-CM embeddings",
+                    self._base_table_dir(),
+                )
+                details["rows"] = len(self._matrix)
+                details["embedding_bytes"] = self._matrix.nbytes
+                details["dim"] = self._matrix.dim
             logger.info(
-                "ICDCodingService: ChromaDB collection ready (%d ICD-10-CM codes)",
-                self._col.count(),
+                "ICDCodingService: shared embedding matrix ready (%d ICD-10-CM %s codes)",
+                len(self._matrix), self._version,
             )
+        else:
+            with track(f"{tag}.chroma") as details:
+                Path(_CHROMA_CM_DIR).mkdir(parents=True, exist_ok=True)
+                import chromadb
+                self._chroma = chromadb.PersistentClient(path=_CHROMA_CM_DIR)
+                self._col = self._chroma.get_or_create_collection(
+                    name=self._collection_name,
+                    metadata={"hnsw:space": "cosine"},
+                )
+                # Chroma's SQLite/HNSW handles are not fork-safe: app.serve only forks with
+                # SHARED_CODE_INDEX=true, where this branch is never taken
+
+                if self._col.count() == 0:
+                    self._populate()
+                else:
+                    logger.info(
+                        "ICDCodingService: ChromaDB collection ready (%d ICD-10-CM %s codes)",
+                        self._col.count(), self._version,
+                    )
+                details["rows"] = self._col.count()
+                # Raw float32 vectors only; the HNSW graph adds its own overhead on top
+                details["embedding_bytes"] = (
+                    details["rows"] * self._embedder.get_sentence_embedding_dimension() * 4
+                )
 
-        # Preload all leaf codes for TF-IDF
-        self._codes: list[str] = []
-        self._descs: list[str] = []
-        for code in cm.get_all_codes(with_dots=True):
-            if cm.is_leaf(code):
-                self._codes.append(code)
-                self._descs.append(cm.get_description(code))
-
-        logger.info("ICDCodingService: building TF-IDF index (%d codes) …", len(self._codes))
-        from sklearn.feature_extraction.text import TfidfVectorizer
+        logger.info("ICDCodingService: building lexical indexes (%d codes) …", len(self._codes))
+        from app.services.lexical_index import LEXICAL_SCORING, char_index, word_index
         import joblib
 
-        _cache_prefix = _DATA_DIR / "tfidf_cache" / f"icd_cm_{len(self._codes)}"
+        _cache_name = f"icd_cm_{len(self._codes)}" if bundled else f"icd_cm_{self._version}_{len(self._codes)}"
+        _cache_prefix = _DATA_DIR / "tfidf_cache" / _cache_name
         _cache_prefix.parent.mkdir(parents=True, exist_ok=True)
-        _word_path = str(_cache_prefix) + "_word.joblib"
-        _char_path = str(_cache_prefix) + "_char.joblib"
-
-        if Path(_word_path).exists() and Path(_char_path).exists():
-            logger.info("ICDCodingService: loading TF-IDF indexes from cache …")
-            self._tfidf, self._tfidf_matrix = joblib.load(_word_path)
-            self._char_tfidf, self._char_tfidf_matrix = joblib.load(_char_path)
-        else:
-            # Word-level TF-IDF (word bigrams) — exact/near-exact term matching
-            self._tfidf = TfidfVectorizer(ngram_range=(1, 2), min_df=1, sublinear_tf=True)
-            self._tfidf_matrix = self._tfidf.fit_transform(self._descs)
-            # Character-level n-gram TF-IDF — enables partial word / typo matching
-            self._char_tfidf = TfidfVectorizer(
-                analyzer="char_wb", ngram_range=(3, 4), min_df=1, sublinear_tf=True
-            )
-            self._char_tfidf_matrix = self._char_tfidf.fit_transform(self._descs)
-            joblib.dump((self._tfidf, self._tfidf_matrix), _word_path)
-            joblib.dump((self._char_tfidf, self._char_tfidf_matrix), _char_path)
-            logger.info("ICDCodingService: TF-IDF indexes saved to disk.")
+        _word_path = f"{_cache_prefix}_word_{LEXICAL_SCORING}.index.joblib"
+        _char_path = f"{_cache_prefix}_char.index.joblib"
+
+        with track(f"{tag}.lexical") as details:
+            if Path(_word_path).exists() and Path(_char_path).exists():
+                logger.info("ICDCodingService: loading lexical indexes from cache …")
+                # Memory-mapped: postings are shared page cache across worker processes
+                self._word_index = joblib.load(_word_path, mmap_mode="r")
+                self._char_index = joblib.load(_char_path, mmap_mode="r")
+            else:
+                # Word unigrams + bigrams (TF-IDF or BM25) — exact/near-exact term matching
+                self._word_index = word_index(self._descs)
+                # Character n-gram TF-IDF — enables partial word / typo matching
+                self._char_index = char_index(self._descs)
+                joblib.dump(self._word_index, _word_path)
+                joblib.dump(self._char_index, _char_path)
+                logger.info("ICDCodingService: lexical indexes saved to disk.")
+            details["word_nnz"] = self._word_index.nnz
+            details["char_nnz"] = self._char_index.nnz
+            details["index_bytes"] = self._word_index.nbytes + self._char_index.nbytes
+
+        # Precomputed chapter/block/category tree for browsing and roll-ups
+        # (from the bundled release; every version shares the one on disk)
+        from app.services.icd_hierarchy import ICDHierarchy
+        with track(f"{tag}.hierarchy"):
+            if ICDHierarchy.exists(_HIERARCHY_DIR):
+                self._hierarchy = ICDHierarchy.load(_HIERARCHY_DIR)
+            else:
+                import simple_icd_10_cm as cm
+                self._hierarchy = ICDHierarchy.load_or_build(cm, _HIERARCHY_DIR)
+
+        # Token-prefix index for keystroke-level typeahead in the code browser
+        from app.services.typeahead_index import TypeaheadIndex
+        with track(f"{tag}.typeahead"):
+            self._typeahead = TypeaheadIndex(self._codes, self._descs)
 
         # Optional: scispacy NER
         self._nlp = None
-        try:
-            import spacy
-            self._nlp = spacy.load("en_core_sci_md")
-            logger.info("ICDCodingService: scispacy en_core_sci_md loaded")
-        except Exception as exc:
-            logger.warning("ICDCodingService: scispacy unavailable (%s) — entity tier skipped", exc)
-
-        logger.info("ICDCodingService: ready")
-
-    def _populate(self, cm) -> None:
+        with track(f"{tag}.spacy") as details:
+            try:
+                from app.services.model_registry import load_spacy
+                self._nlp = load_spacy("en_core_sci_md")
+                logger.info("ICDCodingService: scispacy en_core_sci_md loaded")
+            except Exception as exc:
+                logger.warning("ICDCodingService: scispacy unavailable (%s) — entity tier skipped", exc)
+            details["loaded"] = self._nlp is not None
+
+        logger.info("ICDCodingService: ready (ICD-10-CM %s)", self._version)
+
+    def _load_code_table(self) -> tuple[list[str], list[str]]:
+        """
+        Return (codes, descriptions) of every billable ICD-10-CM leaf. The
+        simple_icd_10_cm package (~170 MB resident) is only imported to build
+        the bundled table on first run, so workers started afterwards never
+        load it; other versions are imported from their CMS codes file.
+        """
+        if not CodeTable.exists(self._table_dir):
+            source = version_file(CM, self._version)
+            if source is not None:
+                import_cm_codes_file(source, self._table_dir)
+            else:
+                import simple_icd_10_cm as cm
+                codes = [c for c in cm.get_all_codes(with_dots=True) if cm.is_leaf(c)]
+                CodeTable.from_lists(codes, [cm.get_description(c) for c in codes]).save(self._table_dir)
+        table = CodeTable.load(self._table_dir)
+        codes, descs = table.codes_list(), table.descs_list()
+        logger.info("ICDCodingService: loaded %d ICD-10-CM %s leaf codes", len(codes), self._version)
+        return codes, descs
+
+    def _base_table_dir(self) -> Optional[Path]:
+        """Code table of the closest version whose embeddings can seed this one's."""
+        from app.services.shared_embedder import embedding_model_key
+        from app.services.shared_index import EmbeddingMatrix
+
+        model_key = embedding_model_key()
+        base = base_version(CM, self._version, lambda v: EmbeddingMatrix.exists(_cm_table_dir(v), model_key))
+        return _cm_table_dir(base) if base is not None else None
+
+    def _populate(self) -> None:
         logger.info(
-            "ICDCodingService: first-run — populating ChromaDB from ICD-10-CM …"
+            "ICDCodingService: first-run — populating ChromaDB from ICD-10-CM %s …", self._version
         )
-        unique_data: dict[str, str] = {}
-        for code in cm.get_all_codes(with_dots=True):
-            if cm.is_leaf(code):
-                unique_data[code] = cm.get_description(code)
-
-        codes = list(unique_data.keys())
-        descs = list(unique_data.values())
+        codes, descs = self._codes, self._descs
         total = len(codes)
 
+        # Embeddings go through the on-disk matrix so a new version only encodes its delta
+        # (always full dimension: Chroma queries are not projected)
         logger.info("ICDCodingService: computing embeddings for %d codes (this may take a few minutes on first run) …", total)
-        from app.services.shared_embedder import encode_with_progress
-        embeddings = encode_with_progress(descs, batch_size=512, label="ICD-CM embeddings")
+        from app.services.shared_embedder import embedding_model_key
+        from app.services.shared_index import EmbeddingMatrix
+        embeddings = EmbeddingMatrix.load_or_build(
+            self._table_dir, descs, embedding_model_key(), "ICD-CM embeddings",
+            self._base_table_dir(), dim=0,
+        )
 
         logger.info("ICDCodingService: embeddings complete, upserting to ChromaDB …")
 
@@ -150,7 +294,7 @@ class ICDCodingService:
             end = min(start + batch_size, total)
             batch_codes = codes[start:end]
             batch_descs = descs[start:end]
-            batch_embs = embeddings[start:end].tolist()
+            batch_embs = embeddings.rows(start, end).tolist()
 
             self._col.upsert(
                 ids=batch_codes,
@@ -174,8 +318,63 @@ class ICDCodingService:
         symptoms: Optional[list[str]] = None,
         diagnosis_text: Optional[str] = None,
         top_k: int = 5,
+        deadline_ms: Optional[float] = None,
     ) -> list[ICDSuggestion]:
         """Return top-k ICD-10-CM suggestions for a clinical presentation."""
+        return self.suggest_with_report(
+            chief_complaint, symptoms, diagnosis_text, top_k, deadline_ms
+        )[0]
+
+    def suggest_with_report(
+        self,
+        chief_complaint: Optional[str] = None,
+        symptoms: Optional[list[str]] = None,
+        diagnosis_text: Optional[str] = None,
+        top_k: int = 5,
+        deadline_ms: Optional[float] = None,
+    ) -> tuple[list[ICDSuggestion], TierReport]:
+        """
+        suggest() plus a report of which tiers ran, were skipped or truncated
+        to meet `deadline_ms`, and which contributed to the answer. Tiers run
+        in priority order semantic → TF-IDF (always) → entity.
+        """
+        deadline = Deadline(deadline_ms)
+        report = TierReport(deadline_ms=deadline_ms)
+        text = self.suggest_text(chief_complaint, symptoms, diagnosis_text)
+        if not text:
+            return [], report
+
+        semantic: dict[str, ICDSuggestion] = {}
+        entity: dict[str, ICDSuggestion] = {}
+        lexical: dict[str, ICDSuggestion] = {}
+
+        tiers = self._suggest_tiers
+        tiers.run("semantic", deadline, report, self._tier1_semantic, text, top_k * 3, semantic)
+        tiers.run("tfidf", deadline, report, self._tier3_tfidf, text, top_k * 3, lexical, required=True)
+        if self._nlp is not None:
+            tiers.run("entity", deadline, report, self._tier2_entity, text, entity, deadline, report)
+
+        # Merge as if run in the original order: semantic, entity (higher confidence wins), TF-IDF (new codes only)
+        results = dict(semantic)
+        for code, suggestion in entity.items():
+            if code not in results or results[code].confidence < suggestion.confidence:
+                results[code] = suggestion
+        for code, suggestion in lexical.items():
+            results.setdefault(code, suggestion)
+
+        ranked = sorted(results.values(), key=lambda s: s.confidence, reverse=True)[:top_k]
+        sources = {s.source for s in ranked}
+        report.contributed = [t for t in ("semantic", "entity", "tfidf") if t in sources]
+        report.elapsed_ms = round(deadline.elapsed_ms(), 3)
+        return ranked, report
+
+    def suggest_text(
+        self,
+        chief_complaint: Optional[str] = None,
+        symptoms: Optional[list[str]] = None,
+        diagnosis_text: Optional[str] = None,
+    ) -> str:
+        """The normalized text suggest() embeds; empty when there is nothing to code."""
         parts = []
         if chief_complaint:
             parts.append(chief_complaint.strip())
@@ -183,184 +382,219 @@ class ICDCodingService:
             parts.extend(s.strip() for s in symptoms if s.strip())
         if diagnosis_text:
             parts.append(diagnosis_text.strip())
-
         if not parts:
-            return []
-
-        text = ". ".join(parts)
-        results: dict[str, ICDSuggestion] = {}
-
-        self._tier1_semantic(text, top_k * 3, results)
-        if self._nlp is not None:
-            self._tier2_entity(text, results)
-        self._tier3_tfidf(text, top_k * 3, results)
+            return ""
 
-        ranked = sorted(results.values(), key=lambda s: s.confidence, reverse=True)
-        return ranked[:top_k]
+        # Colloquial / vernacular phrases -> clinical terms ("bukhar" -> "fever")
+        from app.services.term_normalizer import normalize_clinical
+        return normalize_clinical(". ".join(parts))
 
-    def search(self, query: str, top_k: int = 10) -> list[ICDSuggestion]:
+    def search(
+        self, query: str, top_k: int = 10, deadline_ms: Optional[float] = None
+    ) -> list[ICDSuggestion]:
         """
         Keyword-dominant hybrid search for the code browser.
-        Scoring: 70% TF-IDF keyword + 30% semantic similarity.
+        Scoring: 40% word TF-IDF + 30% char n-gram + 30% semantic similarity.
         Exact code prefix and substring description matches get a priority boost.
         """
+        return self.search_with_report(query, top_k, deadline_ms)[0]
+
+    def search_with_report(
+        self, query: str, top_k: int = 10, deadline_ms: Optional[float] = None
+    ) -> tuple[list[ICDSuggestion], TierReport]:
+        """
+        search() plus a tier report. Tiers run in priority order word (always)
+        → char n-gram → semantic, each only if it fits in `deadline_ms`.
+        """
         import numpy as np
+        from app.services.hybrid_fusion import (
+            CHAR_WEIGHT, SEMANTIC_WEIGHT, WORD_WEIGHT, fuse_scores,
+        )
 
+        deadline = Deadline(deadline_ms)
+        report = TierReport(deadline_ms=deadline_ms)
         query = query.strip()
         if not query:
-            return []
+            return [], report
 
         # ── 1. Exact / prefix code match (e.g. "J06", "R50") ──────────
         normalised = query.upper().replace(" ", "").replace(".", "")
+        prefix_idx = self._typeahead.code_prefix(normalised, top_k)
 
         # Exact single-code lookup — return immediately if user typed a full code
-        for code in self._codes:
-            if code.upper().replace(".", "") == normalised:
-                return [ICDSuggestion(
-                    code=code,
-                    description=self._cm.get_description(code),
+        # (sorted prefix hits put an exact match first)
+        if prefix_idx and self._codes[prefix_idx[0]].replace(".", "") == normalised:
+            prefix_idx = prefix_idx[:1]
+
+        if prefix_idx:
+            report.run, report.contributed = ["exact"], ["exact"]
+            report.elapsed_ms = round(deadline.elapsed_ms(), 3)
+            return [
+                ICDSuggestion(
+                    code=self._codes[idx],
+                    description=self._descs[idx],
                     confidence=1.0,
                     source="exact",
-                )]
+                )
+                for idx in prefix_idx
+            ], report
 
-        prefix_hits: list[ICDSuggestion] = []
-        for code in self._codes:
-            if code.upper().replace(".", "").startswith(normalised):
-                prefix_hits.append(ICDSuggestion(
-                    code=code,
-                    description=self._cm.get_description(code),
-                    confidence=1.0,
-                    source="exact",
-                ))
-                if len(prefix_hits) >= top_k:
-                    break
-        if prefix_hits:
-            return prefix_hits
+        candidates = int(min(top_k * 10, len(self._codes)))
+        tiers: dict[str, tuple] = {}
 
-        # ── 2. TF-IDF keyword scores (word bigrams, 40% weight) ────────
-        kw_scores: dict[str, float] = {}
-        char_scores: dict[str, float] = {}
-        try:
-            query_vec = self._tfidf.transform([query])
-            raw = (self._tfidf_matrix @ query_vec.T).toarray().flatten()
-            candidates = int(min(top_k * 10, len(self._codes)))
-            top_idx = np.argpartition(raw, -candidates)[-candidates:]
-            max_kw = float(raw[top_idx].max()) or 1.0
-            for idx in top_idx:
-                if raw[idx] > 0:
-                    kw_scores[self._codes[idx]] = float(raw[idx]) / max_kw
-        except Exception as exc:
-            logger.warning("ICDCodingService.search TF-IDF: %s", exc)
+        # ── 2. Keyword scores (word bigrams, 40% weight) ───────────────
+        def _word() -> None:
+            try:
+                idx, raw = self._word_index.top(query, candidates)
+                if idx.size:
+                    tiers["word"] = (idx, raw / raw[0], WORD_WEIGHT)  # best first → max-normalised
+            except Exception as exc:
+                logger.warning("ICDCodingService.search TF-IDF: %s", exc)
 
         # ── 2b. Character n-gram scores (30% weight — partial word matching) ─
-        try:
-            char_vec = self._char_tfidf.transform([query])
-            char_raw = (self._char_tfidf_matrix @ char_vec.T).toarray().flatten()
-            candidates = int(min(top_k * 10, len(self._codes)))
-            top_idx = np.argpartition(char_raw, -candidates)[-candidates:]
-            max_char = float(char_raw[top_idx].max()) or 1.0
-            for idx in top_idx:
-                if char_raw[idx] > 0:
-                    char_scores[self._codes[idx]] = float(char_raw[idx]) / max_char
-        except Exception as exc:
-            logger.warning("ICDCodingService.search char TF-IDF: %s", exc)
+        def _char() -> None:
+            try:
+                idx, char_raw = self._char_index.top(query, candidates)
+                if idx.size:
+                    tiers["char"] = (idx, char_raw / char_raw[0], CHAR_WEIGHT)
+            except Exception as exc:
+                logger.warning("ICDCodingService.search char TF-IDF: %s", exc)
 
         # ── 3. Semantic scores (30% weight) ────────────────────────────
-        sem_scores: dict[str, tuple[float, str]] = {}  # code -> (score, description)
-        try:
-            emb = self._embedder.encode([query], show_progress_bar=False).tolist()[0]
-            n = min(top_k * 10, self._col.count())
-            if n > 0:
-                qr = self._col.query(
-                    query_embeddings=[emb],
-                    n_results=n,
-                    include=["documents", "metadatas", "distances"],
-                )
-                for meta, distance in zip(qr["metadatas"][0], qr["distances"][0]):
-                    score = max(0.0, 1.0 - distance / 2.0)
-                    sem_scores[meta["code"]] = (score, meta["description"])
-        except Exception as exc:
-            logger.warning("ICDCodingService.search semantic: %s", exc)
-
-        # ── 4. Merge: 40% word-kw + 30% char-kw + 30% semantic ────────
-        ql = query.lower()
-        all_codes = set(kw_scores) | set(char_scores) | set(sem_scores)
-        merged: list[ICDSuggestion] = []
-        for code in all_codes:
-            kw = kw_scores.get(code, 0.0)
-            ch = char_scores.get(code, 0.0)
-            sem, desc = sem_scores.get(code, (0.0, ""))
-            if not desc:
-                try:
-                    desc = self._cm.get_description(code)
-                except Exception:
-                    continue
+        def _semantic() -> None:
+            try:
+                hits = self._nearest(encode_cached([query])[0], candidates)
+                if hits:
+                    sem_idx = np.array([idx for idx, _ in hits], dtype=np.int64)
+                    sem_scores = np.maximum(0.0, 1.0 - np.array([d for _, d in hits]) / 2.0)
+                    tiers["semantic"] = (sem_idx, sem_scores, SEMANTIC_WEIGHT)
+            except Exception as exc:
+                logger.warning("ICDCodingService.search semantic: %s", exc)
+
+        self._search_tiers.run("word", deadline, report, _word, required=True)
+        self._search_tiers.run("char", deadline, report, _char)
+        self._search_tiers.run("semantic", deadline, report, _semantic)
+
+        # ── 4. Fuse on candidate indices; build objects for top_k only ─
+        top_idx, top_conf = fuse_scores(list(tiers.values()), self._descs_lower, query, top_k)
+        report.contributed = [
+            name for name, (idx, _, _) in tiers.items() if np.isin(top_idx, idx).any()
+        ]
+        report.elapsed_ms = round(deadline.elapsed_ms(), 3)
+        return [
+            ICDSuggestion(
+                code=self._codes[idx],
+                description=self._descs[idx],
+                confidence=conf,
+                source="hybrid",
+            )
+            for idx, conf in zip(top_idx.tolist(), top_conf.tolist())
+        ], report
 
-            substr_boost = 0.15 if ql in desc.lower() else 0.0
-            hybrid = round(min(0.4 * kw + 0.3 * ch + 0.3 * sem + substr_boost, 1.0), 4)
-            if hybrid > 0:
-                merged.append(ICDSuggestion(
-                    code=code,
-                    description=desc,
-                    confidence=hybrid,
-                    source="hybrid",
-                ))
+    def typeahead(self, query: str, top_k: int = 10) -> list[ICDSuggestion]:
+        """
+        Prefix-only lookup for as-you-type search: code prefixes plus description
+        word prefixes from the precomputed index. No TF-IDF, embedding or Chroma.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        return [
+            ICDSuggestion(
+                code=self._codes[idx],
+                description=self._descs[idx],
+                confidence=confidence,
+                source=source,
+            )
+            for idx, confidence, source in self._typeahead.lookup(query, top_k)
+        ]
 
-        merged.sort(key=lambda s: s.confidence, reverse=True)
-        return merged[:top_k]
+    def chapters(self) -> list[dict]:
+        """Top-level ICD-10-CM chapters."""
+        return self._hierarchy.chapters()
 
+    def children(self, code: str) -> Optional[list[dict]]:
+        """Direct children of a chapter, block or code (None if the code is unknown)."""
+        return self._hierarchy.children(code)
+
+    def ancestors(self, code: str) -> Optional[list[dict]]:
+        """Ancestors of a code, nearest first (None if the code is unknown)."""
+        return self._hierarchy.ancestors(code)
+
+    def rollup(self, codes: list[str], level: str) -> list[dict]:
+        """Group codes by their chapter / block / category and count them."""
+        return self._hierarchy.rollup(codes, level)
 
     # ------------------------------------------------------------------
     # Internal tiers
     # ------------------------------------------------------------------
 
-    def _tier1_semantic(self, text: str, top_k: int, results: dict[str, ICDSuggestion]) -> None:
-        embedding = self._embedder.encode([text], show_progress_bar=False).tolist()[0]
-        n = min(top_k, self._col.count())
+    def _nearest(self, embedding, n: int) -> list[tuple[int, float]]:
+        """
+        Up to n (code index, cosine distance) pairs, closest first, from the
+        shared embedding matrix or the ChromaDB collection.
+        """
+        if self._matrix is not None:
+            return self._matrix.nearest(embedding, n)
+        n = min(n, self._col.count())
         if n == 0:
-            return
+            return []
         qr = self._col.query(
-            query_embeddings=[embedding],
+            query_embeddings=[embedding.tolist()],
             n_results=n,
-            include=["documents", "metadatas", "distances"],
+            include=["metadatas", "distances"],
         )
-        for meta, distance in zip(qr["metadatas"][0], qr["distances"][0]):
-            # ChromaDB cosine distance: 0 = identical, 2 = opposite
+        return [
+            (self._code_index[meta["code"]], distance)
+            for meta, distance in zip(qr["metadatas"][0], qr["distances"][0])
+            if meta["code"] in self._code_index
+        ]
+
+    def _tier1_semantic(self, text: str, top_k: int, results: dict[str, ICDSuggestion]) -> None:
+        for idx, distance in self._nearest(encode_cached([text])[0], top_k):
+            # Cosine distance: 0 = identical, 2 = opposite
             confidence = round(max(0.0, 1.0 - distance / 2.0), 4)
-            code = meta["code"]
+            code = self._codes[idx]
             if code not in results or results[code].confidence < confidence:
                 results[code] = ICDSuggestion(
                     code=code,
-                    description=meta["description"],
+                    description=self._descs[idx],
                     confidence=confidence,
                     source="semantic",
                 )
 
-    def _tier2_entity(self, text: str, results: dict[str, ICDSuggestion]) -> None:
-        """Extract clinical entities with scispacy and search each one separately."""
+    def _tier2_entity(
+        self,
+        text: str,
+        results: dict[str, ICDSuggestion],
+        deadline: Optional[Deadline] = None,
+        report: Optional[TierReport] = None,
+    ) -> None:
+        """
+        Extract clinical entities with scispacy and search each one separately,
+        stopping between entities once the deadline has passed.
+        """
         try:
             doc = self._nlp(text[:512])
             seen_ents: set[str] = set()
             for ent in doc.ents:
+                if deadline is not None and deadline.expired():
+                    if report is not None:
+                        report.truncated.append("entity")
+                    break
                 ent_text = ent.text.strip()
                 if not ent_text or ent_text.lower() in seen_ents:
                     continue
                 seen_ents.add(ent_text.lower())
 
-                emb = self._embedder.encode([ent_text], show_progress_bar=False).tolist()[0]
-                qr = self._col.query(
-                    query_embeddings=[emb],
-                    n_results=3,
-                    include=["metadatas", "distances"],
-                )
-                for meta, distance in zip(qr["metadatas"][0], qr["distances"][0]):
+                for idx, distance in self._nearest(encode_cached([ent_text])[0], 3):
                     # Slight penalty vs direct semantic so entity tier doesn't dominate
                     confidence = round(max(0.0, (1.0 - distance / 2.0) * 0.92), 4)
-                    code = meta["code"]
+                    code = self._codes[idx]
                     if code not in results or results[code].confidence < confidence:
                         results[code] = ICDSuggestion(
                             code=code,
-                            description=meta["description"],
+                            description=self._descs[idx],
                             confidence=confidence,
                             source="entity",
                         )
@@ -368,18 +602,13 @@ class ICDCodingService:
             logger.warning("ICDCodingService._tier2_entity: %s", exc)
 
     def _tier3_tfidf(self, text: str, top_k: int, results: dict[str, ICDSuggestion]) -> None:
-        import numpy as np
-
         try:
-            query_vec = self._tfidf.transform([text])
-            scores = (self._tfidf_matrix @ query_vec.T).toarray().flatten()
-            top_indices = scores.argsort()[-top_k:][::-1]
-            for idx in top_indices:
-                raw_score = float(scores[idx])
+            top_indices, scores = self._word_index.top(text, top_k)
+            for idx, raw_score in zip(top_indices.tolist(), scores.tolist()):
                 if raw_score < 0.01:
                     continue
                 code = self._codes[idx]
-                # Scale TF-IDF score to confidence range (typically 0-0.3 raw)
+                # Scale lexical score to confidence range (typically 0-0.3 raw)
                 confidence = round(min(raw_score * 2.5, 0.85), 4)
                 if code not in results:
                     results[code] = ICDSuggestion(
@@ -0,0 +1,213 @@
+"""
+Precomputed ICD-10-CM hierarchy (chapter → block → category → subcategories).
+
+simple_icd_10_cm answers hierarchy questions by walking its XML tree per call,
+which is too slow for browsing and analytics. This module flattens the tree
+once into NumPy arrays stored next to the other code tables:
+  parent       : int32 parent node id (-1 for chapters)
+  kind         : int8 node kind (0 chapter, 1 block, 2 category, 3 subcategory)
+  child_*      : CSR children lists in tabular order
+  level_anc    : int32 (3, n) ancestor-or-self at chapter / block / category
+                 level (-1 when the node sits above that level)
+Rolling any code list up to a level is then one array gather.
+
+Single-code blocks share their name with the category they contain (block
+"B10" holds category "B10"); name lookups resolve to the more specific node,
+matching simple_icd_10_cm.
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from app.services.code_table import CodeTable
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("chapter", "block", "category")
+_KIND_NAMES = ("chapter", "block", "category", "subcategory")
+_ARRAYS = ("parent", "kind", "child_offsets", "child_ids", "level_anc")
+
+
+class ICDHierarchy:
+    """Read-only, array-backed ICD-10-CM tree."""
+
+    def __init__(self, nodes: CodeTable, arrays: dict[str, np.ndarray]) -> None:
+        self._nodes = nodes
+        self._codes = nodes.codes_list()
+        self._parent = arrays["parent"]
+        self._kind = arrays["kind"]
+        self._child_offsets = arrays["child_offsets"]
+        self._child_ids = arrays["child_ids"]
+        self._level_anc = arrays["level_anc"]
+
+        # Plain lists for per-node reads (browsing touches few nodes, but often)
+        self._descs = nodes.descs_list()
+        self._levels = [_KIND_NAMES[k] for k in np.asarray(self._kind).tolist()]
+        self._leaf = (np.diff(np.asarray(self._child_offsets)) == 0).tolist()
+        self._parents = np.asarray(self._parent).tolist()
+
+        # Later (more specific) nodes win for duplicated names; dotless aliases too
+        self._index: dict[str, int] = {}
+        for i, code in enumerate(self._codes):
+            self._index[code] = i
+            self._index[code.replace(".", "")] = i
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    # ------------------------------------------------------------------
+    # Build / persistence
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def exists(cache_dir: Path) -> bool:
+        return CodeTable.exists(cache_dir) and all((cache_dir / f"{a}.npy").exists() for a in _ARRAYS)
+
+    @classmethod
+    def load(cls, cache_dir: Path) -> "ICDHierarchy":
+        nodes = CodeTable.load(cache_dir)
+        arrays = {a: np.load(cache_dir / f"{a}.npy", mmap_mode="r") for a in _ARRAYS}
+        return cls(nodes, arrays)
+
+    @classmethod
+    def load_or_build(cls, cm, cache_dir: Path) -> "ICDHierarchy":
+        if cls.exists(cache_dir):
+            return cls.load(cache_dir)
+
+        hierarchy = cls.build(cm)
+        hierarchy.save(cache_dir)
+        return hierarchy
+
+    @classmethod
+    def build(cls, cm) -> "ICDHierarchy":
+        """Flatten the simple_icd_10_cm tree once, resolving parent names by node kind."""
+        all_codes = cm.get_all_codes(with_dots=True)
+        n = len(all_codes)
+        parent = np.full(n, -1, dtype=np.int32)
+        entries: list[tuple[str, int]] = []
+        block_ids: dict[str, int] = {}
+        code_ids: dict[str, int] = {}
+        chapter = -1
+        for i, code in enumerate(all_codes):
+            if cm.is_chapter(code):
+                kind, chapter = 0, i
+            elif cm.is_block(code) and code not in block_ids:
+                # First occurrence of a duplicated name is the block; blocks are
+                # flat under their chapter, so the parent is the last chapter seen.
+                kind, parent[i] = 1, chapter
+                block_ids[code] = i
+            elif cm.is_category(code):
+                kind, parent[i] = 2, block_ids[cm.get_parent(code)]
+                code_ids[code] = i
+            else:
+                kind, parent[i] = 3, code_ids[cm.get_parent(code)]
+                code_ids[code] = i
+            entries.append((code, kind))
+
+        kind = np.array([k for _, k in entries], dtype=np.int8)
+
+        # Children CSR: pre-order keeps siblings in tabular order under a stable sort
+        order = np.argsort(parent, kind="stable")
+        order = order[parent[order] >= 0]
+        counts = np.bincount(parent[order], minlength=n)
+        child_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=child_offsets[1:])
+
+        # Ancestor-or-self per level; parents precede children so one pass suffices
+        level_anc = np.full((len(LEVELS), n), -1, dtype=np.int32)
+        for i in range(n):
+            p = parent[i]
+            if p >= 0:
+                level_anc[:, i] = level_anc[:, p]
+            k = kind[i]
+            if k == 0:
+                level_anc[0, i] = i
+            elif k == 1:
+                level_anc[1, i] = i
+            elif k == 2:
+                level_anc[2, i] = i
+
+        descs = [cm.get_description(code) for code, _ in entries]
+        nodes = CodeTable.from_lists([c for c, _ in entries], descs)
+        arrays = {
+            "parent": parent,
+            "kind": kind,
+            "child_offsets": child_offsets,
+            "child_ids": order.astype(np.int32),
+            "level_anc": level_anc,
+        }
+        logger.info("ICDHierarchy: built %d nodes", n)
+        return cls(nodes, arrays)
+
+    def save(self, cache_dir: Path) -> None:
+        self._nodes.save(cache_dir)
+        for name in _ARRAYS:
+            tmp = cache_dir / f".{name}.npy.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(getattr(self, f"_{name}")), allow_pickle=False)
+            tmp.replace(cache_dir / f"{name}.npy")
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def node_id(self, code: str) -> Optional[int]:
+        code = code.strip().upper()
+        idx = self._index.get(code)
+        if idx is None:
+            idx = self._index.get(code.replace(".", ""))
+        return idx
+
+    def describe(self, idx: int) -> dict[str, Any]:
+        return {
+            "code": self._codes[idx],
+            "description": self._descs[idx],
+            "level": self._levels[idx],
+            "is_leaf": self._leaf[idx],
+        }
+
+    def chapters(self) -> list[dict[str, Any]]:
+        return [self.describe(int(i)) for i in np.flatnonzero(np.asarray(self._kind) == 0)]
+
+    def children(self, code: str) -> Optional[list[dict[str, Any]]]:
+        idx = self.node_id(code)
+        if idx is None:
+            return None
+        lo, hi = int(self._child_offsets[idx]), int(self._child_offsets[idx + 1])
+        return [self.describe(int(c)) for c in self._child_ids[lo:hi]]
+
+    def ancestors(self, code: str) -> Optional[list[dict[str, Any]]]:
+        """Ancestors nearest-first (same order as simple_icd_10_cm.get_ancestors)."""
+        idx = self.node_id(code)
+        if idx is None:
+            return None
+        chain: list[dict[str, Any]] = []
+        p = self._parents[idx]
+        while p >= 0:
+            chain.append(self.describe(p))
+            p = self._parents[p]
+        return chain
+
+    def rollup_ids(self, codes: Iterable[str], level: str) -> np.ndarray:
+        """Map each code to its ancestor-or-self node id at `level` (-1 if unknown)."""
+        if level not in LEVELS:
+            raise ValueError(f"level must be one of {LEVELS}")
+        ids = np.array([-1 if (i := self.node_id(c)) is None else i for c in codes], dtype=np.int64)
+        out = np.full(ids.shape, -1, dtype=np.int32)
+        known = ids >= 0
+        out[known] = self._level_anc[LEVELS.index(level)][ids[known]]
+        return out
+
+    def rollup(self, codes: Iterable[str], level: str) -> list[dict[str, Any]]:
+        """Count codes per hierarchy group at `level`, most frequent first."""
+        counts = Counter(int(i) for i in self.rollup_ids(codes, level))
+        unmapped = counts.pop(-1, 0)
+        groups = [dict(self.describe(i), count=c) for i, c in counts.most_common()]
+        if unmapped:
+            groups.append({"code": None, "description": "Unmapped", "level": level, "is_leaf": False, "count": unmapped})
+        return groups
@@ -0,0 +1,182 @@
+"""
+Inverted-index lexical retrieval for the coding services.
+
+The TF-IDF tiers used to score every code on every query (`matrix @ query.T`,
+densified, then a full argsort). Here the document-term weights are stored as
+postings in term order (CSC layout), so a query only touches the documents
+that share a term with it, and top-k is selected among those.
+
+Two scorings share the layout:
+  tfidf : the fitted TfidfVectorizer's L2-normalised weights, so scores equal
+          the cosine similarity the matrix product produced
+  bm25  : Okapi BM25 weights precomputed per posting, divided by the query's
+          best achievable score so results stay in [0, 1]
+
+The word tier uses LEXICAL_SCORING; the character n-gram tier is always tfidf.
+"""
+from __future__ import annotations
+
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_SCORING = os.getenv("LEXICAL_SCORING", "tfidf").strip().lower()
+_BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+_BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# When a query's postings add up to more than n_docs / _DENSE_FRACTION entries,
+# accumulating into a dense buffer is cheaper than sorting the doc ids.
+_DENSE_FRACTION = 8
+
+_EMPTY_IDX = np.empty(0, dtype=np.int64)
+_EMPTY_SCORES = np.empty(0, dtype=np.float64)
+
+
+class LexicalIndex:
+    """Term → (doc ids, weights) postings with a fitted query vectorizer."""
+
+    def __init__(
+        self,
+        vectorizer,
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        n_docs: int,
+        scoring: str,
+        term_bound: np.ndarray | None = None,
+    ) -> None:
+        self.vectorizer = vectorizer
+        self.scoring = scoring
+        self._indptr = indptr
+        self._doc_ids = doc_ids
+        self._weights = weights
+        self._n_docs = n_docs
+        self._term_bound = term_bound  # bm25: per-term max weight, idf * (k1 + 1)
+
+    @property
+    def nnz(self) -> int:
+        """Number of stored postings (non-zero document-term weights)."""
+        return int(self._doc_ids.size)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the posting arrays (excludes the vectorizer vocabulary)."""
+        arrays = (self._indptr, self._doc_ids, self._weights, self._term_bound)
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+    @property
+    def n_terms(self) -> int:
+        return int(self._indptr.size - 1)
+
+    # ------------------------------------------------------------------
+    # Build
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def tfidf(cls, vectorizer, texts: list[str]) -> "LexicalIndex":
+        """Fit a TfidfVectorizer and keep its weights as postings."""
+        matrix = vectorizer.fit_transform(texts).tocsc()
+        matrix.sort_indices()
+        return cls(
+            vectorizer,
+            matrix.indptr.astype(np.int64),
+            matrix.indices.astype(np.int32),
+            matrix.data.astype(np.float32),
+            matrix.shape[0],
+            "tfidf",
+        )
+
+    @classmethod
+    def bm25(cls, vectorizer, texts: list[str], k1: float = _BM25_K1, b: float = _BM25_B) -> "LexicalIndex":
+        """Fit a CountVectorizer and precompute BM25 weights for every posting."""
+        counts = vectorizer.fit_transform(texts)
+        n_docs, n_terms = counts.shape
+        doc_len = np.asarray(counts.sum(axis=1), dtype=np.float64).ravel()
+        avg_len = doc_len.mean() or 1.0
+
+        counts = counts.tocsc()
+        counts.sort_indices()
+        df = np.diff(counts.indptr)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        tf = counts.data.astype(np.float64)
+        docs = counts.indices
+        term_idf = np.repeat(idf, df)
+        weights = term_idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * doc_len[docs] / avg_len))
+        return cls(
+            vectorizer,
+            counts.indptr.astype(np.int64),
+            docs.astype(np.int32),
+            weights.astype(np.float32),
+            n_docs,
+            "bm25",
+            term_bound=idf * (k1 + 1.0),
+        )
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+
+    def scores(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """(doc indices, scores) for every document sharing a term with `text`."""
+        q = self.vectorizer.transform([text])
+        terms, q_weights = q.indices, q.data
+        if terms.size == 0:
+            return _EMPTY_IDX, _EMPTY_SCORES
+
+        starts, ends = self._indptr[terms], self._indptr[terms + 1]
+        total = int((ends - starts).sum())
+        if total == 0:
+            return _EMPTY_IDX, _EMPTY_SCORES
+        docs = np.concatenate([self._doc_ids[s:e] for s, e in zip(starts, ends)])
+        contrib = np.concatenate(
+            [self._weights[s:e] * w for s, e, w in zip(starts, ends, q_weights)]
+        )
+
+        if total > self._n_docs // _DENSE_FRACTION:
+            acc = np.bincount(docs, weights=contrib, minlength=self._n_docs)
+            touched = np.flatnonzero(acc)
+            scores = acc[touched]
+        else:
+            touched, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=contrib)
+            touched = touched.astype(np.int64)
+
+        if self._term_bound is not None:
+            scores = scores / float(np.dot(q_weights, self._term_bound[terms]))
+        return touched, scores
+
+    def top(self, text: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Up to k (doc indices, scores) with positive score, best first."""
+        idx, scores = self.scores(text)
+        keep = scores > 0
+        idx, scores = idx[keep], scores[keep]
+        if k <= 0 or idx.size == 0:
+            return _EMPTY_IDX, _EMPTY_SCORES
+        if idx.size > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            idx, scores = idx[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return idx[order], scores[order]
+
+
+def word_index(texts: list[str], scoring: str = LEXICAL_SCORING) -> LexicalIndex:
+    """Word unigram + bigram index — exact / near-exact term matching."""
+    if scoring == "bm25":
+        from sklearn.feature_extraction.text import CountVectorizer
+        return LexicalIndex.bm25(CountVectorizer(ngram_range=(1, 2), min_df=1), texts)
+    if scoring != "tfidf":
+        logger.warning("LexicalIndex: unknown LEXICAL_SCORING=%r — using tfidf", scoring)
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return LexicalIndex.tfidf(TfidfVectorizer(ngram_range=(1, 2), min_df=1, sublinear_tf=True), texts)
+
+
+def char_index(texts: list[str]) -> LexicalIndex:
+    """Character n-gram index — partial word / typo matching."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return LexicalIndex.tfidf(
+        TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 4), min_df=1, sublinear_tf=True), texts
+    )
@@ -1,14 +1,17 @@
 # backend/app/services/local_ml_service.py
 import json
 import asyncio
+import base64
 import os
 from fastapi import WebSocket
 import websockets
+from app.services.audio_transport import AUDIO_SUBPROTOCOL, receive_audio
 
 class LocalMLService:
     def __init__(self, ml_node_url: str | None = None):
         self.ml_node_url = ml_node_url or os.getenv("ML_NODE_URL", "ws://127.0.0.1:8002/ws/process-audio")
         self.ml_websocket = None
+        self.ml_binary_audio = False
     
     async def handle_session(self, browser_ws: WebSocket):
         """
@@ -19,9 +22,13 @@ class LocalMLService:
         try:
             # Connect to the local ML Node and disable keepalive timeouts
             # because heavy ML inference might block the event loop or take longer than default pings allow
-            async with websockets.connect(self.ml_node_url, ping_interval=None, ping_timeout=None) as ml_ws:
+            # Offer binary audio; an ML node that does not select the subprotocol gets JSON
+            async with websockets.connect(
+                self.ml_node_url, ping_interval=None, ping_timeout=None, subprotocols=[AUDIO_SUBPROTOCOL]
+            ) as ml_ws:
                 self.ml_websocket = ml_ws
-                print(f"--- Connected to Local ML Node ({self.ml_node_url}) ---")
+                self.ml_binary_audio = ml_ws.subprotocol == AUDIO_SUBPROTOCOL
+                print(f"--- Connected to Local ML Node ({self.ml_node_url}, audio: {'binary' if self.ml_binary_audio else 'json'}) ---")
                 
                 # Start parallel forwarding tasks
                 receive_task = asyncio.create_task(self._receive_from_ml(browser_ws))
@@ -40,18 +47,20 @@ class LocalMLService:
         """Receives audio from browser and pushes to ML Node."""
         try:
             while True:
-                message = await browser_ws.receive_text()
-                data = json.loads(message)
+                audio = await receive_audio(browser_ws)
+                if audio is None or not self.ml_websocket:
+                    continue
 
-                if "realtimeInput" in data:
-                    media_chunk = data["realtimeInput"]["mediaChunks"][0]
-                    pcm_b64 = media_chunk["data"]
-                    
-                    # We just forward the base64 audio exactly as it arrived
-                    if self.ml_websocket:
-                        await self.ml_websocket.send(json.dumps({
-                            "audio": pcm_b64
-                        }))
+                # Forward as-is when both hops use the same format; convert only across formats
+                if isinstance(audio, bytes):
+                    if self.ml_binary_audio:
+                        await self.ml_websocket.send(audio)
+                    else:
+                        await self.ml_websocket.send(json.dumps({"audio": base64.b64encode(audio).decode("ascii")}))
+                elif self.ml_binary_audio:
+                    await self.ml_websocket.send(base64.b64decode(audio))
+                else:
+                    await self.ml_websocket.send(json.dumps({"audio": audio}))
         except Exception as e:
             print(f"Error forwarding audio to ML node: {e}")
 
@@ -0,0 +1,267 @@
+"""
+Local model registry: checksum-verified model directories with no hub lookups.
+
+The registry is a directory (MODEL_REGISTRY_DIR, default backend/model_registry)
+holding one sub-directory per model plus manifest.json:
+
+    {"models": {"all-MiniLM-L6-v2": {"kind": "sentence-transformers",
+                                     "version": "<hub commit>",
+                                     "path": "all-MiniLM-L6-v2",
+                                     "files": {"model.safetensors": "<sha256>", ...}}}}
+
+resolve(name) returns the verified local directory for a registered model.
+Sentence-transformers weights are stored as safetensors, which transformers
+reads through a memory map. Files are re-hashed only when their size or
+mtime differ from the last successful verification (MODEL_VERIFY=changed), or
+on every load (always), or never (off).
+
+With MODEL_STRICT_OFFLINE=true the Hugging Face offline switches are set
+before any HF library is imported, and a model missing from the registry is
+an error instead of a hub download, so start-up does no network I/O.
+
+Populate the registry once where the models are available (the Docker build):
+    python -m app.services.model_registry add-embedder all-MiniLM-L6-v2
+    python -m app.services.model_registry add-spacy en_core_sci_md
+    python -m app.services.model_registry verify
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_REGISTRY_DIR = Path(
+    os.getenv("MODEL_REGISTRY_DIR") or Path(__file__).resolve().parent.parent.parent / "model_registry"
+)
+MODEL_STRICT_OFFLINE = os.getenv("MODEL_STRICT_OFFLINE", "false").lower() == "true"
+_VERIFY_MODE = os.getenv("MODEL_VERIFY", "changed").lower()  # always | changed | off
+_MANIFEST_FILE = "manifest.json"
+_STAMP_FILE = "verified.json"
+_HASH_BLOCK = 1 << 20
+
+if MODEL_STRICT_OFFLINE:
+    # huggingface_hub / transformers read these once, at import time
+    for _var in ("HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE", "HF_DATASETS_OFFLINE"):
+        os.environ[_var] = "1"
+
+
+class ModelRegistryError(RuntimeError):
+    pass
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_key(path: Path) -> list[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+class ModelRegistry:
+    """manifest.json plus one verified directory per model."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._lock = threading.Lock()
+        self._verified: set[str] = set()
+        manifest_path = root / _MANIFEST_FILE
+        self._manifest = (
+            json.loads(manifest_path.read_text()) if manifest_path.exists() else {"models": {}}
+        )
+
+    def models(self) -> dict[str, dict]:
+        return dict(self._manifest["models"])
+
+    def entry(self, name: str) -> Optional[dict]:
+        return self._manifest["models"].get(name)
+
+    # ------------------------------------------------------------------
+    # Lookup / verification
+    # ------------------------------------------------------------------
+
+    def path(self, name: str) -> Optional[Path]:
+        """Verified local directory of a registered model, or None if not registered."""
+        entry = self.entry(name)
+        if entry is None:
+            return None
+        with self._lock:
+            if name not in self._verified:
+                self.verify(name, force=_VERIFY_MODE == "always")
+                self._verified.add(name)
+        return self.root / entry["path"]
+
+    def verify(self, name: str, force: bool = False) -> int:
+        """
+        Check every manifest file of `name` against its sha256; returns how many
+        files were hashed. Raises ModelRegistryError on a missing or altered file.
+        """
+        entry = self.entry(name)
+        if entry is None:
+            raise ModelRegistryError(f"model {name!r} is not in the registry at {self.root}")
+        if _VERIFY_MODE == "off" and not force:
+            return 0
+
+        model_dir = self.root / entry["path"]
+        stamps = self._read_stamps()
+        known = stamps.get(name, {})
+        fresh: dict[str, list[int]] = {}
+        hashed = 0
+        for rel, expected in entry["files"].items():
+            path = model_dir / rel
+            if not path.is_file():
+                raise ModelRegistryError(f"{name}: missing file {rel}")
+            key = _stat_key(path)
+            if force or known.get(rel) != key:
+                hashed += 1
+                if _sha256(path) != expected:
+                    raise ModelRegistryError(f"{name}: checksum mismatch for {rel}")
+            fresh[rel] = key
+        if hashed:
+            stamps[name] = fresh
+            self._write_stamps(stamps)
+        logger.info("ModelRegistry: %s %s verified (%d files hashed)", name, entry["version"], hashed)
+        return hashed
+
+    # ------------------------------------------------------------------
+    # Registration
+    # ------------------------------------------------------------------
+
+    def register(self, name: str, kind: str, version: str, source_dir: Path) -> dict:
+        """Copy a model directory into the registry and record its checksums."""
+        dest = self.root / name
+        if source_dir.resolve() != dest.resolve():
+            if dest.exists():
+                shutil.rmtree(dest)
+            shutil.copytree(source_dir, dest)
+        files = {
+            str(p.relative_to(dest)): _sha256(p)
+            for p in sorted(dest.rglob("*")) if p.is_file()
+        }
+        entry = {"kind": kind, "version": version, "path": name, "files": files}
+        self._manifest["models"][name] = entry
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".{_MANIFEST_FILE}.tmp"
+        tmp.write_text(json.dumps(self._manifest, indent=2, sort_keys=True))
+        tmp.replace(self.root / _MANIFEST_FILE)
+        logger.info("ModelRegistry: registered %s %s (%d files)", name, version, len(files))
+        return entry
+
+    def _read_stamps(self) -> dict:
+        path = self.root / _STAMP_FILE
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_stamps(self, stamps: dict) -> None:
+        # Best effort: a read-only registry is simply re-hashed on the next start
+        try:
+            tmp = self.root / f".{_STAMP_FILE}.tmp"
+            tmp.write_text(json.dumps(stamps))
+            tmp.replace(self.root / _STAMP_FILE)
+        except OSError as exc:
+            logger.debug("ModelRegistry: could not record verification stamps: %s", exc)
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(_REGISTRY_DIR)
+    return _registry
+
+
+def resolve(name: str) -> str:
+    """
+    Load path for `name`: its verified registry directory, otherwise the bare
+    name (hub cache / installed package) unless MODEL_STRICT_OFFLINE is set.
+    """
+    path = get_registry().path(name)
+    if path is not None:
+        return str(path)
+    if MODEL_STRICT_OFFLINE:
+        raise ModelRegistryError(
+            f"model {name!r} is not in the registry at {_REGISTRY_DIR} and MODEL_STRICT_OFFLINE=true"
+        )
+    logger.warning("ModelRegistry: %s not registered — loading it by name (may contact the hub)", name)
+    return name
+
+
+_spacy_models: dict[str, object] = {}
+_spacy_lock = threading.Lock()
+
+
+def load_spacy(name: str):
+    """Shared spaCy pipeline, loaded once per process from the registry when registered."""
+    with _spacy_lock:
+        if name not in _spacy_models:
+            import spacy
+            _spacy_models[name] = spacy.load(resolve(name))
+        return _spacy_models[name]
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def _add_embedder(registry: ModelRegistry, name: str) -> None:
+    import tempfile
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(name)
+    version = getattr(model[0].auto_model.config, "_commit_hash", None) or "unknown"
+    with tempfile.TemporaryDirectory() as tmp:
+        model.save(tmp, safe_serialization=True)
+        registry.register(name, "sentence-transformers", version, Path(tmp))
+
+
+def _add_spacy(registry: ModelRegistry, name: str) -> None:
+    import tempfile
+    import spacy
+
+    nlp = spacy.load(name)
+    with tempfile.TemporaryDirectory() as tmp:
+        nlp.to_disk(tmp)
+        registry.register(name, "spacy", nlp.meta.get("version", "unknown"), Path(tmp))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the local model registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("add-embedder").add_argument("name")
+    sub.add_parser("add-spacy").add_argument("name")
+    sub.add_parser("verify")
+    sub.add_parser("list")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    registry = get_registry()
+    if args.command == "add-embedder":
+        _add_embedder(registry, args.name)
+    elif args.command == "add-spacy":
+        _add_spacy(registry, args.name)
+    elif args.command == "verify":
+        for name in registry.models():
+            registry.verify(name, force=True)
+    else:
+        for name, entry in registry.models().items():
+            print(f"{name}\t{entry['kind']}\t{entry['version']}\t{len(entry['files'])} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,156 +3,373 @@
 ICD-10-PCS (procedure) auto-coding service.
 Uses the CMS FY2025 ICD-10-PCS order file (publicly available, no license required).
 
-On first startup the order file is downloaded from CMS, parsed, and indexed into
-a persistent ChromaDB collection. Subsequent starts are instant.
+On first startup the order file is imported (a local .txt/.zip via
+ICD10_PCS_ORDER_FILE, or streamed from CMS), parsed in bulk into a compact code
+table, and indexed into a persistent ChromaDB collection. Subsequent starts are
+instant.
+
+One instance per code-set version (see code_sets.py), as for ICD-10-CM;
+further fiscal years are imported from their CMS order file and embedded as a
+delta against a version that is already built.
 
 3-tier pipeline mirrors icd_coding_service:
   Tier 1: semantic (sentence-transformers + ChromaDB)
   Tier 2: scispacy entity extraction -> semantic lookup per entity
-  Tier 3: TF-IDF cosine similarity
+  Tier 3: lexical (TF-IDF or BM25 over an inverted index)
 """
 
 from __future__ import annotations
 
-import io
 import logging
+import os
 import zipfile
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterator, Optional
 
-import requests
+import numpy as np
 from pydantic import BaseModel
 
+from app.services.code_sets import BUNDLED_VERSION, PCS, base_version, select_version, version_file, versions
+from app.services.code_table import CodeTable
+from app.services.shared_embedder import encode_cached
+from app.services.shared_index import SHARED_CODE_INDEX
+from app.services.tier_budget import Deadline, TierReport, TierRunner
+
 logger = logging.getLogger(__name__)
 
 _DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
 _CHROMA_PCS_DIR = str(_DATA_DIR / "chroma" / "icd_pcs")
 _PCS_TXT_PATH = _DATA_DIR / "icd10pcs_order_2025.txt"
+_PCS_ZIP_PATH = _DATA_DIR / "icd10pcs_order_2025.zip"
+_PCS_TABLE_DIR = _DATA_DIR / "code_tables" / "icd_pcs_2025"  # bundled release
+_PCS_SOURCE_ENV = os.getenv("ICD10_PCS_ORDER_FILE", "")
+_PCS_ALLOW_DOWNLOAD = os.getenv("PCS_ALLOW_DOWNLOAD", "true").lower() == "true"
+_PCS_BLOCK_SIZE = 1 << 20  # 1 MiB read blocks for streaming parse/download
 _EMBEDDING_MODEL = "all-MiniLM-L6-v2"
-_COLLECTION_NAME = "icd10_pcs_v2"
+_COLLECTION_NAME = "icd10_pcs_v2"  # bundled release; other versions get icd10_pcs_<version>
+
+# Starting per-tier cost estimates (ms); refined from observed latencies
+_SUGGEST_TIER_COST_MS = {"semantic": 25.0, "tfidf": 3.0, "entity": 150.0}
+_SEARCH_TIER_COST_MS = {"word": 2.0, "char": 4.0, "semantic": 25.0}
 
 # CMS FY2025 ICD-10-PCS order file (public domain)
 _CMS_PCS_URL = "https://www.cms.gov/files/zip/2025-icd-10-pcs-order-file-long-and-abbreviated-titles.zip"
 
 
+def _pcs_table_dir(version: str) -> Path:
+    if version == BUNDLED_VERSION:
+        return _PCS_TABLE_DIR
+    return _DATA_DIR / "code_tables" / f"icd_pcs_{version}"
+
+
+def _parse_pcs_block(block: bytes) -> Iterator[tuple[str, str]]:
+    """
+    Parse a block of complete lines from the CMS fixed-width order file.
+    Format (1-indexed columns):
+      cols  1-5  : sequence number
+      col   6    : space
+      cols  7-13 : 7-character ICD-10-PCS code
+      col   14   : space
+      col   15   : valid flag (1 = valid billable code, 0 = header)
+      col   16   : space
+      cols 17-76 : short description (60 chars)
+      col   77   : space
+      cols 78+   : long description
+
+    Line boundaries, the valid flag and the code column are resolved in bulk on
+    a uint8 view of the block; only valid rows are sliced into Python strings.
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(buf == 0x0A)
+    if ends.size == 0:
+        return
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # Tolerate CRLF line endings
+    ends = ends - ((ends > starts) & (buf[np.maximum(ends - 1, 0)] == 0x0D))
+
+    keep = (ends - starts) >= 16
+    keep[keep] = buf[starts[keep] + 14] == ord("1")  # skip header/section rows
+    starts, ends = starts[keep], ends[keep]
+    if starts.size == 0:
+        return
+
+    code_cols = buf[starts[:, None] + np.arange(6, 13)]
+    valid = (code_cols > 0x20).all(axis=1)
+    starts, ends, code_cols = starts[valid], ends[valid], code_cols[valid]
+    codes = np.ascontiguousarray(code_cols).view("S7").ravel()
+
+    for code, s, e in zip(codes.tolist(), starts.tolist(), ends.tolist()):
+        desc = block[s + 77:e].strip() or block[s + 16:min(s + 76, e)].strip()
+        if desc:
+            yield code.decode("ascii"), desc.decode("utf-8", errors="replace")
+
+
+def _iter_pcs_records(stream: BinaryIO) -> Iterator[tuple[str, str]]:
+    """Stream (code, description) pairs from an order file in fixed-size blocks."""
+    tail = b""
+    while True:
+        chunk = stream.read(_PCS_BLOCK_SIZE)
+        if not chunk:
+            break
+        data = tail + chunk
+        cut = data.rfind(b"\n") + 1
+        tail = data[cut:]
+        if cut:
+            yield from _parse_pcs_block(data[:cut])
+    if tail:
+        yield from _parse_pcs_block(tail + b"\n")
+
+
+def import_pcs_order_file(source: Path, table_dir: Path = _PCS_TABLE_DIR) -> CodeTable:
+    """
+    Import a CMS ICD-10-PCS order file into a compact code table.
+
+    `source` may be the plain order .txt or the CMS .zip archive; zip members are
+    decompressed on the fly without extracting or buffering the whole file.
+    """
+    logger.info("ProcedureCodingService: importing ICD-10-PCS order file from %s …", source)
+    unique_data: dict[str, str] = {}
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            # Use the largest txt (the order file with descriptions)
+            txt_names = [n for n in zf.namelist() if n.lower().endswith(".txt")]
+            if not txt_names:
+                raise RuntimeError("No .txt file found inside CMS PCS zip archive")
+            main_txt = max(txt_names, key=lambda n: zf.getinfo(n).file_size)
+            with zf.open(main_txt) as f:
+                unique_data.update(_iter_pcs_records(f))
+    else:
+        with open(source, "rb") as f:
+            unique_data.update(_iter_pcs_records(f))
+
+    table = CodeTable.from_lists(list(unique_data.keys()), list(unique_data.values()))
+    table.save(table_dir)
+    logger.info("ProcedureCodingService: parsed %d valid ICD-10-PCS codes", len(table))
+    return table
+
+
 class ProcedureSuggestion(BaseModel):
     code: str
     description: str
     confidence: float
-    source: str  # "semantic" | "entity" | "tfidf" | "exact"
+    source: str  # "semantic" | "entity" | "tfidf" | "exact" | "prefix" | "hybrid"
 
 
 class ProcedureCodingService:
-    """Singleton ICD-10-PCS coding service."""
+    """ICD-10-PCS coding service, one instance per code-set version."""
 
-    _instance: Optional["ProcedureCodingService"] = None
+    _instances: dict[str, "ProcedureCodingService"] = {}
     _ready: bool = False
 
-    def __new__(cls) -> "ProcedureCodingService":
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    def __new__(cls, version: Optional[str] = None) -> "ProcedureCodingService":
+        version = select_version(PCS, version)
+        if version not in cls._instances:
+            instance = super().__new__(cls)
+            instance._version = version
+            cls._instances[version] = instance
+        return cls._instances[version]
 
-    def __init__(self) -> None:
+    def __init__(self, version: Optional[str] = None) -> None:
         if self._ready:
             return
         self._ready = True
         self._initialize()
 
+    @classmethod
+    def load_versions(cls) -> list["ProcedureCodingService"]:
+        """Load every configured version, oldest first so each can delta off the last."""
+        return [cls(v) for v in versions(PCS)]
+
+    @property
+    def version(self) -> str:
+        return self._version
+
     # ------------------------------------------------------------------
     # Initialization
     # ------------------------------------------------------------------
 
     def _initialize(self) -> None:
+        from app.services.resource_monitor import track
+
         _DATA_DIR.mkdir(parents=True, exist_ok=True)
-        Path(_CHROMA_PCS_DIR).mkdir(parents=True, exist_ok=True)
+        bundled = self._version == BUNDLED_VERSION
+        self._table_dir = _pcs_table_dir(self._version)
+        self._collection_name = _COLLECTION_NAME if bundled else f"icd10_pcs_{self._version}"
+        tag = "pcs" if bundled else f"pcs{self._version}"  # resource_monitor component prefix
+        self._suggest_tiers = TierRunner(_SUGGEST_TIER_COST_MS)
+        self._search_tiers = TierRunner(_SEARCH_TIER_COST_MS)
 
         logger.info("ProcedureCodingService: attaching shared embedding model …")
         from app.services.shared_embedder import get_embedder
         self._embedder = get_embedder()
 
-        import chromadb
-        self._chroma = chromadb.PersistentClient(path=_CHROMA_PCS_DIR)
-        self._col = self._chroma.get_or_create_collection(
-            name=_COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"},
-        )
-
-        # Ensure the raw PCS text file exists
-        if not _PCS_TXT_PATH.exists():
-            self._download_pcs_file()
-
-        # Parse into codes/descriptions (populated once, cached in self._codes/_descs)
-        self._codes, self._descs = self._parse_pcs_file()
-
-        if self._col.count() == 0:
-            self._populate()
-        else:
+        # Load codes/descriptions from the compact code table (imported on first run)
+        with track(f"{tag}.code_table") as details:
+            self._codes, self._descs = self._load_code_table()
+            self._descs_lower = [d.lower() for d in self._descs]
+            self._code_index = {code: i for i, code in enumerate(self._codes)}
+            details["rows"] = len(self._codes)
+
+        self._col = None
+        self._matrix = None
+        if SHARED_CODE_INDEX:
+            # Memory-mapped embedding matrix shared by every worker; Chroma is not opened
+            from app.services.shared_embedder import embedding_model_key
+            from app.services.shared_index import EmbeddingMatrix
+            with track(f"{tag}.embedding_matrix") as details:
+                self._matrix = EmbeddingMatrix.load_or_build(
+                    self._table_dir, self._descs, embedding_model_key(), "ICD-PCS embeddings",
+                    self._base_table_dir(),
+                )
+                details["rows"] = len(self._matrix)
+                details["embedding_bytes"] = self._matrix.nbytes
+                details["dim"] = self._matrix.dim
             logger.info(
-                "ProcedureCodingService: ChromaDB collection ready (%d ICD-10-PCS codes)",
-                self._col.count(),
+                "ProcedureCodingService: shared embedding matrix ready (%d ICD-10-PCS %s codes)",
+                len(self._matrix), self._version,
             )
+        else:
+            with track(f"{tag}.chroma") as details:
+                Path(_CHROMA_PCS_DIR).mkdir(parents=True, exist_ok=True)
+                import chromadb
+                self._chroma = chromadb.PersistentClient(path=_CHROMA_PCS_DIR)
+                self._col = self._chroma.get_or_create_collection(
+                    name=self._collection_name,
+                    metadata={"hnsw:space": "cosine"},
+                )
+                # Chroma's SQLite/HNSW handles are not fork-safe: app.serve only forks with
+                # SHARED_CODE_INDEX=true, where this branch is never taken
+
+                if self._col.count() == 0:
+                    self._populate()
+                else:
+                    logger.info(
+                        "ProcedureCodingService: ChromaDB collection ready (%d ICD-10-PCS %s codes)",
+                        self._col.count(), self._version,
+                    )
+                details["rows"] = self._col.count()
+                # Raw float32 vectors only; the HNSW graph adds its own overhead on top
+                details["embedding_bytes"] = (
+                    details["rows"] * self._embedder.get_sentence_embedding_dimension() * 4
+                )
 
         logger.info(
-            "ProcedureCodingService: building TF-IDF index (%d codes) …", len(self._codes)
+            "ProcedureCodingService: building lexical indexes (%d codes) …", len(self._codes)
         )
-        from sklearn.feature_extraction.text import TfidfVectorizer
+        from app.services.lexical_index import LEXICAL_SCORING, char_index, word_index
         import joblib
 
-        _cache_prefix = _DATA_DIR / "tfidf_cache" / f"icd_pcs_{len(self._codes)}"
+        _cache_name = f"icd_pcs_{len(self._codes)}" if bundled else f"icd_pcs_{self._version}_{len(self._codes)}"
+        _cache_prefix = _DATA_DIR / "tfidf_cache" / _cache_name
         _cache_prefix.parent.mkdir(parents=True, exist_ok=True)
-        _word_path = str(_cache_prefix) + "_word.joblib"
-        _char_path = str(_cache_prefix) + "_char.joblib"
+        _word_path = f"{_cache_prefix}_word_{LEXICAL_SCORING}.index.joblib"
+        _char_path = f"{_cache_prefix}_char.index.joblib"
+
+        with track(f"{tag}.lexical") as details:
+            if Path(_word_path).exists() and Path(_char_path).exists():
+                logger.info("ProcedureCodingService: loading lexical indexes from cache …")
+                # Memory-mapped: postings are shared page cache across worker processes
+                self._word_index = joblib.load(_word_path, mmap_mode="r")
+                self._char_index = joblib.load(_char_path, mmap_mode="r")
+            else:
+                # Word unigrams + bigrams (TF-IDF or BM25)
+                self._word_index = word_index(self._descs)
+                # Character n-gram TF-IDF — enables partial word / typo matching
+                self._char_index = char_index(self._descs)
+                joblib.dump(self._word_index, _word_path)
+                joblib.dump(self._char_index, _char_path)
+                logger.info("ProcedureCodingService: lexical indexes saved to disk.")
+            details["word_nnz"] = self._word_index.nnz
+            details["char_nnz"] = self._char_index.nnz
+            details["index_bytes"] = self._word_index.nbytes + self._char_index.nbytes
+
+        # Token-prefix index for keystroke-level typeahead in the code browser
+        from app.services.typeahead_index import TypeaheadIndex
+        with track(f"{tag}.typeahead"):
+            self._typeahead = TypeaheadIndex(self._codes, self._descs)
+
+        # Optional scispacy NER (one pipeline per process, shared with ICDCodingService)
+        self._nlp = None
+        with track(f"{tag}.spacy") as details:
+            try:
+                from app.services.model_registry import load_spacy
+                self._nlp = load_spacy("en_core_sci_md")
+                logger.info("ProcedureCodingService: scispacy en_core_sci_md loaded")
+            except Exception as exc:
+                logger.warning(
+                    "ProcedureCodingService: scispacy unavailable (%s) — entity tier skipped", exc
+                )
+            details["loaded"] = self._nlp is not None
 
-        if Path(_word_path).exists() and Path(_char_path).exists():
-            logger.info("ProcedureCodingService: loading TF-IDF indexes from cache …")
-            self._tfidf, self._tfidf_matrix = joblib.load(_word_path)
-            self._char_tfidf, self._char_tfidf_matrix = joblib.load(_char_path)
-        else:
-            # Word-level TF-IDF (word bigrams)
-            self._tfidf = TfidfVectorizer(ngram_range=(1, 2), min_df=1, sublinear_tf=True)
-            self._tfidf_matrix = self._tfidf.fit_transform(self._descs)
-            # Character-level n-gram TF-IDF — enables partial word / typo matching
-            self._char_tfidf = TfidfVectorizer(
-                analyzer="char_wb", ngram_range=(3, 4), min_df=1, sublinear_tf=True
-            )
-            self._char_tfidf_matrix = self._char_tfidf.fit_transform(self._descs)
-            joblib.dump((self._tfidf, self._tfidf_matrix), _word_path)
-            joblib.dump((self._char_tfidf, self._char_tfidf_matrix), _char_path)
-            logger.info("ProcedureCodingService: TF-IDF indexes saved to disk.")
+        logger.info("ProcedureCodingService: ready (ICD-10-PCS %s)", self._version)
 
-        # Optional scispacy NER (shared model assumed already loaded in ICDCodingService)
-        self._nlp = None
-        try:
-            import spacy
-            self._nlp = spacy.load("en_core_sci_md")
-            logger.info("ProcedureCodingService: scispacy en_core_sci_md loaded")
-        except Exception as exc:
-            logger.warning(
-                "ProcedureCodingService: scispacy unavailable (%s) — entity tier skipped", exc
-            )
+    def _load_code_table(self) -> tuple[list[str], list[str]]:
+        """
+        Return (codes, descriptions) from the compact PCS code table, importing
+        it on first run from the version's order file (bundled release: the
+        first available source, see _resolve_pcs_source).
+        """
+        if not CodeTable.exists(self._table_dir):
+            source = version_file(PCS, self._version) or self._resolve_pcs_source()
+            import_pcs_order_file(source, self._table_dir)
+        table = CodeTable.load(self._table_dir)
+        codes, descs = table.codes_list(), table.descs_list()
+        logger.info("ProcedureCodingService: loaded %d valid ICD-10-PCS %s codes", len(codes), self._version)
+        return codes, descs
+
+    def _base_table_dir(self) -> Optional[Path]:
+        """Code table of the closest version whose embeddings can seed this one's."""
+        from app.services.shared_embedder import embedding_model_key
+        from app.services.shared_index import EmbeddingMatrix
+
+        model_key = embedding_model_key()
+        base = base_version(PCS, self._version, lambda v: EmbeddingMatrix.exists(_pcs_table_dir(v), model_key))
+        return _pcs_table_dir(base) if base is not None else None
 
-        logger.info("ProcedureCodingService: ready")
+    def _resolve_pcs_source(self) -> Path:
+        """
+        Locate an ICD-10-PCS order file (.txt or CMS .zip). Resolution order:
+          1. ICD10_PCS_ORDER_FILE env var (air-gapped sites point this at a local copy)
+          2. data/icd10pcs_order_2025.txt (baked into the Docker image)
+          3. data/icd10pcs_order_2025.zip (a previous download)
+          4. CMS download, unless PCS_ALLOW_DOWNLOAD=false
+        """
+        if _PCS_SOURCE_ENV:
+            source = Path(_PCS_SOURCE_ENV)
+            if not source.exists():
+                raise FileNotFoundError(f"ICD10_PCS_ORDER_FILE does not exist: {source}")
+            return source
+        for candidate in (_PCS_TXT_PATH, _PCS_ZIP_PATH):
+            if candidate.exists():
+                return candidate
+        if not _PCS_ALLOW_DOWNLOAD:
+            raise RuntimeError(
+                "No ICD-10-PCS order file found and PCS_ALLOW_DOWNLOAD=false. "
+                "Set ICD10_PCS_ORDER_FILE to a local .txt or .zip order file."
+            )
+        self._download_pcs_file()
+        return _PCS_ZIP_PATH
 
     def _download_pcs_file(self) -> None:
+        """Stream the CMS zip straight to disk (never held in memory)."""
         logger.info(
             "ProcedureCodingService: downloading ICD-10-PCS FY2025 order file from CMS …"
         )
+        import requests
+
+        tmp_path = _PCS_ZIP_PATH.with_suffix(".zip.part")
         try:
-            response = requests.get(_CMS_PCS_URL, timeout=120, stream=True)
-            response.raise_for_status()
-            content = response.content
-            with zipfile.ZipFile(io.BytesIO(content)) as zf:
-                # Find the .txt order file inside the zip
-                txt_names = [n for n in zf.namelist() if n.lower().endswith(".txt")]
-                if not txt_names:
-                    raise RuntimeError("No .txt file found inside CMS PCS zip archive")
-                # Use the largest txt (the order file with descriptions)
-                main_txt = max(txt_names, key=lambda n: zf.getinfo(n).file_size)
-                with zf.open(main_txt) as f:
-                    _PCS_TXT_PATH.write_bytes(f.read())
-            logger.info("ProcedureCodingService: ICD-10-PCS order file saved to %s", _PCS_TXT_PATH)
+            with requests.get(_CMS_PCS_URL, timeout=120, stream=True) as response:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=_PCS_BLOCK_SIZE):
+                        f.write(chunk)
+            tmp_path.replace(_PCS_ZIP_PATH)
+            logger.info("ProcedureCodingService: ICD-10-PCS archive saved to %s", _PCS_ZIP_PATH)
         except Exception as exc:
+            tmp_path.unlink(missing_ok=True)
             logger.error(
                 "ProcedureCodingService: failed to download ICD-10-PCS file: %s. "
                 "Procedure coding will be unavailable.",
@@ -160,64 +377,21 @@ class ProcedureCodingService:
             )
             raise
 
-    def _parse_pcs_file(self) -> tuple[list[str], list[str]]:
-        """
-        Parse the CMS fixed-width ICD-10-PCS order file.
-        Format (fixed-width):
-          cols  1-5  : sequence number
-          col   6    : space
-          cols  7-13 : 7-character ICD-10-PCS code
-          col   14   : space
-          col   15   : valid flag (1 = valid billable code, 0 = header)
-          col   16   : space
-          cols 17-77 : abbreviated description (61 chars)
-          col   78   : space
-          cols 79+   : long description
-        """
-        codes: list[str] = []
-        descs: list[str] = []
-
-        try:
-            lines = _PCS_TXT_PATH.read_text(encoding="utf-8", errors="replace").splitlines()
-        except Exception as exc:
-            logger.error("ProcedureCodingService: cannot read PCS file: %s", exc)
-            return codes, descs
-
-        unique_data: dict[str, str] = {}
-        for line in lines:
-            if len(line) < 16:
-                continue
-            valid_flag = line[14].strip()
-            if valid_flag != "1":
-                continue  # skip header/section rows
-            code = line[6:13].strip()
-            if len(code) != 7:
-                continue
-            # CMS fixed-width format (1-indexed):
-            #   cols 17-76: short description (60 chars) → 0-indexed: [16:76]
-            #   col  77   : space                        → 0-indexed: [76]
-            #   cols 78+  : long description             → 0-indexed: [77:]
-            long_desc = line[77:].strip() if len(line) > 77 else ""
-            short_desc = line[16:76].strip()
-            description = long_desc or short_desc
-            if description:
-                unique_data[code] = description
-
-        codes = list(unique_data.keys())
-        descs = list(unique_data.values())
-
-        logger.info("ProcedureCodingService: parsed %d valid ICD-10-PCS codes", len(codes))
-        return codes, descs
-
     def _populate(self) -> None:
         logger.info(
-            "ProcedureCodingService: first-run — populating ChromaDB from ICD-10-PCS …"
+            "ProcedureCodingService: first-run — populating ChromaDB from ICD-10-PCS %s …", self._version
         )
         total = len(self._codes)
 
+        # Embeddings go through the on-disk matrix so a new version only encodes its delta
+        # (always full dimension: Chroma queries are not projected)
         logger.info("ProcedureCodingService: computing embeddings for %d codes (this may take a few minutes on first run) …", total)
-        from app.services.shared_embedder import encode_with_progress
-        embeddings = encode_with_progress(self._descs, batch_size=512, label="ICD-PCS embeddings")
+        from app.services.shared_embedder import embedding_model_key
+        from app.services.shared_index import EmbeddingMatrix
+        embeddings = EmbeddingMatrix.load_or_build(
+            self._table_dir, self._descs, embedding_model_key(), "ICD-PCS embeddings",
+            self._base_table_dir(), dim=0,
+        )
 
         logger.info("ProcedureCodingService: embeddings complete, upserting to ChromaDB …")
 
@@ -226,7 +400,7 @@ class ProcedureCodingService:
             end = min(start + batch_size, total)
             batch_codes = self._codes[start:end]
             batch_descs = self._descs[start:end]
-            batch_embs = embeddings[start:end].tolist()
+            batch_embs = embeddings.rows(start, end).tolist()
 
             self._col.upsert(
                 ids=batch_codes,
@@ -252,182 +426,256 @@ class ProcedureCodingService:
         procedures: Optional[list[str]] = None,
         medications: Optional[list[str]] = None,
         top_k: int = 5,
+        deadline_ms: Optional[float] = None,
     ) -> list[ProcedureSuggestion]:
         """Return top-k ICD-10-PCS procedure code suggestions."""
+        return self.suggest_with_report(procedures, medications, top_k, deadline_ms)[0]
+
+    def suggest_with_report(
+        self,
+        procedures: Optional[list[str]] = None,
+        medications: Optional[list[str]] = None,
+        top_k: int = 5,
+        deadline_ms: Optional[float] = None,
+    ) -> tuple[list[ProcedureSuggestion], TierReport]:
+        """
+        suggest() plus a report of which tiers ran, were skipped or truncated
+        to meet `deadline_ms`, and which contributed to the answer. Tiers run
+        in priority order semantic → TF-IDF (always) → entity.
+        """
+        deadline = Deadline(deadline_ms)
+        report = TierReport(deadline_ms=deadline_ms)
+        text = self.suggest_text(procedures, medications)
+        if not text:
+            return [], report
+
+        semantic: dict[str, ProcedureSuggestion] = {}
+        entity: dict[str, ProcedureSuggestion] = {}
+        lexical: dict[str, ProcedureSuggestion] = {}
+
+        tiers = self._suggest_tiers
+        tiers.run("semantic", deadline, report, self._tier1_semantic, text, top_k * 3, semantic)
+        tiers.run("tfidf", deadline, report, self._tier3_tfidf, text, top_k * 3, lexical, required=True)
+        if self._nlp is not None:
+            tiers.run("entity", deadline, report, self._tier2_entity, text, entity, deadline, report)
+
+        # Merge as if run in the original order: semantic, entity (higher confidence wins), TF-IDF (new codes only)
+        results = dict(semantic)
+        for code, suggestion in entity.items():
+            if code not in results or results[code].confidence < suggestion.confidence:
+                results[code] = suggestion
+        for code, suggestion in lexical.items():
+            results.setdefault(code, suggestion)
+
+        ranked = sorted(results.values(), key=lambda s: s.confidence, reverse=True)[:top_k]
+        sources = {s.source for s in ranked}
+        report.contributed = [t for t in ("semantic", "entity", "tfidf") if t in sources]
+        report.elapsed_ms = round(deadline.elapsed_ms(), 3)
+        return ranked, report
+
+    def suggest_text(
+        self,
+        procedures: Optional[list[str]] = None,
+        medications: Optional[list[str]] = None,
+    ) -> str:
+        """The normalized text suggest() embeds; empty when there is nothing to code."""
         parts: list[str] = []
         if procedures:
             parts.extend(p.strip() for p in procedures if p.strip())
         if medications:
             parts.extend(m.strip() for m in medications if m.strip())
-
         if not parts:
-            return []
+            return ""
 
-        text = ". ".join(parts)
-        results: dict[str, ProcedureSuggestion] = {}
+        # Colloquial phrases -> clinical terms ("tanke" -> "suture")
+        from app.services.term_normalizer import normalize_clinical
+        return normalize_clinical(". ".join(parts))
 
-        self._tier1_semantic(text, top_k * 3, results)
-        if self._nlp is not None:
-            self._tier2_entity(text, results)
-        self._tier3_tfidf(text, top_k * 3, results)
-
-        ranked = sorted(results.values(), key=lambda s: s.confidence, reverse=True)
-        return ranked[:top_k]
-
-    def search(self, query: str, top_k: int = 10) -> list[ProcedureSuggestion]:
+    def search(
+        self, query: str, top_k: int = 10, deadline_ms: Optional[float] = None
+    ) -> list[ProcedureSuggestion]:
         """
         Keyword-dominant hybrid search for the code browser.
-        Scoring: 70% TF-IDF keyword + 30% semantic similarity.
+        Scoring: 40% word TF-IDF + 30% char n-gram + 30% semantic similarity.
         Exact code prefix and substring description matches get a priority boost.
         """
-        import numpy as np
+        return self.search_with_report(query, top_k, deadline_ms)[0]
 
+    def search_with_report(
+        self, query: str, top_k: int = 10, deadline_ms: Optional[float] = None
+    ) -> tuple[list[ProcedureSuggestion], TierReport]:
+        """
+        search() plus a tier report. Tiers run in priority order word (always)
+        → char n-gram → semantic, each only if it fits in `deadline_ms`.
+        """
+        from app.services.hybrid_fusion import (
+            CHAR_WEIGHT, SEMANTIC_WEIGHT, WORD_WEIGHT, fuse_scores,
+        )
+
+        deadline = Deadline(deadline_ms)
+        report = TierReport(deadline_ms=deadline_ms)
         query = query.strip()
         if not query:
-            return []
+            return [], report
 
         # ── 1. Exact / prefix code match (e.g. "0B11", "0BH") ─────────
         normalised = query.upper().replace(" ", "")
+        prefix_idx = self._typeahead.code_prefix(normalised, top_k)
 
         # Exact single-code lookup — return immediately if user typed a full code
-        for code, desc in zip(self._codes, self._descs):
-            if code.upper() == normalised:
-                return [ProcedureSuggestion(
-                    code=code, description=desc, confidence=1.0, source="exact",
-                )]
-
-        prefix_hits: list[ProcedureSuggestion] = []
-        for code, desc in zip(self._codes, self._descs):
-            if code.upper().startswith(normalised):
-                prefix_hits.append(ProcedureSuggestion(
-                    code=code, description=desc, confidence=1.0, source="exact",
-                ))
-                if len(prefix_hits) >= top_k:
-                    break
-        if prefix_hits:
-            return prefix_hits
+        # (sorted prefix hits put an exact match first)
+        if prefix_idx and self._codes[prefix_idx[0]] == normalised:
+            prefix_idx = prefix_idx[:1]
+
+        if prefix_idx:
+            report.run, report.contributed = ["exact"], ["exact"]
+            report.elapsed_ms = round(deadline.elapsed_ms(), 3)
+            return [
+                ProcedureSuggestion(
+                    code=self._codes[idx],
+                    description=self._descs[idx],
+                    confidence=1.0,
+                    source="exact",
+                )
+                for idx in prefix_idx
+            ], report
 
-        # ── 2. TF-IDF keyword scores (word bigrams, 40% weight) ────────
-        kw_scores: dict[str, float] = {}
-        char_scores: dict[str, float] = {}
-        try:
-            query_vec = self._tfidf.transform([query])
-            raw = (self._tfidf_matrix @ query_vec.T).toarray().flatten()
-            candidates = int(min(top_k * 10, len(self._codes)))
-            top_idx = np.argpartition(raw, -candidates)[-candidates:]
-            max_kw = float(raw[top_idx].max()) or 1.0
-            for idx in top_idx:
-                if raw[idx] > 0:
-                    kw_scores[self._codes[idx]] = float(raw[idx]) / max_kw
-        except Exception as exc:
-            logger.warning("ProcedureCodingService.search TF-IDF: %s", exc)
+        candidates = int(min(top_k * 10, len(self._codes)))
+        tiers: dict[str, tuple] = {}
+
+        # ── 2. Keyword scores (word bigrams, 40% weight) ───────────────
+        def _word() -> None:
+            try:
+                idx, raw = self._word_index.top(query, candidates)
+                if idx.size:
+                    tiers["word"] = (idx, raw / raw[0], WORD_WEIGHT)  # best first → max-normalised
+            except Exception as exc:
+                logger.warning("ProcedureCodingService.search TF-IDF: %s", exc)
 
         # ── 2b. Character n-gram scores (30% weight — partial word matching) ─
-        try:
-            char_vec = self._char_tfidf.transform([query])
-            char_raw = (self._char_tfidf_matrix @ char_vec.T).toarray().flatten()
-            candidates = int(min(top_k * 10, len(self._codes)))
-            top_idx = np.argpartition(char_raw, -candidates)[-candidates:]
-            max_char = float(char_raw[top_idx].max()) or 1.0
-            for idx in top_idx:
-                if char_raw[idx] > 0:
-                    char_scores[self._codes[idx]] = float(char_raw[idx]) / max_char
-        except Exception as exc:
-            logger.warning("ProcedureCodingService.search char TF-IDF: %s", exc)
+        def _char() -> None:
+            try:
+                idx, char_raw = self._char_index.top(query, candidates)
+                if idx.size:
+                    tiers["char"] = (idx, char_raw / char_raw[0], CHAR_WEIGHT)
+            except Exception as exc:
+                logger.warning("ProcedureCodingService.search char TF-IDF: %s", exc)
 
         # ── 3. Semantic scores (30% weight) ────────────────────────────
-        sem_scores: dict[str, tuple[float, str]] = {}
-        try:
-            emb = self._embedder.encode([query], show_progress_bar=False).tolist()[0]
-            n = min(top_k * 10, self._col.count())
-            if n > 0:
-                qr = self._col.query(
-                    query_embeddings=[emb],
-                    n_results=n,
-                    include=["documents", "metadatas", "distances"],
-                )
-                for meta, distance in zip(qr["metadatas"][0], qr["distances"][0]):
-                    score = max(0.0, 1.0 - distance / 2.0)
-                    sem_scores[meta["code"]] = (score, meta["description"])
-        except Exception as exc:
-            logger.warning("ProcedureCodingService.search semantic: %s", exc)
-
-        # ── 4. Merge: 40% word-kw + 30% char-kw + 30% semantic ────────
-        ql = query.lower()
-        all_codes = set(kw_scores) | set(char_scores) | set(sem_scores)
-        merged: list[ProcedureSuggestion] = []
-        for code in all_codes:
-            kw = kw_scores.get(code, 0.0)
-            ch = char_scores.get(code, 0.0)
-            sem, desc = sem_scores.get(code, (0.0, ""))
-            if not desc:
-                try:
-                    idx = self._codes.index(code)
-                    desc = self._descs[idx]
-                except (ValueError, IndexError):
-                    continue
-
-            substr_boost = 0.15 if ql in desc.lower() else 0.0
-            hybrid = round(min(0.4 * kw + 0.3 * ch + 0.3 * sem + substr_boost, 1.0), 4)
-            if hybrid > 0:
-                merged.append(ProcedureSuggestion(
-                    code=code, description=desc, confidence=hybrid, source="hybrid",
-                ))
+        def _semantic() -> None:
+            try:
+                hits = self._nearest(encode_cached([query])[0], candidates)
+                if hits:
+                    sem_idx = np.array([idx for idx, _ in hits], dtype=np.int64)
+                    sem_scores = np.maximum(0.0, 1.0 - np.array([d for _, d in hits]) / 2.0)
+                    tiers["semantic"] = (sem_idx, sem_scores, SEMANTIC_WEIGHT)
+            except Exception as exc:
+                logger.warning("ProcedureCodingService.search semantic: %s", exc)
+
+        self._search_tiers.run("word", deadline, report, _word, required=True)
+        self._search_tiers.run("char", deadline, report, _char)
+        self._search_tiers.run("semantic", deadline, report, _semantic)
+
+        # ── 4. Fuse on candidate indices; build objects for top_k only ─
+        top_idx, top_conf = fuse_scores(list(tiers.values()), self._descs_lower, query, top_k)
+        report.contributed = [
+            name for name, (idx, _, _) in tiers.items() if np.isin(top_idx, idx).any()
+        ]
+        report.elapsed_ms = round(deadline.elapsed_ms(), 3)
+        return [
+            ProcedureSuggestion(
+                code=self._codes[idx],
+                description=self._descs[idx],
+                confidence=conf,
+                source="hybrid",
+            )
+            for idx, conf in zip(top_idx.tolist(), top_conf.tolist())
+        ], report
 
-        merged.sort(key=lambda s: s.confidence, reverse=True)
-        return merged[:top_k]
+    def typeahead(self, query: str, top_k: int = 10) -> list[ProcedureSuggestion]:
+        """
+        Prefix-only lookup for as-you-type search: code prefixes plus description
+        word prefixes from the precomputed index. No TF-IDF, embedding or Chroma.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        return [
+            ProcedureSuggestion(
+                code=self._codes[idx],
+                description=self._descs[idx],
+                confidence=confidence,
+                source=source,
+            )
+            for idx, confidence, source in self._typeahead.lookup(query, top_k)
+        ]
 
     # ------------------------------------------------------------------
     # Internal tiers
     # ------------------------------------------------------------------
 
-    def _tier1_semantic(
-        self, text: str, top_k: int, results: dict[str, ProcedureSuggestion]
-    ) -> None:
-        embedding = self._embedder.encode([text], show_progress_bar=False).tolist()[0]
-        n = min(top_k, self._col.count())
+    def _nearest(self, embedding, n: int) -> list[tuple[int, float]]:
+        """
+        Up to n (code index, cosine distance) pairs, closest first, from the
+        shared embedding matrix or the ChromaDB collection.
+        """
+        if self._matrix is not None:
+            return self._matrix.nearest(embedding, n)
+        n = min(n, self._col.count())
         if n == 0:
-            return
+            return []
         qr = self._col.query(
-            query_embeddings=[embedding],
+            query_embeddings=[embedding.tolist()],
             n_results=n,
-            include=["documents", "metadatas", "distances"],
+            include=["metadatas", "distances"],
         )
-        for meta, distance in zip(qr["metadatas"][0], qr["distances"][0]):
+        return [
+            (self._code_index[meta["code"]], distance)
+            for meta, distance in zip(qr["metadatas"][0], qr["distances"][0])
+            if meta["code"] in self._code_index
+        ]
+
+    def _tier1_semantic(
+        self, text: str, top_k: int, results: dict[str, ProcedureSuggestion]
+    ) -> None:
+        for idx, distance in self._nearest(encode_cached([text])[0], top_k):
             confidence = round(max(0.0, 1.0 - distance / 2.0), 4)
-            code = meta["code"]
+            code = self._codes[idx]
             if code not in results or results[code].confidence < confidence:
                 results[code] = ProcedureSuggestion(
                     code=code,
-                    description=meta["description"],
+                    description=self._descs[idx],
                     confidence=confidence,
                     source="semantic",
                 )
 
     def _tier2_entity(
-        self, text: str, results: dict[str, ProcedureSuggestion]
+        self,
+        text: str,
+        results: dict[str, ProcedureSuggestion],
+        deadline: Optional[Deadline] = None,
+        report: Optional[TierReport] = None,
     ) -> None:
         try:
             doc = self._nlp(text[:512])
             seen: set[str] = set()
             for ent in doc.ents:
+                # Stop between entities once the deadline has passed
+                if deadline is not None and deadline.expired():
+                    if report is not None:
+                        report.truncated.append("entity")
+                    break
                 ent_text = ent.text.strip()
                 if not ent_text or ent_text.lower() in seen:
                     continue
                 seen.add(ent_text.lower())
-                emb = self._embedder.encode([ent_text], show_progress_bar=False).tolist()[0]
-                qr = self._col.query(
-                    query_embeddings=[emb],
-                    n_results=3,
-                    include=["metadatas", "distances"],
-                )
-                for meta, distance in zip(qr["metadatas"][0], qr["distances"][0]):
+                for idx, distance in self._nearest(encode_cached([ent_text])[0], 3):
                     confidence = round(max(0.0, (1.0 - distance / 2.0) * 0.92), 4)
-                    code = meta["code"]
+                    code = self._codes[idx]
                     if code not in results or results[code].confidence < confidence:
                         results[code] = ProcedureSuggestion(
                             code=code,
-                            description=meta["description"],
+                            description=self._descs[idx],
                             confidence=confidence,
                             source="entity",
                         )
@@ -438,11 +686,8 @@ class ProcedureCodingService:
         self, text: str, top_k: int, results: dict[str, ProcedureSuggestion]
     ) -> None:
         try:
-            query_vec = self._tfidf.transform([text])
-            scores = (self._tfidf_matrix @ query_vec.T).toarray().flatten()
-            top_indices = scores.argsort()[-top_k:][::-1]
-            for idx in top_indices:
-                raw_score = float(scores[idx])
+            top_indices, scores = self._word_index.top(text, top_k)
+            for idx, raw_score in zip(top_indices.tolist(), scores.tolist()):
                 if raw_score < 0.01:
                     continue
                 code = self._codes[idx]
@@ -0,0 +1,127 @@
+"""
+Per-component load-time and memory accounting for the backend's models/indexes.
+
+Startup code wraps each expensive load in `track()`:
+
+    with track("icd.lexical") as details:
+        ...load...
+        details["nnz"] = index.nnz
+
+which records wall-clock load time, the process RSS before/after and the
+difference, plus any sizes the caller adds (bytes, nnz, rows). The registry is
+exposed at GET /internal/resources and logged once at startup as a timeline
+(app import, DB init, model loads), so slow cold starts and OOMs on edge boxes
+can be traced to the embedder, spaCy, Chroma or the lexical indexes.
+
+RSS deltas are approximate: memory-mapped files only count once their pages
+are touched, and allocator reuse can hide small allocations. Loads run
+sequentially during warm-up, so deltas are not blurred by concurrent loads.
+Forked workers inherit the parent's records; `snapshot()` reports each
+process's current RSS alongside them.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_MB = float(1 << 20)
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Timeline origin: app.main imports this module before anything else
+_T0 = time.perf_counter()
+
+_components: dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak, not current — the best available without /proc (bytes on macOS, KiB elsewhere)
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+def _mb(n: Optional[int]) -> Optional[float]:
+    return None if n is None else round(n / _MB, 1)
+
+
+@contextmanager
+def track(component: str, **details) -> Iterator[dict]:
+    """Record load time and RSS growth of the enclosed block under `component`."""
+    rss_before = rss_bytes()
+    t0 = time.perf_counter()
+    try:
+        yield details
+    finally:
+        load_s = time.perf_counter() - t0
+        rss_after = rss_bytes()
+        entry = {
+            "start_s": round(t0 - _T0, 3),
+            "load_s": round(load_s, 3),
+            "rss_before_mb": _mb(rss_before),
+            "rss_after_mb": _mb(rss_after),
+            "rss_delta_mb": (
+                _mb(rss_after - rss_before) if rss_before is not None and rss_after is not None else None
+            ),
+        }
+        entry.update(details)
+        with _lock:
+            _components[component] = entry
+
+
+def record_phase(component: str, started: float, **details) -> None:
+    """Record a phase the caller timed itself; `started` is a time.perf_counter() value."""
+    entry = {
+        "start_s": round(started - _T0, 3),
+        "load_s": round(time.perf_counter() - started, 3),
+        "rss_after_mb": _mb(rss_bytes()),
+    }
+    entry.update(details)
+    with _lock:
+        _components[component] = entry
+
+
+def snapshot() -> dict:
+    """Current process RSS plus every recorded component, in load order."""
+    with _lock:
+        components = {name: dict(entry) for name, entry in _components.items()}
+    return {
+        "pid": os.getpid(),
+        "rss_mb": _mb(rss_bytes()),
+        "components": components,
+    }
+
+
+def log_summary() -> None:
+    snap = snapshot()
+    logger.info("Startup timeline (pid %d, RSS %s MB):", snap["pid"], snap["rss_mb"])
+    for name, entry in snap["components"].items():
+        extras = ", ".join(
+            f"{k}={v}" for k, v in entry.items()
+            if k not in ("start_s", "load_s", "rss_before_mb", "rss_after_mb", "rss_delta_mb")
+        )
+        delta = entry.get("rss_delta_mb")
+        logger.info(
+            "  %+7.2fs  %-22s %7.2fs  %8s MB  %s",
+            entry.get("start_s", 0.0),
+            name,
+            entry.get("load_s", 0.0),
+            "?" if delta is None else f"{delta:+.1f}",
+            extras,
+        )
@@ -3,30 +3,291 @@ Shared singleton embedding model for the clinical coding pipeline.
 
 Both ICDCodingService and ProcedureCodingService import `get_embedder()` and
 `encode_with_progress()`. The model is loaded exactly once per process.
+
+The inference runtime is chosen with EMBEDDING_BACKEND:
+  torch     : plain PyTorch SentenceTransformer (default)
+  onnx      : ONNX Runtime export of the same weights
+  onnx-int8 : ONNX Runtime with dynamic int8 quantization (fastest on CPU)
+  openvino  : OpenVINO export (Intel CPUs)
+Optimized backends are exported once into data/models/ and verified against the
+PyTorch embeddings on a probe set; if they drift beyond EMBEDDING_TOLERANCE
+(minimum cosine similarity) or the runtime is not installed, the torch backend
+is used instead.
+
+The weights are loaded from the local model registry (model_registry.py) when
+the model is registered there — safetensors, checksum-verified, no hub lookup.
+
+Query-time phrases go through `encode_cached()`, which consults the persistent
+embedding store (data/embedding_store.sqlite3) before running the model.
 """
 from __future__ import annotations
 
+import json
 import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
 import numpy as np
 from typing import List
 
+# Imported first: in strict offline mode it sets the HF offline switches
+from app.services.model_registry import resolve
+
 logger = logging.getLogger(__name__)
 
 _EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+_EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+_EMBEDDING_QUANT_CONFIG = os.getenv("EMBEDDING_QUANT_CONFIG", "avx2")  # arm64 | avx2 | avx512 | avx512_vnni
+_EMBEDDING_TOLERANCE = float(os.getenv("EMBEDDING_TOLERANCE", "0.99"))
+_MODEL_CACHE_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "models"
+_BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+_CHECK_FILE = "embedding_check.json"
+
+_EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE", "true").lower() == "true"
+_EMBEDDING_STORE_PATH = Path(__file__).resolve().parent.parent.parent / "data" / "embedding_store.sqlite3"
+_EMBEDDING_STORE_MAX_ENTRIES = int(os.getenv("EMBEDDING_STORE_MAX_ENTRIES", "50000"))
+_EMBEDDING_STORE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_STORE_MEMORY_ENTRIES", "4096"))
+_EMBEDDING_STORE_WARM_ENTRIES = int(os.getenv("EMBEDDING_STORE_WARM_ENTRIES", "2048"))
+
+# Representative clinical phrases used to verify an exported backend
+_PROBE_TEXTS = [
+    "fever with chills for three days",
+    "acute upper respiratory infection",
+    "type 2 diabetes mellitus without complications",
+    "chest pain radiating to left arm",
+    "essential hypertension",
+    "laceration of right hand",
+    "dry cough and sore throat",
+    "Insertion of infusion device into superior vena cava, percutaneous approach",
+    "paracetamol 500 mg twice daily",
+    "pregnancy, third trimester, routine antenatal check-up",
+]
+
 _embedder = None
+_active_backend = None
+_store = None
+_prefetched: ContextVar[dict | None] = ContextVar("prefetched_embeddings", default=None)
 
 
 def get_embedder():
     """Return the shared SentenceTransformer instance (loads on first call)."""
-    global _embedder
+    global _embedder, _active_backend
     if _embedder is None:
-        logger.info("Loading shared embedding model: %s …", _EMBEDDING_MODEL)
-        from sentence_transformers import SentenceTransformer
-        _embedder = SentenceTransformer(_EMBEDDING_MODEL)
+        from app.services.resource_monitor import track
+
+        logger.info(
+            "Loading shared embedding model: %s (backend=%s) …", _EMBEDDING_MODEL, _EMBEDDING_BACKEND
+        )
+        with track("embedder") as details:
+            try:
+                _embedder = load_embedder(_EMBEDDING_BACKEND)
+                _active_backend = _EMBEDDING_BACKEND
+            except Exception as exc:
+                if _EMBEDDING_BACKEND == "torch":
+                    raise
+                logger.warning(
+                    "Embedding backend %s unavailable (%s) — falling back to torch", _EMBEDDING_BACKEND, exc
+                )
+                _embedder = load_embedder("torch")
+                _active_backend = "torch"
+            details["backend"] = _active_backend
+            details["dim"] = _embedder.get_sentence_embedding_dimension()
+            details["param_bytes"] = _parameter_bytes(_embedder)
         logger.info("Shared embedding model ready.")
     return _embedder
 
 
+def _parameter_bytes(model) -> int | None:
+    """Bytes of PyTorch weights; None for ONNX/OpenVINO, whose weights live in the runtime."""
+    try:
+        params = list(model.parameters())
+    except Exception:
+        return None
+    return sum(p.numel() * p.element_size() for p in params) or None
+
+
+def embedding_model_key() -> str:
+    """Model + active inference backend, e.g. "all-MiniLM-L6-v2:onnx-int8-avx2"."""
+    get_embedder()
+    backend = _active_backend
+    if backend == "onnx-int8":
+        backend = f"{backend}-{_EMBEDDING_QUANT_CONFIG}"
+    return f"{_EMBEDDING_MODEL}:{backend}"
+
+
+def get_embedding_store():
+    """
+    Return the shared EmbeddingStore for the active model/backend, warming its
+    hottest entries into memory on first call; None when disabled or unavailable.
+    """
+    global _store
+    if _store is None and _EMBEDDING_STORE_ENABLED:
+        from app.services.embedding_store import EmbeddingStore
+        from app.services.resource_monitor import track
+        try:
+            model_key = embedding_model_key()
+            with track("embedding_store") as details:
+                _store = EmbeddingStore(
+                    _EMBEDDING_STORE_PATH,
+                    model_key=model_key,
+                    max_entries=_EMBEDDING_STORE_MAX_ENTRIES,
+                    memory_entries=_EMBEDDING_STORE_MEMORY_ENTRIES,
+                )
+                warmed = _store.warm(_EMBEDDING_STORE_WARM_ENTRIES)
+                details["warmed_entries"] = warmed
+            logger.info("Embedding store ready (%s, %d hot entries preloaded).", _store.model_key, warmed)
+        except Exception as exc:
+            logger.warning("Embedding store unavailable (%s) — encoding without it", exc)
+            _store = False
+    return _store or None
+
+
+def flush_embedding_store() -> None:
+    """Write buffered hit counts, if the store was ever opened in this process."""
+    if _store:
+        _store.flush()
+
+
+@contextmanager
+def prefetched_embeddings(texts: List[str], batch_size: int = 256):
+    """
+    Encode `texts` in large batches up front; inside the block encode_cached()
+    serves them from memory. Bulk jobs use this to code many records through
+    one batched model call instead of one call per record. The prefetched
+    vectors bypass the persistent store so a bulk run does not evict the
+    phrases live traffic keeps hot.
+    """
+    from app.services.embedding_store import normalize_text
+
+    unique = list(dict.fromkeys(normalize_text(t) for t in texts if t))
+    prefetched = {}
+    if unique:
+        embs = get_embedder().encode(
+            unique, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True
+        )
+        prefetched = dict(zip(unique, embs))
+    token = _prefetched.set(prefetched)
+    try:
+        yield
+    finally:
+        _prefetched.reset(token)
+
+
+def encode_cached(texts: List[str]) -> np.ndarray:
+    """
+    Encode short query phrases, reusing stored embeddings. Keys are the
+    lower-cased, whitespace-collapsed text, which is what the uncased MiniLM
+    tokenizer sees anyway; only misses reach the model.
+    """
+    embedder = get_embedder()
+    store = get_embedding_store()
+    prefetched = _prefetched.get()
+    if store is None and not prefetched:
+        return embedder.encode(texts, show_progress_bar=False)
+
+    from app.services.embedding_store import normalize_text
+
+    keys = [normalize_text(t) for t in texts]
+    found = {k: prefetched[k] for k in keys if k in prefetched} if prefetched else {}
+    if store is not None:
+        found.update(store.get_many([k for k in keys if k not in found]))
+    missing = [k for k in dict.fromkeys(keys) if k not in found]
+    if missing:
+        embs = embedder.encode(missing, show_progress_bar=False, convert_to_numpy=True)
+        if store is not None:
+            store.put_many(zip(missing, embs))
+        found.update(zip(missing, embs))
+    return np.stack([np.asarray(found[k], dtype=np.float32) for k in keys])
+
+
+def load_embedder(backend: str = "torch"):
+    """
+    Build a SentenceTransformer for the given inference backend without touching
+    the process-wide singleton (used by get_embedder() and the benchmarks).
+    """
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected one of {_BACKENDS}")
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return _load_torch(SentenceTransformer)
+
+    export_dir = _export_dir(backend)
+    check_path = export_dir / _CHECK_FILE
+    if not check_path.exists():
+        _export_backend(backend, export_dir)
+
+    check = json.loads(check_path.read_text())
+    if check["min_cosine"] < _EMBEDDING_TOLERANCE:
+        raise RuntimeError(
+            f"exported {backend} model deviates from torch (min cosine "
+            f"{check['min_cosine']:.4f} < {_EMBEDDING_TOLERANCE})"
+        )
+    return _load_exported(backend, export_dir)
+
+
+def _load_torch(SentenceTransformer):
+    source = resolve(_EMBEDDING_MODEL)
+    if source == _EMBEDDING_MODEL:
+        return SentenceTransformer(_EMBEDDING_MODEL)
+    # Registered copy: local directory only, safetensors weights (memory-mapped)
+    return SentenceTransformer(source, local_files_only=True, model_kwargs={"use_safetensors": True})
+
+
+def _export_dir(backend: str) -> Path:
+    suffix = f"{backend}-{_EMBEDDING_QUANT_CONFIG}" if backend == "onnx-int8" else backend
+    return _MODEL_CACHE_DIR / f"{_EMBEDDING_MODEL}-{suffix}"
+
+
+def _load_exported(backend: str, export_dir: Path):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx-int8":
+        return SentenceTransformer(
+            str(export_dir),
+            backend="onnx",
+            model_kwargs={"file_name": f"onnx/model_qint8_{_EMBEDDING_QUANT_CONFIG}.onnx"},
+        )
+    return SentenceTransformer(str(export_dir), backend=backend)
+
+
+def _export_backend(backend: str, export_dir: Path) -> None:
+    """Export the model to an optimized runtime and record its drift from torch."""
+    from sentence_transformers import SentenceTransformer
+
+    logger.info("Exporting %s to %s backend at %s …", _EMBEDDING_MODEL, backend, export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+
+    reference = _load_torch(SentenceTransformer)
+    ref_embs = reference.encode(_PROBE_TEXTS, normalize_embeddings=True, show_progress_bar=False)
+    del reference
+
+    base_backend = "onnx" if backend == "onnx-int8" else backend
+    model = SentenceTransformer(resolve(_EMBEDDING_MODEL), backend=base_backend)
+    model.save_pretrained(str(export_dir))
+    if backend == "onnx-int8":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        export_dynamic_quantized_onnx_model(model, _EMBEDDING_QUANT_CONFIG, str(export_dir))
+
+    optimized = _load_exported(backend, export_dir)
+    got = optimized.encode(_PROBE_TEXTS, normalize_embeddings=True, show_progress_bar=False)
+    cosines = np.sum(ref_embs * got, axis=1)
+    check = {
+        "model": _EMBEDDING_MODEL,
+        "backend": backend,
+        "quant_config": _EMBEDDING_QUANT_CONFIG if backend == "onnx-int8" else None,
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+    }
+    (export_dir / _CHECK_FILE).write_text(json.dumps(check, indent=2))
+    logger.info(
+        "Exported %s backend: min cosine vs torch %.4f (mean %.4f)",
+        backend, check["min_cosine"], check["mean_cosine"],
+    )
+
+
 def encode_with_progress(texts: List[str], batch_size: int = 512, label: str = "Encoding") -> np.ndarray:
     """
     Encode texts in batches and log progress via logger.info() every 10 batches.
@@ -0,0 +1,258 @@
+"""
+Memory-mapped semantic index shared by every backend process.
+
+With SHARED_CODE_INDEX=true the coding services answer semantic lookups from
+a plain (n_codes, dim) float32 matrix of L2-normalised code-description
+embeddings, stored as embeddings.npy next to the code table and opened with
+mmap_mode="r". ChromaDB is not opened at all in that mode.
+
+Every process that maps the same file shares one copy through the OS page
+cache, whether it was forked or started independently (uvicorn --workers,
+separate containers on a shared volume). Together with the memory-mapped
+code tables, ICD hierarchy and lexical postings, the large read-only index
+data costs the same however many workers attach. Files are used rather than
+multiprocessing.shared_memory segments because they outlive the loader, need
+no cleanup on crash, and are not capped by Docker's 64 MB /dev/shm default.
+
+Build everything once with the loader before starting workers:
+    SHARED_CODE_INDEX=true python -m app.build_indexes
+
+A code-set version is built as a delta against an existing one: rows whose
+description the base matrix already holds are copied from it, and only the
+added or reworded descriptions go through the model.
+
+With EMBEDDING_DIM set (e.g. 128 or 192), a PCA projection fitted on the
+code-description embeddings is stored next to the full matrix
+(projection_<dim>.npz, embeddings_<dim>.npy) and both the index and every
+query are projected to that many dimensions: a smaller index and cheaper dot
+products at some cost in recall. benchmarks/eval_reduced_dim.py measures
+that trade-off against the full-dimension index. The full matrix stays on
+disk as the source for delta builds and other dimensions.
+
+Lookup is exact (brute-force inner product + argpartition): about 3-5 ms for
+~80k codes, with no approximation error, unlike the HNSW graph.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.services.code_table import CodeTable
+
+logger = logging.getLogger(__name__)
+
+SHARED_CODE_INDEX = os.getenv("SHARED_CODE_INDEX", "false").lower() == "true"
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))  # 0 = full model dimension
+
+_MATRIX_FILE = "embeddings.npy"
+_META_FILE = "embeddings.json"
+
+
+def _reduced_files(dim: int) -> tuple[str, str, str]:
+    return f"embeddings_{dim}.npy", f"embeddings_{dim}.json", f"projection_{dim}.npz"
+
+
+def _normalise(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def fit_projection(matrix: np.ndarray, dim: int, block: int = 8192) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    PCA of the embedding rows: returns (mean, components of shape (full_dim, dim),
+    fraction of variance kept). The covariance is accumulated in blocks so a
+    memory-mapped matrix is never copied whole.
+    """
+    n, full_dim = matrix.shape
+    if not 0 < dim < full_dim:
+        raise ValueError(f"projection dim must be between 1 and {full_dim - 1}, got {dim}")
+    mean = np.zeros(full_dim, dtype=np.float64)
+    for start in range(0, n, block):
+        mean += np.asarray(matrix[start:start + block], dtype=np.float64).sum(axis=0)
+    mean /= n
+    cov = np.zeros((full_dim, full_dim), dtype=np.float64)
+    for start in range(0, n, block):
+        centred = np.asarray(matrix[start:start + block], dtype=np.float64) - mean
+        cov += centred.T @ centred
+    eigvals, eigvecs = np.linalg.eigh(cov / max(n - 1, 1))
+    order = np.argsort(eigvals)[::-1][:dim]
+    kept = float(eigvals[order].sum() / max(eigvals.sum(), 1e-12))
+    return mean.astype(np.float32), np.ascontiguousarray(eigvecs[:, order], dtype=np.float32), kept
+
+
+def _save_npy(path: Path, arr: np.ndarray) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(arr), allow_pickle=False)
+    tmp.replace(path)
+
+
+class EmbeddingMatrix:
+    """Read-only matrix of normalised code embeddings with exact top-k search."""
+
+    def __init__(
+        self, matrix: np.ndarray, projection: Optional[tuple[np.ndarray, np.ndarray]] = None
+    ) -> None:
+        self._matrix = matrix
+        self._projection = projection  # (mean, components) when the rows are PCA-reduced
+
+    def __len__(self) -> int:
+        return int(self._matrix.shape[0])
+
+    @property
+    def dim(self) -> int:
+        return int(self._matrix.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._matrix.nbytes)
+
+    # ------------------------------------------------------------------
+    # Build / load
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def exists(table_dir: Path, model_key: str, n_codes: Optional[int] = None) -> bool:
+        meta_path = table_dir / _META_FILE
+        if not (meta_path.exists() and (table_dir / _MATRIX_FILE).exists()):
+            return False
+        meta = json.loads(meta_path.read_text())
+        return meta.get("model") == model_key and (n_codes is None or meta.get("rows") == n_codes)
+
+    @classmethod
+    def load(cls, table_dir: Path, dim: int = 0) -> "EmbeddingMatrix":
+        """Full matrix, or with `dim` the PCA-reduced one and its projection."""
+        if not dim:
+            return cls(np.load(table_dir / _MATRIX_FILE, mmap_mode="r", allow_pickle=False))
+        matrix_file, _, projection_file = _reduced_files(dim)
+        with np.load(table_dir / projection_file, allow_pickle=False) as proj:
+            projection = (proj["mean"], proj["components"])
+        return cls(np.load(table_dir / matrix_file, mmap_mode="r", allow_pickle=False), projection)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        table_dir: Path,
+        texts: Sequence[str],
+        model_key: str,
+        label: str,
+        base_dir: Optional[Path] = None,
+        dim: int = EMBEDDING_DIM,
+    ) -> "EmbeddingMatrix":
+        if not cls.exists(table_dir, model_key, len(texts)):
+            cls.build(table_dir, texts, model_key, label, base_dir)
+        if dim and not cls.reduced_exists(table_dir, model_key, len(texts), dim):
+            cls.build_reduced(table_dir, dim)
+        return cls.load(table_dir, dim)
+
+    @staticmethod
+    def reduced_exists(table_dir: Path, model_key: str, n_codes: int, dim: int) -> bool:
+        matrix_file, meta_file, projection_file = _reduced_files(dim)
+        if not all((table_dir / f).exists() for f in (matrix_file, meta_file, projection_file)):
+            return False
+        meta = json.loads((table_dir / meta_file).read_text())
+        return meta.get("model") == model_key and meta.get("rows") == n_codes
+
+    @staticmethod
+    def build_reduced(table_dir: Path, dim: int) -> None:
+        """Fit a `dim`-component PCA on the full matrix and store the projected rows."""
+        meta = json.loads((table_dir / _META_FILE).read_text())
+        full = np.load(table_dir / _MATRIX_FILE, mmap_mode="r", allow_pickle=False)
+        mean, components, kept = fit_projection(full, dim)
+        reduced = _normalise((np.asarray(full, dtype=np.float32) - mean) @ components)
+
+        matrix_file, meta_file, projection_file = _reduced_files(dim)
+        tmp = table_dir / f".{projection_file}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, mean=mean, components=components)
+        tmp.replace(table_dir / projection_file)
+        _save_npy(table_dir / matrix_file, reduced.astype(np.float32))
+        (table_dir / meta_file).write_text(json.dumps({
+            "model": meta["model"], "rows": meta["rows"], "dim": dim, "variance_kept": round(kept, 4),
+        }))
+        logger.info(
+            "EmbeddingMatrix: %s reduced %d -> %d dims (%.1f%% of variance kept, %.1f MB)",
+            table_dir.name, full.shape[1], dim, kept * 100.0, reduced.nbytes / 2**20,
+        )
+
+    @staticmethod
+    def build(
+        table_dir: Path,
+        texts: Sequence[str],
+        model_key: str,
+        label: str,
+        base_dir: Optional[Path] = None,
+    ) -> None:
+        """
+        Encode every description and write the matrix atomically. With
+        `base_dir` (another code table with a matrix from the same model),
+        descriptions it already contains reuse its rows instead of being encoded.
+        """
+        from app.services.shared_embedder import encode_with_progress
+
+        texts = list(texts)
+        base, base_rows = None, {}
+        if base_dir is not None and EmbeddingMatrix.exists(base_dir, model_key) and CodeTable.exists(base_dir):
+            base_texts = CodeTable.load(base_dir).descs_list()
+            base = np.load(base_dir / _MATRIX_FILE, mmap_mode="r", allow_pickle=False)
+            if len(base_texts) == base.shape[0]:
+                base_rows = {t: i for i, t in enumerate(base_texts)}
+            else:
+                base = None
+
+        rows = np.array([base_rows.get(t, -1) for t in texts], dtype=np.int64)
+        todo = np.flatnonzero(rows < 0)
+        logger.info(
+            "EmbeddingMatrix: %s — %d descriptions reused from %s, %d to encode",
+            table_dir.name, len(texts) - todo.size, base_dir.name if base is not None else "nothing", todo.size,
+        )
+        new = None
+        if todo.size:
+            new = encode_with_progress([texts[i] for i in todo], batch_size=512, label=label).astype(np.float32)
+            new /= np.maximum(np.linalg.norm(new, axis=1, keepdims=True), 1e-12)
+
+        dim = base.shape[1] if base is not None else new.shape[1]
+        embs = np.empty((len(texts), dim), dtype=np.float32)
+        reused = np.flatnonzero(rows >= 0)
+        if reused.size:
+            embs[reused] = base[rows[reused]]
+        if new is not None:
+            embs[todo] = new
+
+        table_dir.mkdir(parents=True, exist_ok=True)
+        _save_npy(table_dir / _MATRIX_FILE, embs)
+        # Reduced matrices were derived from the previous full one
+        for stale in table_dir.glob("embeddings_*.json"):
+            stale.unlink()
+        (table_dir / _META_FILE).write_text(
+            json.dumps({"model": model_key, "rows": len(texts), "dim": int(dim)})
+        )
+        logger.info("EmbeddingMatrix: saved %s (%.1f MB)", table_dir / _MATRIX_FILE, embs.nbytes / 2**20)
+
+    def rows(self, start: int, end: int) -> np.ndarray:
+        return np.asarray(self._matrix[start:end])
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+
+    def nearest(self, embedding: np.ndarray, k: int) -> list[tuple[int, float]]:
+        """
+        Up to k (row index, cosine distance) pairs, closest first. Distances use
+        ChromaDB's cosine convention (1 - cosine similarity, range 0..2).
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        q = _normalise(np.asarray(embedding, dtype=np.float32).ravel())
+        if self._projection is not None:
+            mean, components = self._projection
+            q = _normalise((q - mean) @ components)
+        sims = self._matrix @ q
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(int(i), float(1.0 - sims[i])) for i in top]
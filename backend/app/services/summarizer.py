@@ -1,7 +1,6 @@
 
 import os
 import asyncio
-from google import genai
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,9 +8,18 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 MODEL_NAME = "gemini-2.0-flash" 
 
-# Initialize via Client — standard API version for generate_content
-# NOTE: v1alpha is for the Live API only (gemini_service.py). Regular generation uses the default API version.
-client = genai.Client(api_key=GEMINI_API_KEY)
+_client = None
+
+
+def _get_client():
+    """Gemini client, created on first use so importing this module stays cheap."""
+    global _client
+    if _client is None:
+        from google import genai
+        # Standard API version for generate_content
+        # NOTE: v1alpha is for the Live API only (gemini_service.py). Regular generation uses the default API version.
+        _client = genai.Client(api_key=GEMINI_API_KEY)
+    return _client
 
 MAX_RETRIES = 4
 INITIAL_RETRY_DELAY = 15  # seconds — Free-tier Gemini often requires ~50s cooldown
@@ -43,7 +51,7 @@ async def generate_consultation_summary_async(transcript_history: list[str]) ->
     for attempt in range(MAX_RETRIES):
         try:
             # Use async client for non-blocking retries
-            response = await client.aio.models.generate_content(
+            response = await _get_client().aio.models.generate_content(
                 model=MODEL_NAME,
                 contents=prompt
             )
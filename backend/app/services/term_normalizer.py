@@ -0,0 +1,165 @@
+"""
+Colloquial / vernacular term normalization.
+
+Patients describe complaints as "bukhar", "khansi", "chest mein dard"; forms
+get "pakka ghar" or "scheduled tribe". This module maps such phrases to
+canonical terms in a single left-to-right pass on the text the coding services
+embed and search (the stored record keeps what was said), and classifies the
+values Gemini fills into standardized form fields.
+
+Terms live in app/resources/clinical_terms.json (override with
+CLINICAL_TERMS_FILE), grouped into sections of {canonical: [variants]}:
+  clinical        : symptom / procedure phrases, rewritten in free text
+  housing_type, caste_category, gender : field values, classified to a label
+
+Each section is compiled once into a trie-shaped regex (one alternation per
+shared prefix), so matching stays linear in the input regardless of how many
+variants are listed. Matches are leftmost-longest and bounded by whitespace or
+punctuation rather than \\b, which does not treat Indic vowel signs as word
+characters. A space in a variant matches any run of whitespace, so text is
+matched in place and keeps its line breaks and spacing outside the rewritten
+phrases.
+
+Classification is stricter than rewriting: a single-letter variant ("m", "f")
+only counts when it is the whole value, and a value whose phrases point to
+different labels ("boy or girl") is ambiguous and gets no label. Overlapping
+variants are already resolved leftmost-longest ("semi pakka" over "pakka").
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_TERMS_FILE = Path(
+    os.getenv("CLINICAL_TERMS_FILE")
+    or Path(__file__).resolve().parent.parent / "resources" / "clinical_terms.json"
+)
+
+# Characters that may surround a term: whitespace plus ASCII and Devanagari punctuation
+_DELIMS = r"\s!-/:-@\[-`{-~।॥‘’“”–—"
+_LEFT = rf"(?<![^{_DELIMS}])"
+_RIGHT = rf"(?![^{_DELIMS}])"
+
+
+def _trie_regex(terms: list[str]) -> str:
+    """Alternation of `terms` factored by common prefix; longer matches are tried first."""
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        terminal = "" in node
+        branches = [
+            (r"\s+" if ch == " " else re.escape(ch)) + build(child)
+            for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+class TermMatcher:
+    """Compiled matcher for one section of the lexicon."""
+
+    def __init__(self, mapping: dict[str, list[str]]) -> None:
+        self._canonical: dict[str, str] = {}
+        for canonical, variants in mapping.items():
+            for variant in variants:
+                key = _key(variant)
+                if key:
+                    self._canonical.setdefault(key, canonical)
+        # Single letters are whole-value abbreviations only, never matched inside text
+        phrases = [key for key in self._canonical if len(key) > 1]
+        self._pattern = (
+            re.compile(_LEFT + "(" + _trie_regex(phrases) + ")" + _RIGHT, re.IGNORECASE)
+            if phrases else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def replace(self, text: str) -> str:
+        """Rewrite every matched phrase (of two or more characters) to its canonical term."""
+        if self._pattern is None or not text:
+            return text
+        return self._pattern.sub(lambda m: self._canonical[_key(m.group(1))], text)
+
+    def classify(self, text: str) -> Optional[str]:
+        """
+        Canonical label of `text`: the whole value if it is a variant, else the
+        one label its matched phrases agree on; None if nothing matched or the
+        phrases disagree.
+        """
+        if not text:
+            return None
+        whole = self._canonical.get(_key(text))
+        if whole is not None or self._pattern is None:
+            return whole
+        labels = {self._canonical[_key(m.group(1))] for m in self._pattern.finditer(text)}
+        return labels.pop() if len(labels) == 1 else None
+
+
+def _key(phrase: str) -> str:
+    # Variants are stored lower-cased and single-spaced
+    return " ".join(phrase.lower().split())
+
+
+class TermNormalizer:
+    """All lexicon sections, compiled once per process."""
+
+    def __init__(self, lexicon: dict[str, dict[str, list[str]]]) -> None:
+        self._sections = {name: TermMatcher(mapping) for name, mapping in lexicon.items()}
+
+    @classmethod
+    def from_file(cls, path: Path = _TERMS_FILE) -> "TermNormalizer":
+        with open(path, encoding="utf-8") as f:
+            lexicon = json.load(f)
+        normalizer = cls(lexicon)
+        logger.info(
+            "TermNormalizer: %s",
+            ", ".join(f"{name}={len(m)}" for name, m in normalizer._sections.items()),
+        )
+        return normalizer
+
+    def clinical(self, text: str) -> str:
+        """Rewrite colloquial clinical phrases in free text ("pet dard" -> "abdominal pain")."""
+        matcher = self._sections.get("clinical")
+        return matcher.replace(text) if matcher else text
+
+    def field_value(self, field: str, value: str) -> Optional[str]:
+        """Canonical value for a standardized form field, or None if nothing matched."""
+        matcher = self._sections.get(field)
+        return matcher.classify(value) if matcher else None
+
+
+_normalizer: Optional[TermNormalizer] = None
+
+
+def get_normalizer() -> TermNormalizer:
+    """Return the shared TermNormalizer (compiled on first call)."""
+    global _normalizer
+    if _normalizer is None:
+        try:
+            _normalizer = TermNormalizer.from_file()
+        except Exception as exc:
+            logger.warning("TermNormalizer: lexicon unavailable (%s) — terms pass through unchanged", exc)
+            _normalizer = TermNormalizer({})
+    return _normalizer
+
+
+def normalize_clinical(text: str) -> str:
+    return get_normalizer().clinical(text)
@@ -0,0 +1,119 @@
+"""
+Deadline-aware execution of the coding tiers.
+
+suggest() and search() take an optional deadline in milliseconds. Tiers run
+in priority order, and before each one the TierRunner compares the time left
+with that tier's expected cost — an exponentially weighted moving average of
+its recent latencies on this process — and skips it when it would not fit.
+One cheap lexical tier per call is marked required so there is always an
+answer. The entity tier checks the deadline between entities and stops early
+("truncated"); the other tiers are a single model / index call each and are
+not interrupted once started, so the cost estimate is what keeps overruns rare.
+
+A single slow call (cold tokenizer, first model inference, page faults on a
+memory-mapped index) must not starve a tier for the life of the process, so
+one sample can raise the estimate by at most _MAX_SAMPLE_RATIO times, and a
+tier skipped _PROBE_AFTER_SKIPS times in a row is run once as a probe when the
+time left covers its initial cost; the probe's latency replaces the estimate.
+
+Every call fills a TierReport (tiers run, skipped, truncated, and those whose
+candidates made it into the answer) that the API returns with the results.
+With no deadline every tier runs, exactly as before.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+
+_COST_ALPHA = 0.2  # weight of the newest latency sample in the moving average
+_MAX_SAMPLE_RATIO = 4.0  # samples above this multiple of the estimate are clipped to it
+_PROBE_AFTER_SKIPS = 20  # consecutive skips before a tier is re-measured
+
+
+class Deadline:
+    """Absolute deadline on the perf_counter clock; None means unbounded."""
+
+    def __init__(self, budget_ms: Optional[float]) -> None:
+        self.budget_ms = budget_ms
+        self._start = time.perf_counter()
+        self._end = None if budget_ms is None else self._start + budget_ms / 1000.0
+
+    @property
+    def bounded(self) -> bool:
+        return self._end is not None
+
+    def remaining_ms(self) -> float:
+        if self._end is None:
+            return math.inf
+        return (self._end - time.perf_counter()) * 1000.0
+
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0.0
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000.0
+
+
+class TierReport(BaseModel):
+    run: list[str] = []
+    skipped: list[str] = []
+    truncated: list[str] = []
+    contributed: list[str] = []
+    deadline_ms: Optional[float] = None
+    elapsed_ms: float = 0.0
+
+
+class TierRunner:
+    """Admits tiers against a deadline and learns each tier's typical cost."""
+
+    def __init__(self, initial_cost_ms: dict[str, float]) -> None:
+        self._initial = dict(initial_cost_ms)
+        self._cost = dict(initial_cost_ms)
+        self._skips = dict.fromkeys(initial_cost_ms, 0)
+        self._lock = threading.Lock()
+
+    def estimate_ms(self, tier: str) -> float:
+        return self._cost[tier]
+
+    def run(
+        self,
+        tier: str,
+        deadline: Deadline,
+        report: TierReport,
+        fn: Callable,
+        *args,
+        required: bool = False,
+    ) -> bool:
+        """Run fn(*args) as `tier` if it fits in the time left; returns whether it ran."""
+        probe = False
+        if not required:
+            admitted, probe = self._admit(tier, deadline.remaining_ms())
+            if not admitted:
+                report.skipped.append(tier)
+                return False
+        t0 = time.perf_counter()
+        fn(*args)
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        report.run.append(tier)
+        # A truncated run says nothing about the tier's full cost
+        if tier not in report.truncated:
+            with self._lock:
+                sample = min(elapsed_ms, self._cost[tier] * _MAX_SAMPLE_RATIO)
+                self._cost[tier] += (1.0 if probe else _COST_ALPHA) * (sample - self._cost[tier])
+        return True
+
+    def _admit(self, tier: str, remaining_ms: float) -> tuple[bool, bool]:
+        """(admitted, as a probe) for `tier` with `remaining_ms` left."""
+        with self._lock:
+            if remaining_ms >= self._cost[tier]:
+                self._skips[tier] = 0
+                return True, False
+            if self._skips[tier] >= _PROBE_AFTER_SKIPS and remaining_ms >= self._initial[tier]:
+                self._skips[tier] = 0
+                return True, True
+            self._skips[tier] += 1
+            return False, False
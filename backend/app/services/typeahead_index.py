@@ -0,0 +1,176 @@
+"""
+Precomputed token-prefix index for code-browser typeahead.
+
+Serves keystroke-level lookups without touching TF-IDF, the embedder or Chroma:
+  - Code prefixes ("J06", "0BH") resolve by bisecting a sorted list of
+    normalised codes.
+  - Description words resolve by bisecting a sorted vocabulary. Postings are
+    laid out CSR-style in vocabulary order, so every word that starts with a
+    prefix maps to one contiguous slice of the postings array.
+  - Each query token is prefix-matched and the token sets are intersected.
+    Candidate sets are memoised per token tuple, so the next keystroke
+    ("chest p" -> "chest pa") only intersects the previous set with the docs of
+    the token that changed.
+Ranking is static: shorter (more general) descriptions first.
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MAX_BACKTRACK = 8        # how many trailing characters to strip when looking for a cached parent query
+_DENSE_SLICE = 4096       # postings slices larger than this are unioned with a mask instead of np.unique
+
+
+def _tokenize(text: str) -> tuple[str, ...]:
+    return tuple(_TOKEN_RE.findall(text.lower()))
+
+
+class TypeaheadIndex:
+    """Read-only prefix index over (code, description) pairs."""
+
+    def __init__(self, codes: Sequence[str], descs: Sequence[str], cache_size: int = 512) -> None:
+        n = len(codes)
+        self._n = n
+
+        normalised = [c.upper().replace(".", "") for c in codes]
+        code_order = sorted(range(n), key=normalised.__getitem__)
+        self._code_keys = [normalised[i] for i in code_order]
+        self._code_order = np.asarray(code_order, dtype=np.int32)
+
+        postings: dict[str, list[int]] = {}
+        n_tokens = np.zeros(n, dtype=np.int32)
+        for i, desc in enumerate(descs):
+            tokens = set(_tokenize(desc))
+            n_tokens[i] = len(tokens)
+            for tok in tokens:
+                postings.setdefault(tok, []).append(i)
+
+        self._vocab = sorted(postings)
+        offsets = np.zeros(len(self._vocab) + 1, dtype=np.int64)
+        np.cumsum([len(postings[t]) for t in self._vocab], out=offsets[1:])
+        self._post_offsets = offsets
+        self._post_docs = np.fromiter(
+            (d for t in self._vocab for d in postings[t]), dtype=np.int32, count=int(offsets[-1])
+        )
+        self._n_tokens = np.maximum(n_tokens, 1)
+
+        # rank[i] = position of doc i when ordered by description length
+        lengths = np.fromiter((len(d) for d in descs), dtype=np.int32, count=n)
+        self._rank = np.empty(n, dtype=np.int32)
+        self._rank[np.argsort(lengths, kind="stable")] = np.arange(n, dtype=np.int32)
+
+        self._cache: OrderedDict[tuple[str, ...], np.ndarray] = OrderedDict()
+        self._cache_size = cache_size
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def code_prefix(self, query: str, limit: int) -> list[int]:
+        """Indices of codes whose normalised form starts with the query."""
+        key = query.upper().replace(" ", "").replace(".", "")
+        if not key:
+            return []
+        lo = bisect_left(self._code_keys, key)
+        hi = min(lo + limit, len(self._code_keys))
+        hits: list[int] = []
+        for pos in range(lo, hi):
+            if not self._code_keys[pos].startswith(key):
+                break
+            hits.append(int(self._code_order[pos]))
+        return hits
+
+    def lookup(self, query: str, limit: int) -> list[tuple[int, float, str]]:
+        """
+        Return up to `limit` (doc index, confidence, source) tuples: code-prefix
+        hits first ("exact"), then description token-prefix hits ("prefix").
+        """
+        results = [(i, 1.0, "exact") for i in self.code_prefix(query, limit)]
+        if len(results) >= limit:
+            return results
+
+        tokens = _tokenize(query)
+        if not tokens:
+            return results
+        candidates = self._candidates(query, tokens)
+        if candidates.size == 0:
+            return results
+
+        # `limit` covers the remaining slots even if every code hit reappears here
+        seen = {i for i, _, _ in results}
+        if candidates.size > limit:
+            part = np.argpartition(self._rank[candidates], limit - 1)[:limit]
+            candidates = candidates[part]
+        candidates = candidates[np.argsort(self._rank[candidates], kind="stable")]
+
+        coverage = np.minimum(len(tokens) / self._n_tokens[candidates], 1.0)
+        for idx, cov in zip(candidates.tolist(), coverage.tolist()):
+            if idx in seen:
+                continue
+            results.append((idx, round(min(0.6 + 0.39 * cov, 0.99), 4), "prefix"))
+            if len(results) >= limit:
+                break
+        return results
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _candidates(self, query: str, tokens: tuple[str, ...]) -> np.ndarray:
+        cached = self._cache_get(tokens)
+        if cached is not None:
+            return cached
+
+        base: Optional[np.ndarray] = None
+        start = 0
+        # Reuse the candidate set of the previous keystroke(s) when the query extends it.
+        for cut in range(len(query) - 1, max(0, len(query) - 1 - _MAX_BACKTRACK), -1):
+            parent = _tokenize(query[:cut])
+            if not parent:
+                break
+            hit = self._cache_get(parent)
+            if hit is not None:
+                base, start = hit, len(parent) - 1
+                break
+
+        for tok in tokens[start:]:
+            docs = self._docs_for_prefix(tok)
+            base = docs if base is None else np.intersect1d(base, docs, assume_unique=True)
+            if base.size == 0:
+                break
+
+        result = base if base is not None else np.empty(0, dtype=np.int32)
+        self._cache_put(tokens, result)
+        return result
+
+    def _docs_for_prefix(self, prefix: str) -> np.ndarray:
+        lo = bisect_left(self._vocab, prefix)
+        hi = bisect_left(self._vocab, prefix + "\uffff", lo)
+        if lo == hi:
+            return np.empty(0, dtype=np.int32)
+        docs = self._post_docs[self._post_offsets[lo]:self._post_offsets[hi]]
+        if hi - lo == 1:
+            return docs
+        if docs.size > _DENSE_SLICE:
+            mask = np.zeros(self._n, dtype=bool)
+            mask[docs] = True
+            return np.flatnonzero(mask).astype(np.int32)
+        return np.unique(docs)
+
+    def _cache_get(self, key: tuple[str, ...]) -> Optional[np.ndarray]:
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+        return hit
+
+    def _cache_put(self, key: tuple[str, ...], value: np.ndarray) -> None:
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,109 @@
+"""
+Shared helpers for the backend benchmark scripts.
+
+Scripts are run from the backend/ directory, e.g.
+    python benchmarks/bench_embedder.py --out results/embedder.json
+Importing this module puts backend/ on sys.path so `app.*` resolves.
+"""
+from __future__ import annotations
+
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def load_code_lists(code_type: str) -> tuple[list[str], list[str]]:
+    """
+    Load (codes, descriptions) offline, without starting the coding services:
+    ICD-10-PCS from the local code table, ICD-10-CM leaf codes from theirs when
+    the backend has built it, otherwise from simple_icd_10_cm.
+    """
+    if code_type == "procedure":
+        from app.services.code_table import CodeTable
+        from app.services.procedure_coding_service import _PCS_TABLE_DIR
+
+        if not CodeTable.exists(_PCS_TABLE_DIR):
+            raise SystemExit(f"No ICD-10-PCS code table at {_PCS_TABLE_DIR}; start the backend once first.")
+        table = CodeTable.load(_PCS_TABLE_DIR)
+        return table.codes_list(), table.descs_list()
+
+    from app.services.code_table import CodeTable
+    from app.services.icd_coding_service import _CM_TABLE_DIR
+
+    if CodeTable.exists(_CM_TABLE_DIR):
+        table = CodeTable.load(_CM_TABLE_DIR)
+        return table.codes_list(), table.descs_list()
+
+    import simple_icd_10_cm as cm
+
+    codes = [c for c in cm.get_all_codes(with_dots=True) if cm.is_leaf(c)]
+    return codes, [cm.get_description(c) for c in codes]
+
+
+def percentiles(samples_ms: list[float]) -> dict[str, float]:
+    """p50/p95/p99/mean/max over a list of millisecond samples."""
+    if not samples_ms:
+        return {"n": 0}
+    ordered = sorted(samples_ms)
+
+    def pct(p: float) -> float:
+        k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+        return round(ordered[k], 3)
+
+    return {
+        "n": len(ordered),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def time_calls(fn: Callable[[], Any], repeat: int, warmup: int = 3) -> list[float]:
+    """Call fn() `warmup` times untimed, then `repeat` times; return ms per call."""
+    for _ in range(warmup):
+        fn()
+    samples: list[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def write_report(name: str, results: dict[str, Any], out: str | None) -> None:
+    """Print the report and, if `out` is given, write it as JSON for cross-commit diffs."""
+    report = {
+        "benchmark": name,
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if out:
+        path = Path(out)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
@@ -0,0 +1,80 @@
+"""
+Synthetic OPD-style encounters for the coding benchmarks.
+
+Encounters are assembled from templates of the complaints, symptoms and
+working diagnoses seen in rural primary-care OPDs, including colloquial
+Hindi/Hinglish phrasing that the term normalizer maps to clinical terms. A
+fixed seed makes the corpus identical across runs and commits.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+
+_COMPLAINTS = [
+    "fever", "bukhar", "cough", "khansi", "loose motions", "vomiting", "headache",
+    "stomach pain", "pet dard", "chest pain", "breathlessness", "body ache",
+    "burning micturition", "joint pain", "weakness", "dizziness", "skin rash",
+    "itching", "ear pain", "sore throat", "back pain", "swelling of feet",
+    "white discharge", "missed periods", "wound on leg", "dog bite", "burn injury",
+]
+_SYMPTOMS = [
+    "chills", "rigors", "dry cough", "productive cough", "running nose", "nausea",
+    "loss of appetite", "watery stools", "blood in stool", "pain on swallowing",
+    "high grade fever", "low grade fever", "night sweats", "weight loss",
+    "palpitations", "giddiness", "yellow urine", "jaundice", "wheezing",
+    "redness of eyes", "painful urination", "lower abdominal pain",
+    "pain radiating to left arm", "swelling", "pus discharge",
+]
+_DURATIONS = ["since 2 days", "for 3 days", "since 1 week", "for 10 days", "since yesterday", "for 1 month"]
+_DIAGNOSES = [
+    "acute upper respiratory infection", "acute gastroenteritis", "typhoid fever",
+    "malaria", "dengue fever", "urinary tract infection", "essential hypertension",
+    "type 2 diabetes mellitus", "iron deficiency anaemia", "acute bronchitis",
+    "pulmonary tuberculosis", "scabies", "otitis media", "acute pharyngitis",
+    "lumbar strain", "osteoarthritis of knee", "cellulitis of leg", "viral fever",
+    "peptic ulcer", "bronchial asthma", "pregnancy first trimester", "animal bite",
+    "second degree burn of forearm", "vaginal candidiasis", "conjunctivitis",
+]
+_PROCEDURES = [
+    "incision and drainage of abscess", "suturing of laceration of hand",
+    "dressing of wound", "nebulization", "intravenous fluid infusion",
+    "urinary catheterization", "removal of foreign body from ear",
+    "ear syringing", "plaster cast application forearm", "normal vaginal delivery",
+    "episiotomy repair", "intramuscular injection", "blood transfusion",
+    "excision of sebaceous cyst", "tooth extraction", "chest x ray",
+    "ultrasound abdomen", "electrocardiogram", "insertion of intrauterine device",
+    "debridement of burn wound",
+]
+_SEARCH_QUERIES = [
+    "fever", "J06", "R50.9", "diabetes", "hypertension", "diarrhoea", "typhoid",
+    "asthma", "fracture femur", "anaemia", "tuberculosis lung", "urinary infection",
+    "abscess drainage", "appendectomy", "suture", "0DTJ4ZZ", "cesarean", "cast",
+    "knee pain", "dengue",
+]
+
+
+@dataclass
+class Encounter:
+    chief_complaint: str
+    symptoms: list[str] = field(default_factory=list)
+    diagnosis_text: str = ""
+    procedure_text: str = ""
+    search_query: str = ""
+
+    def text(self) -> str:
+        return ". ".join([self.chief_complaint, *self.symptoms, self.diagnosis_text])
+
+
+def synthetic_encounters(n: int = 200, seed: int = 13) -> list[Encounter]:
+    rng = random.Random(seed)
+    encounters = []
+    for _ in range(n):
+        encounters.append(Encounter(
+            chief_complaint=f"{rng.choice(_COMPLAINTS)} {rng.choice(_DURATIONS)}",
+            symptoms=rng.sample(_SYMPTOMS, rng.randint(1, 4)),
+            diagnosis_text=rng.choice(_DIAGNOSES) if rng.random() < 0.8 else "",
+            procedure_text=rng.choice(_PROCEDURES),
+            search_query=rng.choice(_SEARCH_QUERIES),
+        ))
+    return encounters
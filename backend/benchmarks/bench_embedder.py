@@ -0,0 +1,80 @@
+"""
+Embedding backend benchmark: single-query latency and batch-512 throughput.
+
+Compares each EMBEDDING_BACKEND against the plain PyTorch path and reports the
+cosine agreement of its embeddings with torch.
+
+    python benchmarks/bench_embedder.py --backends torch onnx onnx-int8 --out results/embedder.json
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import percentiles, time_calls, write_report
+
+import numpy as np
+
+from app.services.shared_embedder import _PROBE_TEXTS, load_embedder
+
+_QUERY = "fever with dry cough and body ache since two days"
+
+
+def _batch_texts(n: int) -> list[str]:
+    return [f"{_PROBE_TEXTS[i % len(_PROBE_TEXTS)]} ({i})" for i in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--repeat", type=int, default=100, help="single-query iterations")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--batch-repeat", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    batch = _batch_texts(args.batch_size)
+    reference = None
+    results: dict[str, dict] = {}
+
+    for backend in args.backends:
+        t0 = time.perf_counter()
+        try:
+            model = load_embedder(backend)
+        except Exception as exc:
+            results[backend] = {"error": str(exc)}
+            continue
+        load_ms = (time.perf_counter() - t0) * 1000.0
+
+        single = time_calls(
+            lambda: model.encode([_QUERY], show_progress_bar=False), repeat=args.repeat
+        )
+        batch_ms = time_calls(
+            lambda: model.encode(batch, batch_size=args.batch_size, show_progress_bar=False),
+            repeat=args.batch_repeat, warmup=1,
+        )
+
+        embs = model.encode(batch, normalize_embeddings=True, show_progress_bar=False)
+        if reference is None and backend == "torch":
+            reference = embs
+        agreement = None
+        if reference is not None:
+            cos = np.sum(reference * embs, axis=1)
+            agreement = {"min_cosine": float(cos.min()), "mean_cosine": float(cos.mean())}
+
+        median_batch_s = sorted(batch_ms)[len(batch_ms) // 2] / 1000.0
+        results[backend] = {
+            "load_ms": round(load_ms, 1),
+            "single_query": percentiles(single),
+            f"batch_{args.batch_size}": percentiles(batch_ms),
+            "batch_throughput_texts_per_s": round(args.batch_size / median_batch_s, 1),
+            "agreement_vs_torch": agreement,
+        }
+        del model
+
+    write_report("embedder", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Embedding store benchmark: model encode vs a restarted process reading the
+persistent store (SQLite lookup) vs the warmed in-memory tier.
+
+Uses a throwaway store file so the backend's data/embedding_store.sqlite3 is
+left untouched.
+
+    python benchmarks/bench_embedding_store.py --backend torch --out results/embedding_store.json
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import percentiles, time_calls, write_report
+
+from app.services.embedding_store import EmbeddingStore, normalize_text
+from app.services.shared_embedder import _PROBE_TEXTS, load_embedder
+
+_PHRASES = _PROBE_TEXTS + [
+    "fever", "cough", "headache", "abdominal pain", "vomiting", "diarrhoea",
+    "paracetamol 650 mg", "amoxicillin 500 mg three times daily", "ors sachets",
+    "burning micturition", "shortness of breath", "joint pain", "weakness",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the phrase set")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    model = load_embedder(args.backend)
+    keys = [normalize_text(p) for p in _PHRASES]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "store.sqlite3"
+        model_key = f"bench:{args.backend}"
+
+        def run_model() -> None:
+            for k in keys:
+                model.encode([k], show_progress_bar=False)
+
+        model_ms = time_calls(run_model, repeat=args.repeat, warmup=1)
+
+        writer = EmbeddingStore(path, model_key)
+        writer.put_many(zip(keys, model.encode(keys, show_progress_bar=False)))
+        writer.flush()
+
+        # Fresh instance = restarted process: memory tier empty, rows on disk
+        cold = EmbeddingStore(path, model_key, memory_entries=0)
+
+        def run_disk() -> None:
+            for k in keys:
+                cold.get_many([k])
+
+        disk_ms = time_calls(run_disk, repeat=args.repeat, warmup=1)
+
+        warm = EmbeddingStore(path, model_key)
+        warmed = warm.warm()
+
+        def run_memory() -> None:
+            for k in keys:
+                warm.get_many([k])
+
+        memory_ms = time_calls(run_memory, repeat=args.repeat, warmup=1)
+
+    per_phrase = lambda samples: percentiles([t / len(keys) for t in samples])  # noqa: E731
+    results = {
+        "backend": args.backend,
+        "phrases": len(keys),
+        "warmed_entries": warmed,
+        "model_encode": per_phrase(model_ms),
+        "store_disk_lookup": per_phrase(disk_ms),
+        "store_memory_lookup": per_phrase(memory_ms),
+    }
+    write_report("embedding_store", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
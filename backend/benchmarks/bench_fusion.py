@@ -0,0 +1,98 @@
+"""
+Hybrid score fusion benchmark: the previous per-code dict merge vs the
+vectorized fuse_scores() used by search().
+
+Tier candidates are synthetic (random indices and scores at the sizes search()
+produces, top_k * 10 per tier), so the numbers isolate the merge step from
+TF-IDF, the embedder and Chroma. Both paths are checked to return the same
+top-k before timing.
+
+    python benchmarks/bench_fusion.py --code-type diagnosis --top-k 10 20 50 --out results/fusion.json
+"""
+from __future__ import annotations
+
+import argparse
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import load_code_lists, percentiles, time_calls, write_report
+
+import numpy as np
+
+from app.services.hybrid_fusion import (
+    CHAR_WEIGHT, SEMANTIC_WEIGHT, SUBSTRING_BOOST, WORD_WEIGHT, fuse_scores, top_normalised,
+)
+
+_QUERY = "fracture"
+
+
+def _dict_merge(codes, descs, tiers, query, top_k):
+    """The merge search() used before: code-keyed dicts and a full sort of objects."""
+    kw_scores = {codes[i]: s for i, s in zip(tiers[0][0].tolist(), tiers[0][1].tolist())}
+    char_scores = {codes[i]: s for i, s in zip(tiers[1][0].tolist(), tiers[1][1].tolist())}
+    sem_scores = {codes[i]: (s, descs[i]) for i, s in zip(tiers[2][0].tolist(), tiers[2][1].tolist())}
+
+    ql = query.lower()
+    merged = []
+    for code in set(kw_scores) | set(char_scores) | set(sem_scores):
+        kw = kw_scores.get(code, 0.0)
+        ch = char_scores.get(code, 0.0)
+        sem, desc = sem_scores.get(code, (0.0, ""))
+        if not desc:
+            desc = descs[codes.index(code)]
+        boost = SUBSTRING_BOOST if ql in desc.lower() else 0.0
+        hybrid = round(min(WORD_WEIGHT * kw + CHAR_WEIGHT * ch + SEMANTIC_WEIGHT * sem + boost, 1.0), 4)
+        if hybrid > 0:
+            merged.append({"code": code, "description": desc, "confidence": hybrid})
+    merged.sort(key=lambda s: s["confidence"], reverse=True)
+    return merged[:top_k]
+
+
+def _synthetic_tiers(n_codes: int, candidates: int, rng: np.random.Generator):
+    tiers = []
+    for weight in (WORD_WEIGHT, CHAR_WEIGHT):
+        raw = np.zeros(n_codes)
+        hot = rng.choice(n_codes, size=candidates * 3, replace=False)
+        raw[hot] = rng.random(hot.size)
+        tiers.append((*top_normalised(raw, candidates), weight))
+    sem_idx = rng.choice(n_codes, size=candidates, replace=False).astype(np.int64)
+    tiers.append((sem_idx, rng.random(candidates), SEMANTIC_WEIGHT))
+    return tiers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--code-type", choices=["diagnosis", "procedure"], default="diagnosis")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[10, 20, 50])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    codes, descs = load_code_lists(args.code_type)
+    descs_lower = [d.lower() for d in descs]
+    rng = np.random.default_rng(args.seed)
+
+    results: dict[str, dict] = {"n_codes": len(codes)}
+    for top_k in args.top_k:
+        tiers = _synthetic_tiers(len(codes), top_k * 10, rng)
+
+        old = _dict_merge(codes, descs, tiers, _QUERY, top_k)
+        idx, conf = fuse_scores(tiers, descs_lower, _QUERY, top_k)
+        old_scores = [s["confidence"] for s in old]
+        if old_scores != conf.tolist():
+            raise SystemExit(f"top_k={top_k}: fused confidences differ from the dict merge")
+
+        dict_ms = time_calls(lambda: _dict_merge(codes, descs, tiers, _QUERY, top_k), repeat=args.repeat)
+        vec_ms = time_calls(lambda: fuse_scores(tiers, descs_lower, _QUERY, top_k), repeat=args.repeat)
+        results[f"top_k_{top_k}"] = {
+            "candidates_per_tier": top_k * 10,
+            "dict_merge": percentiles(dict_ms),
+            "fuse_scores": percentiles(vec_ms),
+            "speedup_p50": round(percentiles(dict_ms)["p50_ms"] / max(percentiles(vec_ms)["p50_ms"], 1e-6), 1),
+        }
+
+    write_report("fusion", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
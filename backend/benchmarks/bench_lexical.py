@@ -0,0 +1,97 @@
+"""
+Lexical tier benchmark: inverted-index LexicalIndex vs the full-matrix
+TF-IDF product (`matrix @ query.T`, densified, argsort) it replaced.
+
+Reports per-query latency for both and recall@k of each index scoring
+against the matrix-product top-k, for the word and char n-gram tiers.
+
+    python benchmarks/bench_lexical.py --code-type diagnosis --scorings tfidf bm25 --out results/lexical.json
+"""
+from __future__ import annotations
+
+import argparse
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import load_code_lists, percentiles, time_calls, write_report
+
+import numpy as np
+
+from app.services.lexical_index import char_index, word_index
+
+_QUERIES = [
+    "fever", "chest pain", "type 2 diabetes mellitus without complications",
+    "fracture of left femur", "acute upper respiratory infection",
+    "hypertension", "abdominal pain and vomiting", "asthma exacerbation",
+    "urinary tract infection", "dog bite", "iron deficiency anemia",
+    "open wound of scalp", "pneumonia due to bacteria", "migraine",
+    "excision of appendix", "drainage of pleural cavity", "bypass coronary artery",
+]
+
+
+def _matrix_top(vectorizer, matrix, text: str, k: int) -> np.ndarray:
+    scores = (matrix @ vectorizer.transform([text]).T).toarray().flatten()
+    top = scores.argsort()[-k:][::-1]
+    return top[scores[top] > 0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--code-type", choices=["diagnosis", "procedure"], default="diagnosis")
+    parser.add_argument("--scorings", nargs="+", default=["tfidf", "bm25"])
+    parser.add_argument("--top-k", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5, help="passes over the query set")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    _codes, descs = load_code_lists(args.code_type)
+    k = args.top_k
+
+    baselines = {
+        "word": TfidfVectorizer(ngram_range=(1, 2), min_df=1, sublinear_tf=True),
+        "char": TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 4), min_df=1, sublinear_tf=True),
+    }
+    indexes = {("char", "tfidf"): char_index(descs)}
+    for scoring in args.scorings:
+        indexes[("word", scoring)] = word_index(descs, scoring)
+
+    results: dict[str, dict] = {"n_codes": len(descs), "top_k": k}
+    for tier, vectorizer in baselines.items():
+        matrix = vectorizer.fit_transform(descs)
+        expected = {q: set(_matrix_top(vectorizer, matrix, q, k).tolist()) for q in _QUERIES}
+
+        def run_matrix() -> None:
+            for q in _QUERIES:
+                _matrix_top(vectorizer, matrix, q, k)
+
+        matrix_ms = time_calls(run_matrix, repeat=args.repeat, warmup=1)
+        results[f"{tier}_matrix_product"] = {
+            "per_query": percentiles([t / len(_QUERIES) for t in matrix_ms]),
+        }
+
+        for (idx_tier, scoring), index in indexes.items():
+            if idx_tier != tier:
+                continue
+
+            def run_index() -> None:
+                for q in _QUERIES:
+                    index.top(q, k)
+
+            index_ms = time_calls(run_index, repeat=args.repeat, warmup=1)
+            recalls = []
+            for q in _QUERIES:
+                want = expected[q]
+                if want:
+                    got = set(index.top(q, k)[0].tolist())
+                    recalls.append(len(got & want) / len(want))
+            results[f"{tier}_index_{scoring}"] = {
+                "per_query": percentiles([t / len(_QUERIES) for t in index_ms]),
+                "recall_at_k_vs_matrix": round(float(np.mean(recalls)), 4) if recalls else None,
+            }
+
+    write_report("lexical", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+End-to-end latency benchmark for the clinical coding pipeline.
+
+Runs ICDCodingService / ProcedureCodingService .suggest() and .search() over a
+synthetic corpus of OPD encounters (benchmarks/_corpus.py) and reports:
+  tiers       : p50/p95/p99 per tier — semantic, entity, TF-IDF (suggest) and
+                word, char, semantic, fusion (search)
+  end_to_end  : suggest / search latency per service
+  startup     : time-to-ready and peak RSS of two fresh processes; the first
+                is the cold start (run with --drop-caches as root for a truly
+                cold page cache), the second starts with the page cache warm
+  concurrency : throughput and latency of a mixed suggest/search load at
+                1 / 4 / 16 concurrent callers (threads, as FastAPI runs them)
+  peak_rss_mb : peak resident memory of the benchmark process
+  components  : per-component load time / memory from resource_monitor
+
+Runs fully offline against the artifacts already under data/ (Hugging Face
+offline mode, PCS_ALLOW_DOWNLOAD=false); start the backend or run
+`python -m app.build_indexes` once first.
+
+    python benchmarks/bench_pipeline.py --out results/pipeline.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import BACKEND_DIR, percentiles, write_report
+from _corpus import synthetic_encounters
+
+_OFFLINE_ENV = {
+    "HF_HUB_OFFLINE": "1",
+    "TRANSFORMERS_OFFLINE": "1",
+    "PCS_ALLOW_DOWNLOAD": "false",
+}
+_CONCURRENCY = (1, 4, 16)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((peak if sys.platform == "darwin" else peak * 1024) / 2**20, 1)
+
+
+def _load_services():
+    from app.services.icd_coding_service import ICDCodingService
+    from app.services.procedure_coding_service import ProcedureCodingService
+
+    return ICDCodingService(), ProcedureCodingService()
+
+
+def _startup_probe() -> None:
+    """Child mode: load both services, print time-to-ready and peak RSS as JSON."""
+    t0 = time.perf_counter()
+    _load_services()
+    print(json.dumps({"ready_s": round(time.perf_counter() - t0, 3), "peak_rss_mb": _peak_rss_mb()}))
+
+
+def _measure_startup(drop_caches: bool) -> dict:
+    runs = {}
+    for label in ("cold", "warm"):
+        if label == "cold" and drop_caches:
+            try:
+                os.sync()
+                with open("/proc/sys/vm/drop_caches", "w") as f:
+                    f.write("3\n")
+            except OSError as exc:
+                print(f"could not drop page cache ({exc}); cold start uses the current cache", file=sys.stderr)
+        t0 = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--startup-probe"],
+            cwd=BACKEND_DIR, env=os.environ, capture_output=True, text=True, check=True,
+        ).stdout
+        probe = json.loads(out.strip().splitlines()[-1])
+        probe["process_s"] = round(time.perf_counter() - t0, 3)
+        runs[label] = probe
+    return runs
+
+
+def _timed(samples: list[float], fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    samples.append((time.perf_counter() - t0) * 1000.0)
+    return result
+
+
+def _tier_latencies(svc, texts: list[str], queries: list[str], top_k: int) -> dict:
+    """Call each tier the way suggest()/search() do and time it in isolation."""
+    import numpy as np
+    from app.services.hybrid_fusion import CHAR_WEIGHT, SEMANTIC_WEIGHT, WORD_WEIGHT, fuse_scores
+    from app.services.shared_embedder import encode_cached
+    from app.services.term_normalizer import normalize_clinical
+
+    t: dict[str, list[float]] = {
+        name: [] for name in ("semantic", "entity", "tfidf", "search_word", "search_char", "search_semantic", "fusion")
+    }
+    for text in texts:
+        text = normalize_clinical(text)
+        _timed(t["semantic"], svc._tier1_semantic, text, top_k * 3, {})
+        if svc._nlp is not None:
+            _timed(t["entity"], svc._tier2_entity, text, {})
+        _timed(t["tfidf"], svc._tier3_tfidf, text, top_k * 3, {})
+
+    candidates = top_k * 10
+    for query in queries:
+        tiers = []
+        idx, raw = _timed(t["search_word"], svc._word_index.top, query, candidates)
+        if idx.size:
+            tiers.append((idx, raw / raw[0], WORD_WEIGHT))
+        idx, raw = _timed(t["search_char"], svc._char_index.top, query, candidates)
+        if idx.size:
+            tiers.append((idx, raw / raw[0], CHAR_WEIGHT))
+        hits = _timed(t["search_semantic"], lambda q: svc._nearest(encode_cached([q])[0], candidates), query)
+        if hits:
+            sem_idx = np.array([i for i, _ in hits], dtype=np.int64)
+            tiers.append((sem_idx, np.maximum(0.0, 1.0 - np.array([d for _, d in hits]) / 2.0), SEMANTIC_WEIGHT))
+        _timed(t["fusion"], fuse_scores, tiers, svc._descs_lower, query, top_k)
+    return {name: percentiles(samples) for name, samples in t.items() if samples}
+
+
+def _requests(icd, pcs, encounters, top_k: int) -> list:
+    """Mixed OPD load: per encounter one diagnosis suggest, one procedure suggest, one search."""
+    calls = []
+    for i, enc in enumerate(encounters):
+        calls.append(lambda e=enc: icd.suggest(e.chief_complaint, e.symptoms, e.diagnosis_text, top_k))
+        calls.append(lambda e=enc: pcs.suggest([e.procedure_text], None, top_k))
+        svc = pcs if i % 3 == 0 else icd
+        calls.append(lambda e=enc, s=svc: s.search(e.search_query, top_k * 2))
+    return calls
+
+
+def _concurrency(calls: list, workers: int) -> dict:
+    latencies: list[float] = []
+
+    def run(call) -> None:
+        t0 = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, calls))
+    wall = time.perf_counter() - t0
+    return {
+        "concurrency": workers,
+        "requests": len(calls),
+        "throughput_rps": round(len(calls) / wall, 2),
+        "latency": percentiles(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encounters", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--no-embedding-store", action="store_true",
+                        help="encode every phrase with the model instead of the persistent store")
+    parser.add_argument("--skip-startup", action="store_true", help="skip the two fresh-process start-up runs")
+    parser.add_argument("--drop-caches", action="store_true", help="drop the OS page cache before the cold start (root)")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    # Environment must be fixed before app modules read it at import time
+    os.environ.update(_OFFLINE_ENV)
+    if args.no_embedding_store:
+        os.environ["EMBEDDING_STORE"] = "false"
+
+    if args.startup_probe:
+        _startup_probe()
+        return
+
+    startup = None if args.skip_startup else _measure_startup(args.drop_caches)
+
+    t0 = time.perf_counter()
+    icd, pcs = _load_services()
+    load_s = round(time.perf_counter() - t0, 3)
+
+    encounters = synthetic_encounters(args.encounters, args.seed)
+    queries = [e.search_query for e in encounters]
+
+    # First call pays lazy initialisation (tokenizer, store, page faults); report it separately
+    t0 = time.perf_counter()
+    icd.suggest(encounters[0].chief_complaint, encounters[0].symptoms, encounters[0].diagnosis_text, args.top_k)
+    first_call_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+
+    tiers = {
+        "icd": _tier_latencies(icd, [e.text() for e in encounters], queries, args.top_k),
+        "pcs": _tier_latencies(pcs, [e.procedure_text for e in encounters], queries, args.top_k),
+    }
+
+    e2e: dict[str, list[float]] = {"icd_suggest": [], "icd_search": [], "pcs_suggest": [], "pcs_search": []}
+    for e in encounters:
+        _timed(e2e["icd_suggest"], icd.suggest, e.chief_complaint, e.symptoms, e.diagnosis_text, args.top_k)
+        _timed(e2e["icd_search"], icd.search, e.search_query, args.top_k * 2)
+        _timed(e2e["pcs_suggest"], pcs.suggest, [e.procedure_text], None, args.top_k)
+        _timed(e2e["pcs_search"], pcs.search, e.search_query, args.top_k * 2)
+
+    calls = _requests(icd, pcs, encounters, args.top_k)
+    concurrency = [_concurrency(calls, n) for n in _CONCURRENCY]
+
+    from app.services.resource_monitor import snapshot
+    from app.services.shared_index import SHARED_CODE_INDEX
+
+    results = {
+        "config": {
+            "encounters": len(encounters),
+            "seed": args.seed,
+            "top_k": args.top_k,
+            "embedding_store": not args.no_embedding_store,
+            "shared_code_index": SHARED_CODE_INDEX,
+            "embedding_backend": os.getenv("EMBEDDING_BACKEND", "torch"),
+            "lexical_scoring": os.getenv("LEXICAL_SCORING", "tfidf"),
+            "entity_tier": icd._nlp is not None,
+        },
+        "startup": startup,
+        "in_process_load_s": load_s,
+        "first_call_ms": first_call_ms,
+        "tiers": tiers,
+        "end_to_end": {name: percentiles(samples) for name, samples in e2e.items()},
+        "concurrency": concurrency,
+        "peak_rss_mb": _peak_rss_mb(),
+        "components": snapshot()["components"],
+    }
+    write_report("pipeline", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
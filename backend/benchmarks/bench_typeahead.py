@@ -0,0 +1,67 @@
+"""
+Typeahead latency benchmark: replays clinician-style typing keystroke by
+keystroke against the prefix index and reports per-keystroke percentiles.
+
+    python benchmarks/bench_typeahead.py --code-type diagnosis --out results/typeahead.json
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import load_code_lists, percentiles, write_report
+
+from app.services.typeahead_index import TypeaheadIndex
+
+_QUERIES = {
+    "diagnosis": [
+        "fever", "acute upper respiratory infection", "type 2 diabetes mellitus",
+        "essential hypertension", "chest pain", "J06", "R50.9", "urinary tract infection",
+        "iron deficiency anaemia", "fracture of left femur", "dengue", "cough",
+    ],
+    "procedure": [
+        "insertion", "drainage of abdomen", "excision left", "0BH", "replacement knee",
+        "inspection upper intestinal", "computerized tomography head", "bypass coronary",
+    ],
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--code-type", choices=["diagnosis", "procedure"], default="diagnosis")
+    parser.add_argument("--top-k", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=20, help="replays of the query set")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    codes, descs = load_code_lists(args.code_type)
+    t0 = time.perf_counter()
+    index = TypeaheadIndex(codes, descs)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    # Each round starts with an empty candidate cache, so every round measures the
+    # real keystroke path (first character cold, later characters reusing the
+    # previous keystroke's candidates). Round 0 also pays first-touch page faults.
+    first: list[float] = []
+    keystroke: list[float] = []
+    for round_idx in range(args.rounds):
+        index._cache.clear()
+        samples = first if round_idx == 0 else keystroke
+        for query in _QUERIES[args.code_type]:
+            for k in range(1, len(query) + 1):
+                t = time.perf_counter()
+                index.lookup(query[:k], args.top_k)
+                samples.append((time.perf_counter() - t) * 1000.0)
+
+    write_report("typeahead", {
+        "code_type": args.code_type,
+        "n_codes": len(codes),
+        "build_ms": round(build_ms, 1),
+        "first_replay": percentiles(first),
+        "keystroke": percentiles(keystroke),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
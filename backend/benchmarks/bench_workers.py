@@ -0,0 +1,135 @@
+"""
+Per-worker memory report for the copy-on-write launcher (Linux only).
+
+Starts `python -m app.serve --workers N` on a spare port, waits for it to
+answer, sends a few code-search requests so every worker touches its models,
+then reads /proc/<pid>/smaps_rollup for the parent and each worker:
+  rss_mb    : resident set size
+  pss_mb    : proportional share (shared pages divided between sharers)
+  uss_mb    : unique set size (private clean + private dirty), i.e. what the
+              worker would free if it exited
+It also reports the total footprint and a naive N x parent-RSS estimate of
+what N independent `uvicorn --workers` processes would take.
+
+    python benchmarks/bench_workers.py --workers 4 --out results/workers.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import BACKEND_DIR, write_report
+
+_QUERIES = ["fever", "chest pain", "fracture of femur", "appendectomy", "diabetes"]
+
+
+def _smaps(pid: int) -> dict[str, float]:
+    fields: dict[str, int] = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        fields[name] = int(value.split()[0])  # kB
+    mb = lambda kb: round(kb / 1024.0, 1)  # noqa: E731
+    return {
+        "rss_mb": mb(fields.get("Rss", 0)),
+        "pss_mb": mb(fields.get("Pss", 0)),
+        "uss_mb": mb(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+        "shared_mb": mb(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)),
+    }
+
+
+def _children(pid: int) -> list[int]:
+    kids = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        text = (task / "children").read_text().split()
+        kids.extend(int(k) for k in text)
+    return kids
+
+
+def _get(url: str, timeout: float = 5.0) -> bytes:
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return resp.read()
+
+
+def _post(url: str, body: dict, timeout: float = 60.0) -> bytes:
+    req = urllib.request.Request(
+        url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8013)
+    parser.add_argument("--startup-timeout", type=float, default=900.0)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        raise SystemExit("needs Linux /proc/<pid>/smaps_rollup")
+
+    base = f"http://127.0.0.1:{args.port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(args.workers),
+         "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "SHARED_CODE_INDEX": "true"},  # app.serve only forks on the mmap index
+    )
+    try:
+        deadline = time.monotonic() + args.startup_timeout
+        while True:
+            if proc.poll() is not None:
+                raise SystemExit(f"launcher exited with {proc.returncode}")
+            try:
+                _get(base + "/")
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise SystemExit("launcher did not come up in time")
+                time.sleep(1.0)
+
+        # Fresh connections spread over the workers via the shared listen socket
+        for i in range(args.requests):
+            _post(base + "/api/ehr/code-search", {
+                "query": _QUERIES[i % len(_QUERIES)],
+                "code_type": "procedure" if i % 2 else "diagnosis",
+                "top_k": 10,
+            })
+
+        workers = _children(proc.pid)
+        if len(workers) != args.workers:
+            raise SystemExit(f"expected {args.workers} workers, found {len(workers)}")
+        parent = _smaps(proc.pid)
+        per_worker = {str(pid): _smaps(pid) for pid in workers}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    uss = [w["uss_mb"] for w in per_worker.values()]
+    results = {
+        "workers": args.workers,
+        "parent": parent,
+        "per_worker": per_worker,
+        "worker_uss_mb_max": max(uss),
+        "worker_uss_mb_mean": round(sum(uss) / len(uss), 1),
+        "total_pss_mb": round(parent["pss_mb"] + sum(w["pss_mb"] for w in per_worker.values()), 1),
+        "independent_processes_estimate_mb": round(parent["rss_mb"] * args.workers, 1),
+    }
+    write_report("workers", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
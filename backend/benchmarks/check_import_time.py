@@ -0,0 +1,99 @@
+"""
+Start-up regression check: `import app.main` must stay cheap.
+
+Imports app.main in several fresh interpreters and fails (exit status 1) when
+  - the median import time exceeds the budget (--budget, or the
+    IMPORT_TIME_BUDGET_S env var; default 1.5 s), or
+  - a heavy dependency is loaded at import time instead of on first use
+    (Gemini SDK, torch, sentence-transformers, ChromaDB, spaCy, scikit-learn,
+    websockets) — these belong in the lifespan warm-up or in the handlers.
+Importing must also not touch Postgres; the DB is initialised in the lifespan.
+The slowest imports (cumulative, from `python -X importtime`) are listed to
+show where a regression came from.
+
+    python benchmarks/check_import_time.py --out results/import_time.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import BACKEND_DIR, write_report
+
+_HEAVY_MODULES = (
+    "google.genai", "torch", "sentence_transformers", "chromadb", "spacy", "sklearn", "websockets",
+)
+_CHILD = (
+    "import json, sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "import app.main\n"
+    "elapsed = time.perf_counter() - t0\n"
+    "print(json.dumps({'import_s': elapsed, 'heavy': [m for m in %r if m in sys.modules]}))\n"
+) % (_HEAVY_MODULES,)
+
+
+def _run_child(importtime: bool) -> tuple[dict, str]:
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", _CHILD]
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=os.environ, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"`import app.main` failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def _slowest(importtime_log: str, n: int) -> list[dict]:
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append({"module": name.strip(), "cumulative_ms": round(int(cumulative_us) / 1000.0, 1)})
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:n]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_S", "1.5")))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    samples = []
+    heavy: set[str] = set()
+    for _ in range(args.runs):
+        result, _ = _run_child(importtime=False)
+        samples.append(result["import_s"])
+        heavy.update(result["heavy"])
+    _, log = _run_child(importtime=True)
+
+    median_s = statistics.median(samples)
+    failures = []
+    if median_s > args.budget:
+        failures.append(f"median import time {median_s:.3f}s exceeds budget {args.budget:.3f}s")
+    if heavy:
+        failures.append(f"heavy modules loaded at import: {sorted(heavy)}")
+
+    results = {
+        "budget_s": args.budget,
+        "runs": args.runs,
+        "median_s": round(median_s, 3),
+        "min_s": round(min(samples), 3),
+        "max_s": round(max(samples), 3),
+        "heavy_modules_loaded": sorted(heavy),
+        "slowest_imports": _slowest(log, 15),
+        "passed": not failures,
+    }
+    write_report("import_time", results, args.out)
+    if failures:
+        print("FAIL: " + "; ".join(failures), file=sys.stderr)
+        raise SystemExit(1)
+    print(f"OK: import app.main {median_s:.3f}s (budget {args.budget:.3f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Recall / latency trade-off of PCA-reduced code embeddings (EMBEDDING_DIM).
+
+For ICD-10-CM and ICD-10-PCS, fits the same projection the shared index
+would (shared_index.fit_projection) at each requested dimension and compares
+the reduced index with the full-dimension one on queries from the synthetic
+OPD corpus: whole encounter texts and procedure texts (semantic tier), single
+symptoms (entity lookups) and code-browser search terms. Reports per dim:
+  recall@5 / recall@10 : overlap with the full-dimension top-5 / top-10
+  latency              : EmbeddingMatrix.nearest() p50/p95/p99 per query
+  index_mb             : size of the embedding matrix
+  variance_kept        : share of embedding variance the projection keeps
+
+Needs the full embedding matrices on disk (start the backend or run
+`python -m app.build_indexes` once) and runs offline.
+
+    python benchmarks/eval_reduced_dim.py --dims 128 192 --out results/reduced_dim.json
+"""
+from __future__ import annotations
+
+import argparse
+import os
+
+import _common  # noqa: F401  (sets up sys.path)
+from _common import percentiles, time_calls, write_report
+from _corpus import synthetic_encounters
+
+_OFFLINE_ENV = {"HF_HUB_OFFLINE": "1", "TRANSFORMERS_OFFLINE": "1"}
+
+
+def _queries(n_encounters: int, seed: int) -> dict[str, list[str]]:
+    encounters = synthetic_encounters(n_encounters, seed)
+    return {
+        "icd": [e.text() for e in encounters]
+        + sorted({s for e in encounters for s in e.symptoms})
+        + sorted({e.search_query for e in encounters}),
+        "pcs": [e.procedure_text for e in encounters] + sorted({e.search_query for e in encounters}),
+    }
+
+
+def _evaluate(full, query_embs, dims: list[int], k_max: int, repeat: int) -> dict:
+    import numpy as np
+    from app.services.shared_index import EmbeddingMatrix, _normalise, fit_projection
+
+    truth = [[i for i, _ in full.nearest(q, k_max)] for q in query_embs]
+    probe = query_embs[: min(len(query_embs), 50)]
+
+    def latency(matrix) -> dict:
+        samples = []
+        for q in probe:
+            samples.extend(time_calls(lambda: matrix.nearest(q, k_max), repeat=repeat, warmup=1))
+        return percentiles(samples)
+
+    rows = [{
+        "dim": full.dim, "recall@5": 1.0, "recall@10": 1.0,
+        "latency": latency(full), "index_mb": round(full.nbytes / 2**20, 1), "variance_kept": 1.0,
+    }]
+    source = np.asarray(full.rows(0, len(full)), dtype=np.float32)
+    for dim in dims:
+        mean, components, kept = fit_projection(source, dim)
+        reduced = EmbeddingMatrix(
+            _normalise((source - mean) @ components).astype(np.float32), (mean, components)
+        )
+        got = [[i for i, _ in reduced.nearest(q, k_max)] for q in query_embs]
+        recall = {
+            f"recall@{k}": round(float(np.mean([len(set(g[:k]) & set(t[:k])) / k for g, t in zip(got, truth)])), 4)
+            for k in (5, 10)
+        }
+        rows.append({
+            "dim": dim, **recall, "latency": latency(reduced),
+            "index_mb": round(reduced.nbytes / 2**20, 1), "variance_kept": round(kept, 4),
+        })
+    return {"queries": len(query_embs), "results": rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 192])
+    parser.add_argument("--encounters", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--repeat", type=int, default=5, help="timed nearest() calls per probe query")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    os.environ.update(_OFFLINE_ENV)
+    from app.services.icd_coding_service import _CM_TABLE_DIR
+    from app.services.procedure_coding_service import _PCS_TABLE_DIR
+    from app.services.shared_embedder import embedding_model_key, get_embedder
+    from app.services.shared_index import EmbeddingMatrix
+
+    model_key = embedding_model_key()
+    queries = _queries(args.encounters, args.seed)
+    results = {"config": {"model": model_key, "dims": args.dims, "encounters": args.encounters, "seed": args.seed}}
+    for name, table_dir in (("icd", _CM_TABLE_DIR), ("pcs", _PCS_TABLE_DIR)):
+        if not EmbeddingMatrix.exists(table_dir, model_key):
+            raise SystemExit(f"No {model_key} embedding matrix in {table_dir}; run `python -m app.build_indexes` first.")
+        query_embs = get_embedder().encode(queries[name], batch_size=128, show_progress_bar=False)
+        results[name] = _evaluate(EmbeddingMatrix.load(table_dir), query_embs, args.dims, 10, args.repeat)
+    write_report("reduced_dim", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
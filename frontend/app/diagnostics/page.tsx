@@ -1,6 +1,6 @@
 "use client";
 
-import { useEffect, useState, useCallback, Suspense } from 'react';
+import { useEffect, useState, useCallback, useRef, Suspense } from 'react';
 import { useSearchParams } from 'next/navigation';
 import { motion, AnimatePresence } from 'framer-motion';
 import {
@@ -132,6 +132,7 @@ function DiagnosticsInner() {
     const [searchResults, setSearchResults] = useState<CodeEntry[]>([]);
     const [searchLoading, setSearchLoading] = useState(false);
     const [searchDebounce, setSearchDebounce] = useState<ReturnType<typeof setTimeout> | null>(null);
+    const searchSeq = useRef(0);
 
     // Audit state
     const [patients, setPatients] = useState<Patient[]>([]);
@@ -165,28 +166,31 @@ function DiagnosticsInner() {
         }
     }, [initialPatientId]);
 
-    // ── Code browser search (debounced) ──
-    const doSearch = useCallback(async (q: string, type: string) => {
-        if (!q.trim()) { setSearchResults([]); return; }
-        setSearchLoading(true);
+    // ── Code browser search: prefix typeahead per keystroke, settled query after debounce ──
+    const doSearch = useCallback(async (q: string, type: string, settled: boolean) => {
+        const seq = ++searchSeq.current;
+        if (!q.trim()) { setSearchResults([]); setSearchLoading(false); return; }
+        if (settled) setSearchLoading(true);
         try {
-            const res = await fetch(`${API_BASE}/code-search`, {
+            const res = await fetch(`${API_BASE}/code-search/typeahead`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ query: q, code_type: type, top_k: 12 }),
+                body: JSON.stringify({ query: q, code_type: type, top_k: 12, settled }),
             });
             const data = await res.json();
-            setSearchResults(data.results ?? []);
+            // Drop responses that arrive after a newer keystroke was sent
+            if (seq === searchSeq.current) setSearchResults(data.results ?? []);
         } catch (e) {
             console.error(e);
         } finally {
-            setSearchLoading(false);
+            if (seq === searchSeq.current) setSearchLoading(false);
         }
     }, []);
 
     useEffect(() => {
         if (searchDebounce) clearTimeout(searchDebounce);
-        const t = setTimeout(() => doSearch(searchQuery, codeType), 320);
+        doSearch(searchQuery, codeType, false);
+        const t = setTimeout(() => doSearch(searchQuery, codeType, true), 320);
         setSearchDebounce(t);
         return () => clearTimeout(t);
     }, [searchQuery, codeType]);
@@ -183,20 +183,12 @@ export default function Home() {
         }
     }, []);
 
-    const { isConnected, connect, disconnect, sendMessage } = useSocket(handleMessage);
+    const { isConnected, connect, disconnect, sendAudio } = useSocket(handleMessage);
 
-    const onAudioChunk = useCallback((base64Audio: string) => {
+    const onAudioChunk = useCallback((pcm: ArrayBuffer) => {
         if (!isConnected) return;
-
-        sendMessage({
-            realtimeInput: {
-                mediaChunks: [{
-                    mimeType: 'audio/pcm',
-                    data: base64Audio
-                }]
-            }
-        });
-    }, [isConnected, sendMessage]);
+        sendAudio(pcm);
+    }, [isConnected, sendAudio]);
 
     const { isRecording, startRecording, stopRecording, getAudioDevices } = useAudioStream(onAudioChunk);
 
@@ -218,8 +210,9 @@ export default function Home() {
 
     const handleStart = () => connect();
 
-    const handleStop = () => {
-        stopRecording();
+    const handleStop = async () => {
+        // Flush the last partial audio frame before the socket closes
+        await stopRecording();
         disconnect();
     };
 
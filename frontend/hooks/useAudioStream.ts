@@ -1,6 +1,15 @@
 import { useState, useRef, useCallback } from 'react';
 
-export const useAudioStream = (onAudioChunk: (data: string) => void) => {
+const SAMPLE_RATE = 16000;
+// Audio is sent in frames of this length (ms): fewer, larger WebSocket messages,
+// while adding at most one frame of delay before the server sees end of speech.
+export const DEFAULT_AUDIO_FRAME_MS = 64;
+const MIN_AUDIO_FRAME_MS = 40;
+const MAX_AUDIO_FRAME_MS = 100;
+// How long stopRecording waits for the worklet to post its partly filled frame
+const FLUSH_TIMEOUT_MS = 250;
+
+export const useAudioStream = (onAudioChunk: (pcm: ArrayBuffer) => void, frameMs: number = DEFAULT_AUDIO_FRAME_MS) => {
     const [isRecording, setIsRecording] = useState(false);
     const audioContextRef = useRef<AudioContext | null>(null);
     const workletNodeRef = useRef<AudioWorkletNode | null>(null);
@@ -21,7 +30,7 @@ export const useAudioStream = (onAudioChunk: (data: string) => void) => {
     const startRecording = useCallback(async (deviceId?: string) => {
         try {
             // 1. Init AudioContext at 16kHz to match Gemini requirement
-            const audioContext = new AudioContext({ sampleRate: 16000 });
+            const audioContext = new AudioContext({ sampleRate: SAMPLE_RATE });
             audioContextRef.current = audioContext;
 
             // 2. Load the Worklet
@@ -31,7 +40,7 @@ export const useAudioStream = (onAudioChunk: (data: string) => void) => {
             const constraints: MediaStreamConstraints = {
                 audio: {
                     channelCount: 1,
-                    sampleRate: 16000,
+                    sampleRate: SAMPLE_RATE,
                     deviceId: deviceId ? { exact: deviceId } : undefined
                 },
             };
@@ -41,14 +50,15 @@ export const useAudioStream = (onAudioChunk: (data: string) => void) => {
 
             // 4. Create Source & Worklet Node
             const source = audioContext.createMediaStreamSource(stream);
-            const workletNode = new AudioWorkletNode(audioContext, 'pcm-processor'); // Must match name in public/worklet.js
+            const clampedMs = Math.min(MAX_AUDIO_FRAME_MS, Math.max(MIN_AUDIO_FRAME_MS, frameMs));
+            const workletNode = new AudioWorkletNode(audioContext, 'pcm-processor', { // Must match name in public/worklet.js
+                processorOptions: { frameSamples: Math.round(SAMPLE_RATE * clampedMs / 1000) }
+            });
 
             // 5. Handle Data from Worklet
             workletNode.port.onmessage = (event) => {
-                const int16Data = event.data; // ArrayBuffer from worklet
-                // Convert to Base64 to send over WebSocket
-                const base64String = arrayBufferToBase64(int16Data);
-                onAudioChunk(base64String);
+                // ArrayBuffer of Int16 PCM from the worklet, sent as-is (useSocket.sendAudio)
+                if (event.data instanceof ArrayBuffer) onAudioChunk(event.data);
             };
 
             // 6. Connect Graph
@@ -61,13 +71,30 @@ export const useAudioStream = (onAudioChunk: (data: string) => void) => {
         } catch (error) {
             console.error("Error starting audio stream:", error);
         }
-    }, [onAudioChunk]);
+    }, [onAudioChunk, frameMs]);
 
-    const stopRecording = useCallback(() => {
+    const stopRecording = useCallback(async () => {
         if (streamRef.current) {
             streamRef.current.getTracks().forEach(track => track.stop());
             streamRef.current = null;
         }
+        // Send the partly filled last frame (up to one frame of speech) before tearing down
+        const node = workletNodeRef.current;
+        if (node) {
+            await new Promise<void>((resolve) => {
+                const done = () => {
+                    clearTimeout(timer);
+                    node.port.removeEventListener('message', onFlushed);
+                    resolve();
+                };
+                const onFlushed = (event: MessageEvent) => {
+                    if (event.data?.type === 'flushed') done();
+                };
+                const timer = setTimeout(done, FLUSH_TIMEOUT_MS);
+                node.port.addEventListener('message', onFlushed);
+                node.port.postMessage({ type: 'flush' });
+            });
+        }
         if (audioContextRef.current) {
             audioContextRef.current.close();
             audioContextRef.current = null;
@@ -82,13 +109,3 @@ export const useAudioStream = (onAudioChunk: (data: string) => void) => {
     return { isRecording, startRecording, stopRecording, getAudioDevices };
 };
 
-// Helper: Fast ArrayBuffer to Base64
-function arrayBufferToBase64(buffer: ArrayBuffer) {
-    let binary = '';
-    const bytes = new Uint8Array(buffer);
-    const len = bytes.byteLength;
-    for (let i = 0; i < len; i++) {
-        binary += String.fromCharCode(bytes[i]);
-    }
-    return window.btoa(binary);
-}
@@ -1,18 +1,25 @@
 import { useState, useRef, useCallback, useEffect } from 'react';
 
 const WS_URL = 'ws://localhost:8003/ws/live-consultation';
+// Offered on connect; if the backend selects it, mic audio goes out as raw PCM16
+// binary frames instead of base64 inside JSON (see backend audio_transport.py).
+// Browsers fail the handshake when an offered subprotocol is not selected, so a
+// backend without binary audio is reached by reconnecting once without the offer.
+const AUDIO_SUBPROTOCOL = 'ruralmed.pcm16.v1';
 
 export const useSocket = (onMessageReceived: (data: any) => void) => {
     const [isConnected, setIsConnected] = useState(false);
     const socketRef = useRef<WebSocket | null>(null);
 
-    const connect = useCallback(() => {
+    const connect = useCallback((offerBinary: boolean = true) => {
         if (socketRef.current?.readyState === WebSocket.OPEN) return;
 
-        const ws = new WebSocket(WS_URL);
+        const ws = offerBinary ? new WebSocket(WS_URL, [AUDIO_SUBPROTOCOL]) : new WebSocket(WS_URL);
+        let opened = false;
 
         ws.onopen = () => {
-            console.log('✅ Connected to backend');
+            opened = true;
+            console.log(`✅ Connected to backend (audio: ${ws.protocol === AUDIO_SUBPROTOCOL ? 'binary' : 'json'})`);
             setIsConnected(true);
         };
 
@@ -26,6 +33,13 @@ export const useSocket = (onMessageReceived: (data: any) => void) => {
         };
 
         ws.onclose = () => {
+            if (!opened && offerBinary && socketRef.current === ws) {
+                // Handshake rejected: likely a backend that does not select the subprotocol
+                console.log('Binary audio handshake failed, retrying with JSON audio');
+                socketRef.current = null;
+                connect(false);
+                return;
+            }
             console.log('❌ Disconnected from backend');
             setIsConnected(false);
         };
@@ -46,6 +60,24 @@ export const useSocket = (onMessageReceived: (data: any) => void) => {
         }
     }, []);
 
+    const sendAudio = useCallback((pcm: ArrayBuffer) => {
+        const ws = socketRef.current;
+        if (ws?.readyState !== WebSocket.OPEN) return;
+        if (ws.protocol === AUDIO_SUBPROTOCOL) {
+            ws.send(pcm);
+            return;
+        }
+        // JSON fallback for backends without binary audio
+        ws.send(JSON.stringify({
+            realtimeInput: {
+                mediaChunks: [{
+                    mimeType: 'audio/pcm',
+                    data: arrayBufferToBase64(pcm)
+                }]
+            }
+        }));
+    }, []);
+
     // Cleanup on unmount
     useEffect(() => {
         return () => {
@@ -53,5 +85,16 @@ export const useSocket = (onMessageReceived: (data: any) => void) => {
         }
     }, [])
 
-    return { isConnected, connect, disconnect, sendMessage };
+    return { isConnected, connect, disconnect, sendMessage, sendAudio };
 };
+
+// Helper: Fast ArrayBuffer to Base64
+function arrayBufferToBase64(buffer: ArrayBuffer) {
+    let binary = '';
+    const bytes = new Uint8Array(buffer);
+    const len = bytes.byteLength;
+    for (let i = 0; i < len; i++) {
+        binary += String.fromCharCode(bytes[i]);
+    }
+    return window.btoa(binary);
+}
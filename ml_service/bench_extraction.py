@@ -0,0 +1,133 @@
+"""
+Latency (time to first field, total) and generated tokens of Qwen extraction
+against a running llama-server (LLAMA_URL, started by start_ml.sh).
+
+Runs the same clinic-style transcript chunks, with growing extracted state as
+in a consultation, through these client setups:
+  fresh         : new httpx client per call, full non-streamed completion (the old path)
+  pooled        : the shared LlamaClient, full non-streamed completion
+  streamed      : the shared LlamaClient, streamed, fields parsed as they close
+  streamed-free : as streamed, without the GBNF grammar (free-form JSON)
+  session       : as streamed, through a per-consultation ExtractionSession
+                  (append-only conversation pinned to one slot)
+and reports p50/p95 of time to the first field, total time per extraction
+(utterance), tokens generated and prompt tokens prefilled vs served from the
+KV cache per utterance (streamed modes, from llama-server's timings) and the
+fields extracted.
+
+    python bench_extraction.py --rounds 5 --out results/extraction.json
+    python bench_extraction.py --modes streamed streamed-free   # grammar vs free-form
+    python bench_extraction.py --modes streamed session          # prompt cache reuse
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+
+import extraction
+from extraction import LLAMA_URL, LlamaClient, run_qwen_extraction, stream_qwen_extraction
+
+TRANSCRIPTS = [
+    "My name is Ramesh Kumar, I am 45 years old and I work as a farmer in Sitapur.",
+    "For the last three days I have had high fever with chills and a bad headache.",
+    "He also says there is body ache and he vomited twice since yesterday.",
+    "Temperature is 101.8, pulse 104, blood pressure 118 by 76, oxygen saturation 97 percent.",
+    "No known allergies. He takes metformin 500 twice a day for diabetes for five years.",
+    "His father had tuberculosis. They live in a kutcha house and have a BPL ration card.",
+    "It looks like malaria, we will do a rapid test and start him on paracetamol for now.",
+    "She is a 28 year old woman with burning urination and lower abdominal pain for two days.",
+]
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {"p50": round(statistics.median(ordered), 1), "p95": round(pick(0.95), 1), "n": len(ordered)}
+
+
+async def _run_mode(mode: str, llama: LlamaClient, rounds: int) -> dict:
+    first_ms, total_ms, tokens, prefilled, cached, fields = [], [], [], [], [], 0
+    extraction.QWEN_GRAMMAR = mode != "streamed-free"
+    for _ in range(rounds):
+        state: dict = {}
+        session = llama.open_session() if mode == "session" else None
+        for transcript in TRANSCRIPTS:
+            t0 = time.perf_counter()
+            first = None
+            if mode.startswith("streamed") or mode == "session":
+                data, stats = {}, {}
+                async for field, value in stream_qwen_extraction(llama, transcript, dict(state), stats, session):
+                    if first is None:
+                        first = time.perf_counter()
+                    data[field] = value
+                if "predicted_n" in stats:
+                    tokens.append(float(stats["predicted_n"]))
+                    prefilled.append(float(stats.get("prompt_n", 0)))
+                    cached.append(float(stats["tokens_evaluated"] - stats.get("prompt_n", 0)))
+            else:
+                client = LlamaClient(max_connections=1) if mode == "fresh" else llama
+                try:
+                    data = await run_qwen_extraction(client, transcript, dict(state), stream=False)
+                finally:
+                    if mode == "fresh":
+                        await client.aclose()
+                first = time.perf_counter() if data else None
+            end = time.perf_counter()
+            total_ms.append((end - t0) * 1000.0)
+            if first is not None:
+                first_ms.append((first - t0) * 1000.0)
+            fields += len(data)
+            state.update(data)
+        if session is not None:
+            llama.close_session(session)
+    return {
+        "first_field_ms": _percentiles(first_ms),
+        "total_ms": _percentiles(total_ms),
+        "tokens_generated": _percentiles(tokens),
+        "prompt_tokens_prefilled": _percentiles(prefilled),
+        "prompt_tokens_cached": _percentiles(cached),
+        "fields_per_round": fields / rounds,
+    }
+
+
+async def _main(args) -> dict:
+    llama = LlamaClient()
+    try:
+        # Warm the server's prompt cache and the pool once
+        await run_qwen_extraction(llama, TRANSCRIPTS[0], {}, stream=False)
+        return {
+            "config": {
+                "llama_url": LLAMA_URL, "rounds": args.rounds, "transcripts": len(TRANSCRIPTS),
+                "max_tokens": extraction.QWEN_MAX_TOKENS,
+            },
+            "results": {mode: await _run_mode(mode, llama, args.rounds) for mode in args.modes},
+        }
+    finally:
+        await llama.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["fresh", "pooled", "streamed", "streamed-free", "session"],
+                        choices=["fresh", "pooled", "streamed", "streamed-free", "session"])
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(_main(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
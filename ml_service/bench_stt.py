@@ -0,0 +1,163 @@
+"""
+Latency and real-time factor of the STT engines (stt.py) on recorded clinic
+audio: a directory of 16 kHz mono 16-bit WAV utterances, each optionally with
+a reference transcript in a `.txt` file of the same name for word error rate.
+
+For each backend it reports p50/p95 latency per utterance and RTF (latency /
+audio duration) in two runs:
+  sequential : one utterance at a time, as a single session sees it
+  batched    : --sessions concurrent callers through one STTBatcher, as
+               several consultations on one ML node (the local engine decodes
+               up to STT_BATCH_SIZE of them per call)
+plus the WER against the references, if any.
+
+    python bench_stt.py recordings/ --backends groq faster-whisper --out results/stt.json
+    STT_MODEL=base.en python bench_stt.py recordings/ --backends faster-whisper --sessions 8
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import statistics
+import time
+import wave
+
+import numpy as np
+
+import stt
+from stt import SAMPLE_RATE, STTBatcher, create_stt_engine
+
+
+def load_clips(directory: str) -> list[dict]:
+    clips = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with wave.open(path, "rb") as wf:
+            if wf.getframerate() != SAMPLE_RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected {SAMPLE_RATE} Hz mono 16-bit PCM")
+            pcm = wf.readframes(wf.getnframes())
+        reference = None
+        txt = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(txt):
+            with open(txt, encoding="utf-8") as f:
+                reference = f.read().strip()
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        clips.append({"name": os.path.basename(path), "audio": audio, "reference": reference})
+    if not clips:
+        raise SystemExit(f"No .wav files in {directory}")
+    return clips
+
+
+def _words(text: str) -> list[str]:
+    return re.sub(r"[^a-z0-9\s']", " ", text.lower()).split()
+
+
+def word_error_rate(references: list[str], hypotheses: list[str]) -> float:
+    errors = total = 0
+    for ref, hyp in zip(references, hypotheses):
+        r, h = _words(ref), _words(hyp)
+        row = list(range(len(h) + 1))
+        for i in range(1, len(r) + 1):
+            prev, row[0] = row[0], i
+            for j in range(1, len(h) + 1):
+                prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r[i - 1] != h[j - 1]))
+        errors += row[len(h)]
+        total += len(r)
+    return round(errors / total, 4) if total else 0.0
+
+
+def _percentiles(values: list[float], digits: int = 1) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {"p50": round(statistics.median(ordered), digits), "p95": round(pick(0.95), digits), "n": len(ordered)}
+
+
+def _summary(clips: list[dict], latencies: list[float], texts: list[str], wall: float) -> dict:
+    seconds = [len(c["audio"]) / SAMPLE_RATE for c in clips]
+    scored = [(c["reference"], t) for c, t in zip(clips, texts) if c["reference"] is not None]
+    return {
+        "latency_ms": _percentiles([l * 1000.0 for l in latencies]),
+        "rtf": _percentiles([l / s for l, s in zip(latencies, seconds) if s], digits=3),
+        "audio_seconds_per_wall_second": round(sum(seconds) / wall, 2) if wall else None,
+        "wer": word_error_rate(*zip(*scored)) if scored else None,
+    }
+
+
+def run_sequential(engine, clips: list[dict], rounds: int) -> dict:
+    latencies, texts = [], []
+    t_wall = time.perf_counter()
+    for _ in range(rounds):
+        texts = []
+        for clip in clips:
+            t0 = time.perf_counter()
+            texts.append(engine.transcribe_batch([clip["audio"]])[0])
+            latencies.append(time.perf_counter() - t0)
+    return _summary(clips * rounds, latencies, texts * rounds, time.perf_counter() - t_wall)
+
+
+async def run_batched(engine, clips: list[dict], rounds: int, sessions: int) -> dict:
+    batcher = STTBatcher(engine)
+    batcher.start()
+    work = [clip for _ in range(rounds) for clip in clips]
+    latencies: list = [0.0] * len(work)
+    texts: list = [""] * len(work)
+
+    async def session(k: int) -> None:
+        # Each session transcribes its own share of the clips, one after another
+        for i in range(k, len(work), sessions):
+            t0 = time.perf_counter()
+            texts[i] = await batcher.transcribe(work[i]["audio"])
+            latencies[i] = time.perf_counter() - t0
+
+    try:
+        t_wall = time.perf_counter()
+        await asyncio.gather(*(session(k) for k in range(sessions)))
+        wall = time.perf_counter() - t_wall
+    finally:
+        await batcher.stop()
+    return _summary(work, latencies, texts, wall)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_dir")
+    parser.add_argument("--backends", nargs="+", default=["groq", "faster-whisper"],
+                        choices=["groq", "faster-whisper"])
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    clips = load_clips(args.audio_dir)
+    report = {
+        "config": {
+            "clips": len(clips), "audio_seconds": round(sum(len(c["audio"]) for c in clips) / SAMPLE_RATE, 1),
+            "rounds": args.rounds, "sessions": args.sessions, "model": stt.STT_MODEL,
+            "compute_type": stt.STT_COMPUTE_TYPE, "cpu_threads": stt.STT_CPU_THREADS,
+            "batch_size": stt.STT_BATCH_SIZE, "batch_window_ms": stt.STT_BATCH_WINDOW_MS,
+        },
+        "results": {},
+    }
+    for backend in args.backends:
+        engine = create_stt_engine(backend)
+        engine.transcribe_batch([clips[0]["audio"]])  # warm-up (model pages, connection)
+        report["results"][backend] = {
+            "sequential": run_sequential(engine, clips, args.rounds),
+            "batched": asyncio.run(run_batched(engine, clips, args.rounds, args.sessions)),
+        }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
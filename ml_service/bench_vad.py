@@ -0,0 +1,150 @@
+"""
+Throughput of the ML node's VAD (vad.VADEngine) against the previous
+per-message receiver loop, on synthetic speech-like audio (voiced bursts with
+pauses over a low noise floor).
+
+For each message size it streams the same audio through both and reports
+frames/sec (analysis frames of VAD_FRAME_SAMPLES) and the real-time factor,
+and checks that both produce the same utterance boundaries. The legacy loop
+treats every message as one frame, so it only runs where the message size
+equals the frame size; larger (aggregated) messages are checked against the
+engine's own boundaries at that size.
+
+    python bench_vad.py --seconds 600 --message-samples 128 640 1024 1600
+"""
+import argparse
+import logging
+import time
+from collections import deque
+
+import numpy as np
+
+import vad
+from vad import SAMPLE_RATE, VAD_FRAME_SAMPLES, VADEngine
+
+
+def synthetic_audio(seconds: float, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0.0, 0.002, n).astype(np.float32)
+    t = 0
+    while t < n:
+        t += int(rng.uniform(0.4, 2.5) * SAMPLE_RATE)           # pause
+        length = int(rng.uniform(0.3, 6.0) * SAMPLE_RATE)       # burst
+        end = min(n, t + length)
+        ts = np.arange(end - t) / SAMPLE_RATE
+        f0 = rng.uniform(110, 240)
+        voiced = sum(np.sin(2 * np.pi * f0 * h * ts) / h for h in (1, 2, 3))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 5) * ts)
+        audio[t:end] += (0.08 * envelope * voiced).astype(np.float32)
+        t = end
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+def legacy_receiver(messages: list[bytes]) -> list[int]:
+    """The receiver loop before VADEngine: one frame per message, deque pre-roll, list of chunks."""
+    speech_active = False
+    silence_frames = 0
+    speech_chunks: list[np.ndarray] = []
+    speech_samples = 0
+    pre_roll: deque = deque(maxlen=max(0, vad.VAD_PRE_ROLL_FRAMES))
+    noise_floor_rms = vad.VAD_MIN_RMS
+    out = []
+
+    def frame_rms(frame):
+        return float(np.sqrt(np.mean(frame * frame)))
+
+    for pcm_bytes in messages:
+        raw_chunk = np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+        pre_roll.append(raw_chunk)
+        centered = raw_chunk - float(np.mean(raw_chunk))
+        gate = max(vad.VAD_MIN_RMS * 0.5, noise_floor_rms * vad.VAD_NOISE_GATE_RATIO)
+        vad_chunk = centered * 0.2 if frame_rms(centered) <= gate else centered
+        rms = frame_rms(vad_chunk)
+        signs = np.signbit(vad_chunk)
+        zcr = float(np.mean(signs[1:] != signs[:-1]))
+        start_threshold = max(vad.VAD_MIN_RMS, noise_floor_rms * vad.VAD_START_RATIO)
+        continue_threshold = max(vad.VAD_MIN_RMS * 0.8, noise_floor_rms * vad.VAD_CONTINUE_RATIO)
+        if not speech_active:
+            noise_floor_rms = vad.VAD_NOISE_ALPHA * noise_floor_rms + (1.0 - vad.VAD_NOISE_ALPHA) * rms
+            if rms >= start_threshold and zcr <= vad.VAD_MAX_ZCR:
+                speech_active = True
+                silence_frames = 0
+                speech_chunks = list(pre_roll)
+                speech_samples = sum(len(x) for x in speech_chunks)
+                pre_roll.clear()
+            continue
+        speech_chunks.append(raw_chunk)
+        speech_samples += len(raw_chunk)
+        if rms >= continue_threshold and zcr <= vad.VAD_MAX_ZCR:
+            silence_frames = 0
+        else:
+            silence_frames += 1
+        if (
+            (silence_frames >= vad.VAD_HANGOVER_FRAMES and speech_samples >= vad.MIN_SPEECH_SAMPLES)
+            or speech_samples >= vad.MAX_SPEECH_SAMPLES
+            or silence_frames >= vad.VAD_MAX_SILENCE_FRAMES
+        ):
+            if speech_chunks and speech_samples >= max(2000, vad.MIN_SPEECH_SAMPLES // 4):
+                out.append(len(np.concatenate(speech_chunks)))
+            speech_active = False
+            silence_frames = 0
+            speech_chunks = []
+            speech_samples = 0
+    return out
+
+
+def engine_receiver(messages: list[bytes]) -> list[int]:
+    engine = VADEngine()
+    out = []
+    for pcm_bytes in messages:
+        out.extend(len(u) for u in engine.feed(pcm_bytes))
+    return out
+
+
+def _timed(fn, messages: list[bytes], repeat: int) -> tuple[float, list[int]]:
+    best = float("inf")
+    result: list[int] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(messages)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=300.0)
+    parser.add_argument("--message-samples", type=int, nargs="+", default=[128, 640, 1024, 1600])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.getLogger("ML_Service").setLevel(logging.WARNING)
+    pcm = synthetic_audio(args.seconds, args.seed)
+    n_frames = len(pcm) // 2 // VAD_FRAME_SAMPLES
+    print(f"{args.seconds:.0f}s of audio, {n_frames} frames of {VAD_FRAME_SAMPLES} samples")
+    print(f"{'message':>8} {'impl':>7} {'frames/s':>12} {'x realtime':>11} {'utterances':>11}")
+
+    reference = engine_receiver([pcm[i:i + VAD_FRAME_SAMPLES * 2] for i in range(0, len(pcm), VAD_FRAME_SAMPLES * 2)])
+    for size in args.message_samples:
+        step = size * 2
+        messages = [pcm[i:i + step] for i in range(0, len(pcm), step)]
+        rows = [("engine", *_timed(engine_receiver, messages, args.repeat))]
+        if size == VAD_FRAME_SAMPLES:
+            rows.insert(0, ("legacy", *_timed(legacy_receiver, messages, args.repeat)))
+        for name, elapsed, utterances in rows:
+            print(
+                f"{size:>8} {name:>7} {n_frames / elapsed:>12,.0f} "
+                f"{args.seconds / elapsed:>11,.0f} {len(utterances):>11}"
+            )
+        if size == VAD_FRAME_SAMPLES:
+            match = rows[0][2] == rows[1][2]
+            print(f"{'':>8} utterance boundaries {'match' if match else 'DIFFER'}: "
+                  f"legacy {rows[0][2][:5]}... engine {rows[1][2][:5]}...")
+        elif rows[-1][2] != reference:
+            print(f"{'':>8} utterance boundaries DIFFER from {VAD_FRAME_SAMPLES}-sample messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+"""
+Sparse field extraction from transcript chunks with Qwen on llama-server.
+
+One LlamaClient per ML node process (created in the app lifespan) keeps a
+pool of keep-alive connections to llama-server, so an extraction never pays
+for a new client or TCP handshake.
+
+Completions are streamed (`stream: true`). The assistant turn is pre-filled
+with `{`, so the generated text is the body of one JSON object;
+SparseObjectParser follows it token by token and hands back each top-level
+key/value pair as soon as its closing `,` or `}` arrives. The ML node emits
+that field to the websocket while the model is still generating the rest.
+
+Decoding is constrained by a GBNF grammar generated from FIELD_ORDER
+(QWEN_GRAMMAR): the model can only write a minified object of allowed keys,
+each at most once, with non-empty string values, so no tokens go to fences,
+prose, nulls or unknown keys. _sanitize_sparse_updates still drops
+placeholder values such as "unknown", which the grammar cannot rule out.
+"""
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+logger = logging.getLogger("ML_Service")
+
+LLAMA_URL = os.getenv("LLAMA_URL", "http://127.0.0.1:8081/completion")
+# llama-server slots (--parallel); each consultation is pinned to one of them
+LLAMA_N_PARALLEL = max(1, int(os.getenv("LLAMA_N_PARALLEL") or "1"))
+# Pooled connections to llama-server (one per concurrently streamed completion)
+LLAMA_HTTP_CONNECTIONS = int(os.getenv("LLAMA_HTTP_CONNECTIONS") or LLAMA_N_PARALLEL)
+QWEN_TEMPERATURE = float(os.getenv("QWEN_TEMPERATURE", "0.0"))
+QWEN_TOP_P = float(os.getenv("QWEN_TOP_P", "0.8"))
+QWEN_TOP_K = int(os.getenv("QWEN_TOP_K", "40"))
+QWEN_PRESENCE_PENALTY = float(os.getenv("QWEN_PRESENCE_PENALTY", "0.0"))
+QWEN_N_KEEP = int(os.getenv("QWEN_N_KEEP", "256"))
+# llama-server context (-c, as in start_ml.sh), shared by its LLAMA_N_PARALLEL slots
+LLAMA_CONTEXT_SIZE = int(os.getenv("LLAMA_CONTEXT_SIZE") or "1536")
+# The grammar leaves no room for fences, prose or repeated keys, so a sparse object needs few tokens
+QWEN_MAX_TOKENS = int(os.getenv("QWEN_MAX_TOKENS", "128"))
+# Constrain decoding with a GBNF grammar built from FIELD_ORDER (false: free-form, parsed leniently)
+QWEN_GRAMMAR = os.getenv("QWEN_GRAMMAR", "true").lower() == "true"
+
+# Extractable fields, in the order the grammar lets the model write them
+FIELD_ORDER = (
+    "name", "age", "gender", "caste_category", "ration_card_type", "income", "occupation",
+    "housing_type", "location", "chief_complaint", "symptoms", "medical_history", "family_history",
+    "allergies", "medications", "tentative_doctor_diagnosis", "initial_llm_diagnosis",
+    "vitals.temperature", "vitals.blood_pressure", "vitals.pulse", "vitals.spo2",
+)
+ALLOWED_KEYS = set(FIELD_ORDER)
+ENUM_VALUES = {"gender": ("male", "female", "other")}
+
+
+def build_sparse_object_grammar(fields: tuple = FIELD_ORDER, enums: dict = ENUM_VALUES) -> str:
+    """
+    GBNF for the rest of a sparse, minified JSON object after its pre-filled
+    `{`: any subset of `fields`, each at most once and in the given order,
+    with non-empty string values (or one of `enums[field]`), then `}`.
+
+    c<i> picks the next field from fields[i:]; t<i> optionally continues
+    with a later one after field i.
+    """
+    quote = r'"\""'
+    rules = ['root ::= c0? "}"']
+    for i, field in enumerate(fields):
+        if field in enums:
+            value = f"{quote} (" + " | ".join(f'"{v}"' for v in enums[field]) + f") {quote}"
+        else:
+            value = "str"
+        rules.append(f'f{i} ::= "\\"{field}\\":" {value}')
+        if i + 1 < len(fields):
+            rules.append(f"c{i} ::= f{i} t{i} | c{i + 1}")
+            rules.append(f't{i} ::= ("," c{i + 1})?')
+        else:
+            rules.append(f"c{i} ::= f{i}")
+    rules.append(f"str ::= {quote} char+ {quote}")
+    rules.append(
+        r'char ::= [^"\\\x7F\x00-\x1F] | "\\" (["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F])'
+    )
+    return "\n".join(rules) + "\n"
+
+
+SPARSE_OBJECT_GRAMMAR = build_sparse_object_grammar()
+
+
+def _extract_first_json_object(text: str) -> dict:
+    """Extract and parse the first balanced JSON object from model text."""
+    if not text:
+        return {}
+
+    # Remove common markdown wrappers if present
+    cleaned = text.strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned[7:]
+    if cleaned.startswith("```"):
+        cleaned = cleaned[3:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    cleaned = cleaned.strip()
+
+    start = cleaned.find("{")
+    if start == -1:
+        return {}
+
+    depth = 0
+    in_str = False
+    esc = False
+    for i, ch in enumerate(cleaned[start:], start=start):
+        if esc:
+            esc = False
+            continue
+        if ch == "\\":
+            esc = True
+            continue
+        if ch == '"':
+            in_str = not in_str
+            continue
+        if in_str:
+            continue
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                candidate = cleaned[start:i + 1]
+                return json.loads(candidate)
+
+    return {}
+
+
+def _sanitize_sparse_updates(data: dict) -> dict:
+    """Keep only allowed keys with concrete values; flatten nested vitals."""
+    if not isinstance(data, dict):
+        return {}
+
+    normalized = {}
+    for k, v in data.items():
+        if k == "vitals" and isinstance(v, dict):
+            for vk, vv in v.items():
+                dot_key = f"vitals.{vk}"
+                if dot_key in ALLOWED_KEYS:
+                    normalized[dot_key] = vv
+            continue
+        if k in ALLOWED_KEYS:
+            normalized[k] = v
+
+    sparse = {}
+    reject_literals = {
+        "null", "none", "n/a", "na", "unknown", "not mentioned", "not provided",
+        "not specified", "unspecified", "nil", "undefined", "{}", "[]", "-"
+    }
+
+    for k, v in normalized.items():
+        if v is None:
+            continue
+
+        if isinstance(v, str):
+            v = v.strip()
+            if not v or v.lower() in reject_literals:
+                continue
+
+        elif isinstance(v, list):
+            cleaned = []
+            for item in v:
+                item_s = str(item).strip()
+                if item_s and item_s.lower() not in reject_literals:
+                    cleaned.append(item_s)
+            if not cleaned:
+                continue
+            v = ", ".join(dict.fromkeys(cleaned))
+
+        elif isinstance(v, dict):
+            # Non-vitals dicts are not part of the schema.
+            continue
+
+        sparse[k] = v
+
+    return sparse
+
+
+class SparseObjectParser:
+    """
+    Incremental parser for the body of a JSON object whose opening `{` has
+    already been consumed (it is pre-filled in the prompt). feed() returns the
+    sanitized fields of every top-level pair completed by the new text.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 1
+        self.in_str = False
+        self.esc = False
+        self.done = False
+        self._pair: list[str] = []
+
+    def feed(self, text: str) -> dict:
+        fields: dict = {}
+        if self.done:
+            return fields
+        start = 0
+        for i, ch in enumerate(text):
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif ch == "\\":
+                    self.esc = True
+                elif ch == '"':
+                    self.in_str = False
+                continue
+            if ch == '"':
+                self.in_str = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+            if (self.depth == 1 and ch == ",") or self.depth == 0:
+                self._pair.append(text[start:i])
+                fields.update(self._complete_pair())
+                start = i + 1
+                if self.depth == 0:
+                    self.done = True
+                    return fields
+        self._pair.append(text[start:])
+        return fields
+
+    def close(self) -> dict:
+        """Fields of a final pair the stream ended without closing (e.g. hit n_predict)."""
+        if self.done or self.in_str or self.depth != 1:
+            return {}
+        self.done = True
+        return self._complete_pair()
+
+    def _complete_pair(self) -> dict:
+        pair = "".join(self._pair).strip()
+        self._pair = []
+        if not pair:
+            return {}
+        try:
+            return _sanitize_sparse_updates(json.loads("{" + pair + "}"))
+        except ValueError:
+            logger.info(f"Qwen stream: skipped malformed pair: {pair}")
+            return {}
+
+
+class LlamaClient:
+    """Long-lived, connection-pooled client for llama-server's /completion endpoint."""
+
+    def __init__(
+        self, url: str = LLAMA_URL, max_connections: int = LLAMA_HTTP_CONNECTIONS, n_slots: int = LLAMA_N_PARALLEL
+    ) -> None:
+        self.url = url
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._slot_sessions = [0] * n_slots
+        # Tokens one slot can hold (prompt + generation); refined from /props by load_props()
+        self.slot_ctx = LLAMA_CONTEXT_SIZE // n_slots
+
+    async def load_props(self) -> None:
+        """Take the per-slot context from llama-server's /props, if it is reachable."""
+        try:
+            resp = await self._http.get(self.url.rsplit("/", 1)[0] + "/props")
+            resp.raise_for_status()
+            n_ctx = int(resp.json()["default_generation_settings"]["n_ctx"])
+        except Exception as e:
+            logger.warning("llama-server /props unavailable (%s); slot context %d from env", e, self.slot_ctx)
+            return
+        # With a unified KV cache a slot reports the whole context, which its peers share
+        self.slot_ctx = min(n_ctx, LLAMA_CONTEXT_SIZE // len(self._slot_sessions)) if n_ctx > 0 else self.slot_ctx
+        logger.info("llama-server slot context: %d tokens", self.slot_ctx)
+
+    def open_session(self) -> "ExtractionSession":
+        """New consultation, pinned to the llama-server slot with the fewest sessions."""
+        slot = min(range(len(self._slot_sessions)), key=self._slot_sessions.__getitem__)
+        self._slot_sessions[slot] += 1
+        logger.info("Qwen session pinned to slot %d (sessions per slot: %s)", slot, self._slot_sessions)
+        return ExtractionSession(slot, self.slot_ctx)
+
+    def close_session(self, session: "ExtractionSession") -> None:
+        self._slot_sessions[session.slot_id] -= 1
+
+    async def complete(self, payload: dict) -> dict:
+        resp = await self._http.post(self.url, json={**payload, "stream": False})
+        resp.raise_for_status()
+        return resp.json()
+
+    async def complete_stream(self, payload: dict) -> AsyncIterator[dict]:
+        """Server-sent events of a streamed completion; the last one has `stop: true`."""
+        async with self._http.stream("POST", self.url, json={**payload, "stream": True}) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line.startswith("data: "):
+                    yield json.loads(line[6:])
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+# ── Qwen3.5 Extraction Prompt Setup ───────────────────────────────────────────
+QWEN_SYSTEM = (
+    "You are a strict sparse JSON extractor for medical intake. "
+    "Return a single minified JSON object using ONLY keys explicitly present in New Transcript. "
+    f"Allowed keys, in this order: {','.join(FIELD_ORDER)}. "
+    "Omit any key not present or uncertain. Never output null, empty strings, placeholders, explanations, markdown, or extra text. "
+    "If no new fields are found, output {}. "
+    "Earlier turns hold previous transcripts and the data already extracted from them "
+    "(or a Previously Extracted Data summary); use them only to avoid repeating existing values. "
+    "Gender must be one of: male,female,other."
+)
+
+
+def build_extraction_payload(transcript: str, existing_context: dict) -> dict:
+    context_str = json.dumps(existing_context, ensure_ascii=True, separators=(",", ":"), sort_keys=True) if existing_context else "{}"
+
+    # We bypass chat completions and use raw complete to inject the `{` start, bypassing <think> latencies entirely
+    prompt = f"<|im_start|>system\n{QWEN_SYSTEM}<|im_end|>\n<|im_start|>user\nPreviously Extracted Data:\n{context_str}\n\nNew Transcript to Process:\n{transcript.strip()}<|im_end|>\n<|im_start|>assistant\n{{"
+
+    return {**_sampling_params(), "prompt": prompt}
+
+
+def _sampling_params() -> dict:
+    return {
+        "temperature": QWEN_TEMPERATURE,
+        "top_p": QWEN_TOP_P,
+        "top_k": QWEN_TOP_K,
+        "presence_penalty": QWEN_PRESENCE_PENALTY,
+        "cache_prompt": True,
+        "n_keep": QWEN_N_KEEP,
+        "n_predict": QWEN_MAX_TOKENS,
+        "stop": ["<|im_end|>", "\n<|im_start|>"],
+        **({"grammar": SPARSE_OBJECT_GRAMMAR} if QWEN_GRAMMAR else {}),
+    }
+
+
+class ExtractionSession:
+    """
+    Prompt state of one consultation, laid out so llama-server's prompt cache
+    covers almost all of it. The prompt only ever grows at the end: the system
+    block, then one user turn per transcript chunk followed by the assistant
+    turn the model generated for it (the state delta). On the next call the
+    slot's KV cache already holds everything up to the new user turn, so only
+    that turn is evaluated. When the next prompt plus QWEN_MAX_TOKENS would
+    no longer fit the slot's context (`slot_ctx`, n_ctx / n_parallel), the
+    exchanges are replaced by a single summary of the extracted state -- one
+    full prefill, after which the prefix is stable again -- instead of
+    llama-server truncating or shifting the prompt and losing the cache.
+
+    Prompt size in tokens is projected from the previous call's
+    `tokens_evaluated` and its prompt length in characters.
+    """
+
+    # Tokens per prompt character assumed until llama-server has reported a count
+    DEFAULT_TOKENS_PER_CHAR = 0.5
+
+    def __init__(self, slot_id: int, slot_ctx: int = LLAMA_CONTEXT_SIZE // LLAMA_N_PARALLEL) -> None:
+        self.slot_id = slot_id
+        self.slot_ctx = slot_ctx
+        self._turns: list[str] = []
+        self._exchanges = 0  # recorded since the last compaction
+        self._tokens_per_char = self.DEFAULT_TOKENS_PER_CHAR
+        self._prompt_chars = 0
+
+    def _prompt(self, user_turn: str) -> str:
+        return f"<|im_start|>system\n{QWEN_SYSTEM}<|im_end|>\n" + "".join(self._turns) + user_turn
+
+    def build_payload(self, transcript: str, existing_context: dict) -> dict:
+        user_turn = f"<|im_start|>user\nNew Transcript to Process:\n{transcript.strip()}<|im_end|>\n<|im_start|>assistant\n{{"
+        prompt = self._prompt(user_turn)
+        projected = len(prompt) * self._tokens_per_char + QWEN_MAX_TOKENS
+        if projected > self.slot_ctx and self._exchanges:
+            context_str = json.dumps(existing_context, ensure_ascii=True, separators=(",", ":"), sort_keys=True)
+            self._turns = [f"<|im_start|>user\nPreviously Extracted Data:\n{context_str}<|im_end|>\n"]
+            self._exchanges = 0
+            prompt = self._prompt(user_turn)
+            logger.info(
+                "Qwen session (slot %d): ~%d tokens would exceed the %d-token slot, history compacted into a state summary",
+                self.slot_id, projected, self.slot_ctx,
+            )
+        self._prompt_chars = len(prompt)
+        return {**_sampling_params(), "prompt": prompt, "id_slot": self.slot_id}
+
+    def record(self, transcript: str, generated: str, prompt_tokens: int = 0) -> None:
+        """
+        Append the finished exchange exactly as the model saw and wrote it;
+        `prompt_tokens` (the call's tokens_evaluated) calibrates the projection.
+        """
+        turn = (
+            f"<|im_start|>user\nNew Transcript to Process:\n{transcript.strip()}<|im_end|>\n"
+            f"<|im_start|>assistant\n{{{generated}<|im_end|>\n"
+        )
+        self._turns.append(turn)
+        self._exchanges += 1
+        if prompt_tokens > 0 and self._prompt_chars:
+            self._tokens_per_char = prompt_tokens / self._prompt_chars
+
+
+async def stream_qwen_extraction(
+    llama: LlamaClient,
+    transcript: str,
+    existing_context: dict,
+    stats: Optional[dict] = None,
+    session: Optional[ExtractionSession] = None,
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Yield (field, value) pairs as soon as the model has finished writing each
+    one. With a `session` the call uses (and extends) its cache-friendly
+    conversation on its slot; without, a one-off prompt embedding
+    existing_context. `stats`, if given, receives llama-server's timings and
+    prompt token counts for the call.
+    """
+    if not transcript.strip():
+        return
+
+    if session is not None:
+        payload = session.build_payload(transcript, existing_context)
+    else:
+        payload = build_extraction_payload(transcript, existing_context)
+    parser = SparseObjectParser()
+    content = []
+    final: Optional[dict] = None
+    try:
+        async for event in llama.complete_stream(payload):
+            piece = event.get("content", "")
+            if piece:
+                content.append(piece)
+                for field, value in parser.feed(piece).items():
+                    yield field, value
+            if event.get("stop"):
+                final = event
+        for field, value in parser.close().items():
+            yield field, value
+    except Exception as e:
+        logger.error(f"Qwen error: {e}")
+        return
+
+    generated = "".join(content)
+    logger.info("Qwen raw output: {" + generated.strip())
+    final = final or {}
+    if session is not None:
+        session.record(transcript, generated, final.get("tokens_evaluated", 0))
+
+    timings = final.get("timings") or {}
+    call_stats = {
+        **timings,
+        "tokens_cached": final.get("tokens_cached", 0),
+        "tokens_evaluated": final.get("tokens_evaluated", 0),
+    }
+    if stats is not None:
+        stats.update(call_stats)
+    if timings:
+        # tokens_evaluated = whole prompt; prompt_n = the part actually prefilled (the rest came from the KV cache)
+        logger.info(
+            "Qwen timings: slot %s, prompt %d tok (%d cached, %d evaluated in %.0f ms), generated %d tok %.0f ms",
+            final.get("id_slot", payload.get("id_slot", "-")),
+            call_stats["tokens_evaluated"], call_stats["tokens_evaluated"] - timings.get("prompt_n", 0),
+            timings.get("prompt_n", 0), timings.get("prompt_ms", 0.0),
+            timings.get("predicted_n", 0), timings.get("predicted_ms", 0.0),
+        )
+
+
+async def run_qwen_extraction(
+    llama: LlamaClient, transcript: str, existing_context: dict, stream: bool = True
+) -> dict:
+    """All extracted fields at once (stream=False: one non-streamed completion, parsed at the end)."""
+    if not stream:
+        if not transcript.strip():
+            return {}
+        try:
+            raw = await llama.complete(build_extraction_payload(transcript, existing_context))
+            content = raw.get("content", "").strip()
+            content = "{" + content  # Since we pre-filled the {, we append it back to the chunk string
+            logger.info(f"Qwen raw output: {content}")
+            return _sanitize_sparse_updates(_extract_first_json_object(content))
+        except Exception as e:
+            logger.error(f"Qwen error: {e}")
+            return {}
+
+    data = {}
+    async for field, value in stream_qwen_extraction(llama, transcript, existing_context):
+        data[field] = value
+    return data
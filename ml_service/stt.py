@@ -0,0 +1,265 @@
+"""
+Speech-to-text engines for the ML node, selected by STT_BACKEND.
+
+  groq            : Groq's hosted whisper-large-v3 (GROQ_API_KEY). One HTTP
+                    request per utterance, so the WAN round trip is paid on
+                    every utterance and transcription stops if the link drops.
+  faster-whisper  : a local Whisper model on CTranslate2 (int8 on CPU by
+                    default, STT_MODEL / STT_COMPUTE_TYPE / STT_CPU_THREADS).
+                    Needs `pip install faster-whisper`; works offline once
+                    the model is downloaded or STT_MODEL points to a local
+                    converted model directory.
+
+Every engine implements `transcribe_batch(list of float32 16 kHz arrays) ->
+list of str`. One STTBatcher per ML node process (created in the app
+lifespan) queues utterances from all live sessions and hands an engine up to
+`max_batch` of them per call, waiting at most STT_BATCH_WINDOW_MS for the
+batch to fill. The local engine decodes a batch in one encoder/decoder pass;
+Groq takes one utterance per call but runs `max_concurrency` calls at once.
+Each utterance is logged with its audio length, latency and real-time factor
+(latency / audio duration; below 1.0 is faster than real time).
+"""
+import asyncio
+import io
+import logging
+import os
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("ML_Service")
+
+SAMPLE_RATE = 16000
+STT_BACKEND = os.getenv("STT_BACKEND", "groq").strip().lower()
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en")
+# faster-whisper model: a size name (downloaded once) or a local CTranslate2 model directory
+STT_MODEL = os.getenv("STT_MODEL", "small.en")
+STT_DEVICE = os.getenv("STT_DEVICE", "cpu")
+STT_COMPUTE_TYPE = os.getenv("STT_COMPUTE_TYPE", "int8")
+# Leave the remaining cores to llama-server
+STT_CPU_THREADS = int(os.getenv("STT_CPU_THREADS") or "4")
+STT_BATCH_SIZE = max(1, int(os.getenv("STT_BATCH_SIZE") or "4"))
+STT_BATCH_WINDOW_MS = float(os.getenv("STT_BATCH_WINDOW_MS") or "30")
+GROQ_STT_CONCURRENCY = max(1, int(os.getenv("GROQ_STT_CONCURRENCY") or "4"))
+
+
+class GroqSTT:
+    """Hosted whisper-large-v3 on Groq, one request per utterance."""
+
+    name = "groq"
+    max_batch = 1
+
+    def __init__(self, api_key: Optional[str] = None):
+        from groq import Groq
+
+        api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY not found in .env (required for STT_BACKEND=groq)")
+        self._client = Groq(api_key=api_key)
+        self.max_concurrency = GROQ_STT_CONCURRENCY
+
+    def transcribe(self, audio_float32: np.ndarray) -> str:
+        audio_int16 = (audio_float32 * 32767).astype(np.int16)
+        wav_io = io.BytesIO()
+        with wave.open(wav_io, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(SAMPLE_RATE)
+            wf.writeframes(audio_int16.tobytes())
+        wav_io.seek(0)
+        try:
+            result = self._client.audio.transcriptions.create(
+                file=("chunk.wav", wav_io.read()),
+                model="whisper-large-v3",
+                response_format="json",
+                temperature=0.0,
+                language=STT_LANGUAGE,  # Force the language to avoid random Spanish/other language hallucinations
+            )
+            return result.text.strip()
+        except Exception as e:
+            logger.error(f"Groq STT error: {e}")
+            return ""
+
+    def transcribe_batch(self, audios: list[np.ndarray]) -> list[str]:
+        return [self.transcribe(audio) for audio in audios]
+
+
+class FasterWhisperSTT:
+    """
+    Local Whisper on CTranslate2. Utterances of up to 30 s (the encoder
+    window; VAD utterances are capped by MAX_SPEECH_SAMPLES) are padded to
+    one window each, stacked and decoded greedily in a single
+    generate() call. Longer audio goes through WhisperModel.transcribe.
+    """
+
+    name = "faster-whisper"
+    max_concurrency = 1  # one batch at a time; CTranslate2 already uses STT_CPU_THREADS
+
+    # Same thresholds as faster-whisper's transcribe(): treat the window as silence
+    NO_SPEECH_THRESHOLD = 0.6
+    LOG_PROB_THRESHOLD = -1.0
+
+    def __init__(self, model: str = STT_MODEL, batch_size: int = STT_BATCH_SIZE):
+        try:
+            from faster_whisper import WhisperModel
+            from faster_whisper.audio import pad_or_trim
+            from faster_whisper.tokenizer import Tokenizer
+            from faster_whisper.transcribe import get_suppressed_tokens
+        except ImportError as e:
+            raise RuntimeError(
+                "STT_BACKEND=faster-whisper needs the faster-whisper package (pip install faster-whisper)"
+            ) from e
+
+        self._pad_or_trim = pad_or_trim
+        self.max_batch = batch_size
+        self.model_name = model
+        t0 = time.perf_counter()
+        self._model = WhisperModel(
+            model, device=STT_DEVICE, compute_type=STT_COMPUTE_TYPE, cpu_threads=STT_CPU_THREADS,
+        )
+        multilingual = self._model.model.is_multilingual
+        self._language = STT_LANGUAGE if multilingual else "en"
+        self._tokenizer = Tokenizer(
+            self._model.hf_tokenizer, multilingual, task="transcribe", language=self._language,
+        )
+        self._prompt = list(self._tokenizer.sot_sequence) + [self._tokenizer.no_timestamps]
+        self._suppress_tokens = list(get_suppressed_tokens(self._tokenizer, [-1]))
+        self._window_samples = self._model.feature_extractor.n_samples
+        logger.info(
+            "[STT] faster-whisper %s loaded in %.1f s (%s on %s, %d threads)",
+            model, time.perf_counter() - t0, STT_COMPUTE_TYPE, STT_DEVICE, STT_CPU_THREADS,
+        )
+
+    def _transcribe_long(self, audio: np.ndarray) -> str:
+        segments, _ = self._model.transcribe(
+            audio, language=self._language, beam_size=1, condition_on_previous_text=False,
+        )
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def transcribe_batch(self, audios: list[np.ndarray]) -> list[str]:
+        texts = [""] * len(audios)
+        short = []
+        for i, audio in enumerate(audios):
+            if len(audio) <= self._window_samples:
+                short.append(i)
+            else:
+                texts[i] = self._transcribe_long(audio)
+        if not short:
+            return texts
+
+        extractor = self._model.feature_extractor
+        features = np.stack([
+            self._pad_or_trim(extractor(audios[i])[..., :-1], extractor.nb_max_frames) for i in short
+        ])
+        encoder_output = self._model.encode(features)
+        results = self._model.model.generate(
+            encoder_output,
+            [self._prompt] * len(short),
+            beam_size=1,
+            max_length=self._model.max_length,
+            suppress_blank=True,
+            suppress_tokens=self._suppress_tokens,
+            return_scores=True,
+            return_no_speech_prob=True,
+        )
+        for i, result in zip(short, results):
+            tokens = result.sequences_ids[0]
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            if result.no_speech_prob > self.NO_SPEECH_THRESHOLD and avg_logprob < self.LOG_PROB_THRESHOLD:
+                continue
+            texts[i] = self._tokenizer.decode(tokens).strip()
+        return texts
+
+
+def create_stt_engine(backend: str = STT_BACKEND):
+    """The STT engine for `backend` (STT_BACKEND by default)."""
+    if backend == "groq":
+        return GroqSTT()
+    if backend in ("faster-whisper", "faster_whisper", "local"):
+        return FasterWhisperSTT()
+    raise ValueError(f"Unknown STT_BACKEND '{backend}' (expected 'groq' or 'faster-whisper')")
+
+
+class STTBatcher:
+    """
+    Process-wide queue in front of one STT engine. Sessions await
+    `transcribe(audio)`; a dispatcher groups queued utterances into batches
+    of up to `engine.max_batch` (waiting at most `window_ms` after the first
+    one) and runs up to `engine.max_concurrency` batches at a time on a
+    thread pool, off the event loop.
+    """
+
+    def __init__(self, engine, window_ms: float = STT_BATCH_WINDOW_MS):
+        self.engine = engine
+        self.window_sec = max(0.0, window_ms) / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(engine.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=engine.max_concurrency, thread_name_prefix="stt")
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._batches: set = set()
+
+    def start(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for task in list(self._batches):
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def transcribe(self, audio: np.ndarray) -> str:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((audio, future, time.perf_counter()))
+        return await future
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window_sec
+            while len(batch) < self.engine.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run(self, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            audios = [audio for audio, _, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                texts = await loop.run_in_executor(self._executor, self.engine.transcribe_batch, audios)
+            except Exception as e:
+                logger.error(f"[STT] {self.engine.name} batch of {len(batch)} failed: {e}")
+                texts = [""] * len(batch)
+            end = time.perf_counter()
+            for (audio, future, queued), text in zip(batch, texts):
+                seconds = len(audio) / SAMPLE_RATE
+                latency = end - queued
+                logger.info(
+                    "[STT] %s: %.2f s audio in %.0f ms (inference %.0f ms, RTF %.2f, batch %d)",
+                    self.engine.name, seconds, latency * 1000.0, (end - t0) * 1000.0,
+                    latency / seconds if seconds else 0.0, len(batch),
+                )
+                if not future.done():
+                    future.set_result(text)
+        finally:
+            self._slots.release()
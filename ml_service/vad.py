@@ -0,0 +1,219 @@
+"""
+Energy/ZCR voice activity detection for the ML node's audio stream.
+
+Incoming PCM is analysed in fixed-size frames (VAD_FRAME_SAMPLES, default 128
+samples: one browser render quantum), independent of how the client chunks it:
+feed() reassembles messages of any size -- single render quanta from older
+pages, 40-100 ms aggregated frames from the current worklet, even a message
+split mid-sample -- into whole analysis frames, carrying the remainder over to
+the next message. Every complete
+frame in a message is handled in one vectorised pass: DC offset, RMS and
+zero-crossing rate come from the same (n_frames, frame) view, and the soft
+noise gate is applied to the RMS arithmetically instead of rescaling the
+samples. Only the per-frame state machine (noise floor, start / continue /
+hangover) runs in Python, on scalars.
+
+Samples are written once, int16 -> float32, into preallocated buffers: a
+pre-roll ring of VAD_PRE_ROLL_FRAMES frames and an utterance buffer sized for
+MAX_SPEECH_SAMPLES. An utterance is copied out once when it is flushed.
+
+The VAD_* tunables keep their meaning: *_FRAMES count analysis frames, and
+the thresholds apply to the RMS / ZCR of the DC-removed, noise-gated frame.
+"""
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("ML_Service")
+
+SAMPLE_RATE = 16000
+VAD_FRAME_SAMPLES = int(os.getenv("VAD_FRAME_SAMPLES", "128"))
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "0.0055"))
+VAD_START_RATIO = float(os.getenv("VAD_START_RATIO", "2.2"))
+VAD_CONTINUE_RATIO = float(os.getenv("VAD_CONTINUE_RATIO", "1.45"))
+VAD_NOISE_ALPHA = float(os.getenv("VAD_NOISE_ALPHA", "0.97"))
+VAD_HANGOVER_FRAMES = int(os.getenv("VAD_HANGOVER_FRAMES", "14"))
+VAD_MAX_SILENCE_FRAMES = int(os.getenv("VAD_MAX_SILENCE_FRAMES", "40"))
+VAD_PRE_ROLL_FRAMES = int(os.getenv("VAD_PRE_ROLL_FRAMES", "8"))
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.35"))
+VAD_NOISE_GATE_RATIO = float(os.getenv("VAD_NOISE_GATE_RATIO", "1.15"))
+MIN_SPEECH_SAMPLES = int(os.getenv("MIN_SPEECH_SAMPLES", "10000"))   # ~0.62s at 16kHz
+MAX_SPEECH_SAMPLES = int(os.getenv("MAX_SPEECH_SAMPLES", "480000"))  # ~30s at 16kHz
+
+_NOISE_GATE_GAIN = 0.2  # residual gain of frames under the noise gate
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+
+
+def frame_features(frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    RMS and zero-crossing rate of each DC-removed row of `frames`
+    (shape (n_frames, frame_samples)), in one pass over the block.
+    """
+    centered = frames - frames.mean(axis=1, dtype=np.float32, keepdims=True)
+    rms = np.sqrt(np.einsum("ij,ij->i", centered, centered) / frames.shape[1])
+    signs = np.signbit(centered)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(frames.shape[1] - 1, 1)
+    return rms, zcr
+
+
+class VADEngine:
+    """Per-connection VAD: feed() raw PCM16 bytes, get back finished utterances."""
+
+    def __init__(self, frame_samples: int = VAD_FRAME_SAMPLES) -> None:
+        self.frame = frame_samples
+        self.noise_floor_rms = VAD_MIN_RMS
+        self.speech_active = False
+        self.silence_frames = 0
+
+        # Carry-over of a partial frame (and an odd trailing byte) between messages
+        self._odd_byte = b""
+        self._carry = np.empty(frame_samples, dtype=np.float32)
+        self._carry_len = 0
+        # Pre-roll ring: the last VAD_PRE_ROLL_FRAMES frames (emptied when speech starts)
+        self._preroll_frames = max(0, VAD_PRE_ROLL_FRAMES)
+        self._preroll = np.empty((max(1, self._preroll_frames), frame_samples), dtype=np.float32)
+        self._preroll_next = 0
+        self._preroll_count = 0
+        # Utterance buffer: a flush triggers at MAX_SPEECH_SAMPLES, so one extra frame always fits
+        capacity = max(MAX_SPEECH_SAMPLES, (self._preroll_frames + 1) * frame_samples) + frame_samples
+        self._speech = np.empty(capacity, dtype=np.float32)
+        self._speech_len = 0
+
+    @property
+    def speech_samples(self) -> int:
+        return self._speech_len
+
+    def feed(self, pcm_bytes: bytes) -> list[np.ndarray]:
+        """Consume little-endian PCM16 audio; returns utterances completed by it."""
+        if self._odd_byte or len(pcm_bytes) % 2:
+            pcm_bytes = self._odd_byte + pcm_bytes
+            split = len(pcm_bytes) - len(pcm_bytes) % 2
+            pcm_bytes, self._odd_byte = pcm_bytes[:split], pcm_bytes[split:]
+        pcm = np.frombuffer(pcm_bytes, dtype=np.int16)
+        if pcm.size == 0:
+            return []
+        audio = pcm.astype(np.float32)
+        audio *= _INT16_SCALE
+
+        if self._carry_len:
+            take = min(self.frame - self._carry_len, audio.size)
+            self._carry[self._carry_len:self._carry_len + take] = audio[:take]
+            self._carry_len += take
+            audio = audio[take:]
+            if self._carry_len < self.frame:
+                return []
+            utterances = self._process(self._carry.reshape(1, -1))
+            self._carry_len = 0
+        else:
+            utterances = []
+
+        n_frames = audio.size // self.frame
+        if n_frames:
+            utterances.extend(self._process(audio[:n_frames * self.frame].reshape(n_frames, self.frame)))
+        rest = audio.size - n_frames * self.frame
+        if rest:
+            self._carry[:rest] = audio[n_frames * self.frame:]
+            self._carry_len = rest
+        return utterances
+
+    def flush(self) -> Optional[np.ndarray]:
+        """On disconnect: the utterance in progress, if it is long enough to transcribe."""
+        disconnect_min_samples = max(2000, MIN_SPEECH_SAMPLES // 2)
+        if self.speech_active and self._speech_len >= disconnect_min_samples:
+            return self._speech[:self._speech_len].copy()
+        return None
+
+    # ------------------------------------------------------------------
+
+    def _process(self, frames: np.ndarray) -> list[np.ndarray]:
+        rms, zcr = frame_features(frames)
+        utterances = []
+        for i in range(frames.shape[0]):
+            # Soft noise gate on the DC-removed frame (scales its RMS, not its ZCR)
+            gate = max(VAD_MIN_RMS * 0.5, self.noise_floor_rms * VAD_NOISE_GATE_RATIO)
+            frame_rms = float(rms[i])
+            if frame_rms <= gate:
+                frame_rms *= _NOISE_GATE_GAIN
+            voiced = zcr[i] <= VAD_MAX_ZCR
+
+            # Always keep a short pre-roll so the start of speech is not clipped.
+            self._push_preroll(frames[i])
+
+            if not self.speech_active:
+                # Learn noise floor only while idle.
+                self.noise_floor_rms = (
+                    VAD_NOISE_ALPHA * self.noise_floor_rms + (1.0 - VAD_NOISE_ALPHA) * frame_rms
+                )
+                start_threshold = max(VAD_MIN_RMS, self.noise_floor_rms * VAD_START_RATIO)
+                if frame_rms >= start_threshold and voiced:
+                    self._start_speech(frame_rms, start_threshold)
+                continue
+
+            self._speech[self._speech_len:self._speech_len + self.frame] = frames[i]
+            self._speech_len += self.frame
+
+            continue_threshold = max(VAD_MIN_RMS * 0.8, self.noise_floor_rms * VAD_CONTINUE_RATIO)
+            if frame_rms >= continue_threshold and voiced:
+                self.silence_frames = 0
+            else:
+                self.silence_frames += 1
+
+            if (
+                (self.silence_frames >= VAD_HANGOVER_FRAMES and self._speech_len >= MIN_SPEECH_SAMPLES)
+                or self._speech_len >= MAX_SPEECH_SAMPLES
+                or self.silence_frames >= VAD_MAX_SILENCE_FRAMES
+            ):
+                utterance = self._end_speech()
+                if utterance is not None:
+                    utterances.append(utterance)
+        return utterances
+
+    def _push_preroll(self, frame: np.ndarray) -> None:
+        if not self._preroll_frames:
+            return
+        self._preroll[self._preroll_next] = frame
+        self._preroll_next = (self._preroll_next + 1) % self._preroll_frames
+        self._preroll_count = min(self._preroll_count + 1, self._preroll_frames)
+
+    def _start_speech(self, frame_rms: float, start_threshold: float) -> None:
+        # Utterance starts with the pre-roll (which already holds this frame), oldest first
+        count = self._preroll_count
+        if count:
+            order = (np.arange(self._preroll_next - count, self._preroll_next)) % self._preroll_frames
+            self._speech[:count * self.frame] = self._preroll[order].ravel()
+        self._speech_len = count * self.frame
+        self._preroll_count = 0
+        self._preroll_next = 0
+        self.speech_active = True
+        self.silence_frames = 0
+        logger.info(
+            "[VAD] Speech start: rms=%.4f start_thr=%.4f noise_floor=%.4f",
+            frame_rms,
+            start_threshold,
+            self.noise_floor_rms,
+        )
+
+    def _end_speech(self) -> Optional[np.ndarray]:
+        utterance = None
+        if self._speech_len:
+            duration_sec = self._speech_len / SAMPLE_RATE
+            min_flush_samples = max(2000, MIN_SPEECH_SAMPLES // 4)
+            if self._speech_len >= min_flush_samples:
+                utterance = self._speech[:self._speech_len].copy()
+                logger.info(
+                    "[VAD] Speech end: duration=%.2fs silence_frames=%d",
+                    duration_sec,
+                    self.silence_frames,
+                )
+            else:
+                logger.info(
+                    "[VAD] Dropped tiny chunk: duration=%.2fs silence_frames=%d",
+                    duration_sec,
+                    self.silence_frames,
+                )
+        self.speech_active = False
+        self.silence_frames = 0
+        self._speech_len = 0
+        return utterance